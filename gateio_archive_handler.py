@@ -1,7 +1,13 @@
 #File: gateio_archive_handler.py
 
 import os
-import shutil
+import sys
+import json
+import zlib
+import sqlite3
+import tempfile
+import hashlib
+import argparse
 import logging
 from datetime import datetime
 import gateio_logger_setup
@@ -12,66 +18,287 @@ def setup_logger():
 
 logger = setup_logger()
 
-# Function to create a backup of the file
-def archiver(filename, backup_folder, current_datetime):
-    try:
-        os.makedirs(backup_folder, exist_ok=True)
-        if os.path.exists(filename):
-            base_filename, ext = os.path.splitext(os.path.basename(filename))
-            backup_filename = os.path.join(backup_folder, f"{base_filename}_{current_datetime}{ext}")
-            shutil.copy2(filename, backup_filename)
-            logger.info(f"Backup of {filename} saved to {backup_filename}")
-            cleanup_old_backups(backup_folder, base_filename, ext)
-    except OSError as e:
-        logger.error(f"OS error during backup process: {e}")
-
-# Function to cleanup old backups
-def cleanup_old_backups(backup_folder, prefix, extension, max_count=6):
-    try:
-        # Get list of backup files that match the prefix and extension
-        backups = [
-            f for f in os.listdir(backup_folder) if f.startswith(prefix) and f.endswith(extension)
-        ]
-        
-        # Get full paths for the files and sort by creation time
-        backup_files = [(f, os.path.getctime(os.path.join(backup_folder, f))) for f in backups]
-        backup_files_sorted = sorted(backup_files, key=lambda x: x[1], reverse=True)
-        
-        # Extract sorted file names
-        sorted_backups = [f[0] for f in backup_files_sorted]
-
-        logger.debug(f"Found backups: {sorted_backups}")
-
-        # Delete the oldest backups, keeping only 'max_count' most recent ones
-        if len(sorted_backups) > max_count:
-            old_backups = sorted_backups[max_count:]
-            for old_backup in old_backups:
-                old_backup_path = os.path.join(backup_folder, old_backup)
-                try:
-                    os.remove(old_backup_path)
-                    logger.info(f"Removed old backup: {old_backup_path}")
-                except OSError as e:
-                    logger.error(f"Failed to remove old backup {old_backup_path}: {e}")
-    except OSError as e:
-        logger.error(f"Failed to cleanup old backups in {backup_folder}: {e}")
+# Files to archive and the snapshot archive of each
+ARCHIVE_TARGETS = [
+    (os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Process/gateio_events.db'),
+     os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Archive')),
+    (os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Process/gateio_articles.db'),
+     os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Archive')),
+]
 
-if __name__ == "__main__":
-    try:
-        current_datetime = datetime.now().strftime("%y%m%d_%H%M%S")
+# SQLite changes pages in place, so fixed-size chunks of the file deduplicate well between snapshots
+CHUNK_SIZE = 64 * 1024
+COMPRESSION_LEVEL = 6
+
+# Tiered retention: the newest snapshot of each of the last N hours, days and weeks is kept
+RETENTION_POLICY = [
+    ('hourly', '%Y%m%d%H', 24),
+    ('daily', '%Y%m%d', 7),
+    ('weekly', '%G%V', 8),
+]
+
+
+class SnapshotArchive:
+    """
+    Content-addressed snapshot archive of SQLite databases.
+
+    The database is first copied with the SQLite online backup API, so a snapshot taken
+    while the pipeline writes is still a consistent database. A snapshot is a manifest
+    listing the SHA-256 hashes of the copy's chunks; every distinct chunk is stored
+    once, compressed, and shared by all snapshots containing it. Archiving therefore
+    writes only the chunks that changed since any earlier snapshot, and an unchanged
+    file adds no snapshot at all.
+
+    :param folder: Folder holding the snapshots and chunks
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.snapshot_dir = os.path.join(folder, 'snapshots')
+        self.chunk_dir = os.path.join(folder, 'chunks')
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        os.makedirs(self.chunk_dir, exist_ok=True)
+
+    def snapshots(self, filename=None):
+        """
+        :param filename: Optional path of the archived file to filter on
+        :return: List of snapshot manifests, oldest first
+        """
+        manifests = []
+        for entry in os.listdir(self.snapshot_dir):
+            if not entry.endswith('.json'):
+                continue
+            with open(os.path.join(self.snapshot_dir, entry), 'r') as file:
+                manifest = json.load(file)
+            if filename is None or manifest['file'] == filename:
+                manifests.append(manifest)
+        return sorted(manifests, key=lambda manifest: manifest['created'])
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], f"{digest}.z")
+
+    def _store_chunk(self, digest, data):
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        _write_atomic(path, compressed)
+        return len(compressed)
+
+    def snapshot(self, filename, current_datetime):
+        """
+        Archive the current content of a file.
+
+        :param filename: Path of the file to archive
+        :param current_datetime: Timestamp used in the snapshot ID
+        :return: The new manifest, or None when the file is missing or unchanged
+        """
+        if not os.path.exists(filename):
+            logger.info(f"Nothing to archive, {filename} does not exist")
+            return None
+
+        stat = os.stat(filename)
+        previous = self.snapshots(filename)
+        latest = previous[-1] if previous else None
+        if latest and latest['size'] == stat.st_size and latest['mtime'] == stat.st_mtime:
+            logger.info(f"{filename} is unchanged since snapshot {latest['id']}, skipping")
+            return None
+
+        file_hash = hashlib.sha256()
+        chunks = []
+        written = 0
+        backup_path = self._backup(filename)
+        try:
+            with open(backup_path, 'rb') as file:
+                for data in iter(lambda: file.read(CHUNK_SIZE), b''):
+                    digest = hashlib.sha256(data).hexdigest()
+                    file_hash.update(data)
+                    chunks.append(digest)
+                    written += self._store_chunk(digest, data)
+            backup_size = os.path.getsize(backup_path)
+        finally:
+            os.remove(backup_path)
+
+        if latest and latest['sha256'] == file_hash.hexdigest():
+            logger.info(f"{filename} has the same content as snapshot {latest['id']}, skipping")
+            return None
 
-        # Define the filename and backup folder for JSON files      
-        json_filename = os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Process/gateio_structured.json')
-        json_backup_folder = os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Archive')
+        manifest = {
+            'file': filename,
+            'created': datetime.now().timestamp(),
+            'size': stat.st_size,  # Size and mtime of the live file, to skip it cheaply while it is unchanged
+            'mtime': stat.st_mtime,
+            'backup_size': backup_size,
+            'sha256': file_hash.hexdigest(),
+            'chunks': chunks,
+        }
+        self._save_manifest(manifest, os.path.splitext(os.path.basename(filename))[0] + f"_{current_datetime}")
+        logger.info(f"Snapshot {manifest['id']} of {filename}: {len(chunks)} chunks, "
+                    f"{written} compressed bytes written for {backup_size} bytes")
+        return manifest
 
-        # Perform the backup process for JSON files
-        archiver(json_filename, json_backup_folder, current_datetime)
+    def _backup(self, filename):
+        # Consistent copy of the live database, taken between its transactions
+        handle, backup_path = tempfile.mkstemp(suffix='.db', dir=self.folder)
+        os.close(handle)
+        source = sqlite3.connect(filename)
+        target = sqlite3.connect(backup_path)
+        try:
+            source.backup(target)
+        except sqlite3.Error:
+            target.close()
+            os.remove(backup_path)
+            raise
+        finally:
+            source.close()
+        target.close()
+        return backup_path
 
-        # Define the filename and backup folder for TSV files
-        tsv_filename = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Process/gateio_article_collection.tsv')
-        tsv_backup_folder = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Archive')
-        
-        # Perform the backup process for TSV files
-        archiver(tsv_filename, tsv_backup_folder, current_datetime)
+    def _save_manifest(self, manifest, base_id):
+        # Snapshots taken within the same second get a counter suffix instead of replacing each other;
+        # os.link claims an ID atomically, even against another archiving process
+        temp_path = os.path.join(self.snapshot_dir, f".{base_id}.{os.getpid()}.tmp")
+        counter = 1
+        while True:
+            manifest['id'] = base_id if counter == 1 else f"{base_id}_{counter}"
+            _write_atomic(temp_path, json.dumps(manifest).encode())
+            try:
+                os.link(temp_path, os.path.join(self.snapshot_dir, f"{manifest['id']}.json"))
+                break
+            except FileExistsError:
+                counter += 1
+            finally:
+                os.remove(temp_path)
+
+    def apply_retention(self, policy=RETENTION_POLICY):
+        """
+        Delete the snapshots no tier of the retention policy keeps, then the chunks no snapshot uses.
+
+        :return: Number of deleted snapshots
+        """
+        manifests = self.snapshots()
+        keep = set()
+        for filename in {manifest['file'] for manifest in manifests}:
+            history = [manifest for manifest in reversed(manifests) if manifest['file'] == filename]
+            keep.add(history[0]['id'])
+            for _, bucket_format, count in policy:
+                buckets = set()
+                for manifest in history:
+                    bucket = datetime.fromtimestamp(manifest['created']).strftime(bucket_format)
+                    if bucket in buckets:
+                        continue
+                    if len(buckets) == count:
+                        break
+                    buckets.add(bucket)
+                    keep.add(manifest['id'])
+
+        removed = 0
+        for manifest in manifests:
+            if manifest['id'] not in keep:
+                os.remove(os.path.join(self.snapshot_dir, f"{manifest['id']}.json"))
+                logger.info(f"Removed snapshot {manifest['id']}")
+                removed += 1
+        if removed:
+            self._collect_garbage()
+        return removed
+
+    def _collect_garbage(self):
+        used = {digest for manifest in self.snapshots() for digest in manifest['chunks']}
+        freed = 0
+        for prefix in os.listdir(self.chunk_dir):
+            for entry in os.listdir(os.path.join(self.chunk_dir, prefix)):
+                if entry.endswith('.z') and entry[:-2] not in used:
+                    path = os.path.join(self.chunk_dir, prefix, entry)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+        logger.info(f"Freed {freed} bytes of unused chunks in {self.folder}")
+
+    def find(self, snapshot_id):
+        """
+        :return: Manifest of the snapshot with the given ID, or None
+        """
+        path = os.path.join(self.snapshot_dir, f"{snapshot_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as file:
+            return json.load(file)
+
+    def restore(self, manifest, output_path):
+        """
+        Rebuild a snapshot and write it atomically after verifying its hash.
+
+        :param manifest: Snapshot manifest
+        :param output_path: Path of the restored file
+        """
+        file_hash = hashlib.sha256()
+        temp_path = f"{output_path}.restore"
+        with open(temp_path, 'wb') as file:
+            for digest in manifest['chunks']:
+                with open(self._chunk_path(digest), 'rb') as chunk_file:
+                    data = zlib.decompress(chunk_file.read())
+                file_hash.update(data)
+                file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        if file_hash.hexdigest() != manifest['sha256']:
+            os.remove(temp_path)
+            raise ValueError(f"Snapshot {manifest['id']} is corrupt: content hash does not match")
+        os.replace(temp_path, output_path)
+        logger.info(f"Restored snapshot {manifest['id']} to {output_path}")
+
+
+def _write_atomic(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+# Function to snapshot every archived file and apply the retention policy
+def archive_all(current_datetime):
+    for filename, folder in ARCHIVE_TARGETS:
+        try:
+            archive = SnapshotArchive(folder)
+            archive.snapshot(filename, current_datetime)
+            archive.apply_retention()
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Error during backup process of {filename}: {e}")
+
+# Function to list the snapshots of every archived file
+def list_snapshots():
+    for filename, folder in ARCHIVE_TARGETS:
+        print(filename)
+        for manifest in SnapshotArchive(folder).snapshots(filename):
+            created = datetime.fromtimestamp(manifest['created']).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"  {manifest['id']}  {created}  {manifest['size']} bytes")
+
+# Function to restore a snapshot, by default over the file it was taken from
+def restore_snapshot(snapshot_id, output_path=None):
+    for _, folder in ARCHIVE_TARGETS:
+        archive = SnapshotArchive(folder)
+        manifest = archive.find(snapshot_id)
+        if manifest:
+            archive.restore(manifest, output_path or manifest['file'])
+            return True
+    logger.error(f"Snapshot {snapshot_id} not found")
+    return False
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Snapshot, list and restore the article and event stores.")
+    arg_parser.add_argument('--list', action='store_true', help="List the available snapshots")
+    arg_parser.add_argument('--restore', metavar='SNAPSHOT_ID', help="Restore a snapshot")
+    arg_parser.add_argument('--output', help="Path to restore to instead of the original file")
+    args = arg_parser.parse_args()
+
+    try:
+        if args.list:
+            list_snapshots()
+        elif args.restore:
+            sys.exit(0 if restore_snapshot(args.restore, args.output) else 1)
+        else:
+            archive_all(datetime.now().strftime("%y%m%d_%H%M%S"))
 
     except Exception as e:
         logger.error(f"Unexpected error in archiving process: {e}")
+        sys.exit(1)
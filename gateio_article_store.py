@@ -0,0 +1,230 @@
+# File: gateio_article_store.py
+
+import os
+import sqlite3
+import hashlib
+import argparse
+import logging
+import pandas as pd
+import gateio_logger_setup
+
+ARTICLE_STORE_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Process/gateio_articles.db')
+ARTICLE_COLLECTION_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Process/gateio_article_collection.tsv')
+
+# Column order of the legacy TSV, kept for loading and exporting
+ARTICLE_COLUMNS = ['exchange', 'llm_processed', 'parse_datetime', 'publish_datetime', 'link', 'category', 'title', 'body']
+# Columns only the store has: the hash of the normalized body, used to detect edited articles
+STORE_COLUMNS = ARTICLE_COLUMNS + ['body_hash']
+
+# Rows each stage works on
+MISSING_CONTENT_CONDITION = "publish_datetime IS NULL OR body IS NULL"
+PENDING_LLM_CONDITION = ("llm_processed = 'No' AND body IS NOT NULL AND publish_datetime IS NOT NULL "
+                         "AND title IS NOT NULL AND link IS NOT NULL")
+# Articles that went through extraction: the ones already old when they were listed are flagged without an LLM call
+EXTRACTED_CONDITION = ("llm_processed = 'Yes' AND body IS NOT NULL AND title IS NOT NULL "
+                       "AND substr(publish_datetime, 1, 19) >= datetime(substr(parse_datetime, 1, 19), '-5 days')")
+
+
+class ArticleStore:
+    """
+    SQLite-backed article collection keyed on the article link.
+
+    Each stage reads only the rows it works on and writes back only the rows it
+    changed, in a single transaction, so load and save time do not grow with the
+    size of the history. On first use an existing TSV collection is migrated.
+
+    :param path: Path of the SQLite database
+    :param tsv_file: Legacy TSV collection to migrate when the database is created
+    """
+    def __init__(self, path=ARTICLE_STORE_FILE, tsv_file=ARTICLE_COLLECTION_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        is_new = not os.path.exists(path)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS articles (
+                exchange TEXT,
+                llm_processed TEXT,
+                parse_datetime TEXT,
+                publish_datetime TEXT,
+                link TEXT PRIMARY KEY,
+                category TEXT,
+                title TEXT,
+                body TEXT,
+                body_hash TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_articles_llm_processed ON articles (llm_processed);
+            CREATE INDEX IF NOT EXISTS idx_articles_publish_datetime ON articles (publish_datetime);
+        """)
+        # Stores created before change detection get the column; their hashes are filled in on the first recheck
+        if 'body_hash' not in {row[1] for row in self.conn.execute("PRAGMA table_info(articles)")}:
+            with self.conn:
+                self.conn.execute("ALTER TABLE articles ADD COLUMN body_hash TEXT")
+        if is_new and tsv_file and os.path.exists(tsv_file):
+            self.migrate_from_tsv(tsv_file)
+
+    def links(self):
+        """
+        :return: Set of all stored article links
+        """
+        return {row[0] for row in self.conn.execute("SELECT link FROM articles")}
+
+    def load_articles(self, where=None, params=(), columns=ARTICLE_COLUMNS):
+        """
+        Load articles into a DataFrame, in insertion order.
+
+        :param where: Optional SQL condition selecting the rows
+        :param params: Parameters for the condition
+        :param columns: Columns to load
+        :return: DataFrame of the selected articles
+        """
+        query = f"SELECT {', '.join(columns)} FROM articles"
+        if where:
+            query += f" WHERE {where}"
+        query += " ORDER BY rowid"
+        return pd.read_sql_query(query, self.conn, params=params)
+
+    def count_articles(self, where=None, params=()):
+        """
+        Count articles without loading them.
+
+        :param where: Optional SQL condition selecting the rows
+        :param params: Parameters for the condition
+        :return: Number of selected articles
+        """
+        query = "SELECT COUNT(*) FROM articles"
+        if where:
+            query += f" WHERE {where}"
+        return self.conn.execute(query, params).fetchone()[0]
+
+    def category_counts(self, since):
+        """
+        Count the articles of every category published (or, when not fetched yet, listed) since a time.
+
+        :param since: Time as a 'YYYY-MM-DD HH:MM:SS UTC' string
+        :return: Dict mapping category to article count
+        """
+        return dict(self.conn.execute(
+            "SELECT category, COUNT(*) FROM articles WHERE COALESCE(publish_datetime, parse_datetime) >= ? GROUP BY category",
+            (since,)
+        ).fetchall())
+
+    def articles_missing_content(self):
+        """
+        :return: DataFrame of articles whose body or publish_datetime has not been fetched yet
+        """
+        return self.load_articles(MISSING_CONTENT_CONDITION)
+
+    def articles_for_llm(self):
+        """
+        :return: DataFrame of fetched articles that have not been processed by the LLM yet
+        """
+        return self.load_articles(PENDING_LLM_CONDITION)
+
+    def articles_for_recheck(self, since):
+        """
+        :param since: Time as a 'YYYY-MM-DD HH:MM:SS UTC' string
+        :return: DataFrame of the fetched articles published since then, with their body hashes
+        """
+        return self.load_articles("body IS NOT NULL AND publish_datetime >= ?", (since,),
+                                  columns=['link', 'publish_datetime', 'body', 'body_hash'])
+
+    def insert_articles(self, articles):
+        """
+        Insert new articles, ignoring links that are already stored.
+
+        :param articles: Iterable of article dicts
+        :return: Number of inserted articles
+        """
+        rows = [tuple(article.get(column) for column in ARTICLE_COLUMNS) for article in articles]
+        with self.conn:
+            cursor = self.conn.executemany(
+                f"INSERT OR IGNORE INTO articles ({', '.join(ARTICLE_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in ARTICLE_COLUMNS)})",
+                rows
+            )
+        return cursor.rowcount
+
+    def update_articles(self, updates):
+        """
+        Update fields of existing articles in one transaction.
+
+        :param updates: Dict mapping link to a dict of column values
+        :return: Number of updated articles
+        """
+        updated = 0
+        with self.conn:
+            for link, values in updates.items():
+                columns = [column for column in values if column in STORE_COLUMNS and column != 'link']
+                if not columns:
+                    continue
+                self.conn.execute(
+                    f"UPDATE articles SET {', '.join(f'{column} = ?' for column in columns)} WHERE link = ?",
+                    [_to_sql(values[column]) for column in columns] + [link]
+                )
+                updated += 1
+        return updated
+
+    def migrate_from_tsv(self, tsv_file=ARTICLE_COLLECTION_FILE):
+        """
+        Import a TSV article collection, keeping the first row of duplicated links.
+
+        :param tsv_file: Path of the TSV collection
+        :return: Number of imported articles
+        """
+        df = pd.read_csv(tsv_file, sep='\t')
+        df = df.reindex(columns=ARTICLE_COLUMNS).astype(object)
+        df = df.where(pd.notna(df), None)
+        inserted = self.insert_articles(df.to_dict('records'))
+        logging.info(f"Migrated {inserted} articles from {tsv_file} to {self.path}")
+        return inserted
+
+    def export_to_tsv(self, tsv_file=ARTICLE_COLLECTION_FILE):
+        """
+        Write the whole collection in the legacy TSV format.
+
+        :param tsv_file: Path of the TSV file to write
+        """
+        self.load_articles().to_csv(tsv_file, sep='\t', index=False)
+        logging.info(f"Exported {self.path} to {tsv_file}")
+
+    def close(self):
+        self.conn.close()
+
+
+def content_hash(body):
+    """
+    Hash of an article body that ignores whitespace-only differences.
+
+    :param body: Cleaned article body
+    :return: Hex digest, or None without a body
+    """
+    if not isinstance(body, str):
+        return None
+    return hashlib.sha256(' '.join(body.split()).encode('utf-8')).hexdigest()
+
+
+def _to_sql(value):
+    # pandas hands missing values over as NaN, SQLite should store them as NULL
+    return None if pd.isna(value) else value
+
+
+if __name__ == '__main__':
+    gateio_logger_setup.setup_logging()
+
+    arg_parser = argparse.ArgumentParser(description="Migrate the article collection between TSV and SQLite.")
+    arg_parser.add_argument('--migrate', metavar='TSV', nargs='?', const=ARTICLE_COLLECTION_FILE,
+                            help="Import a TSV collection into the store")
+    arg_parser.add_argument('--export', metavar='TSV', nargs='?', const=ARTICLE_COLLECTION_FILE,
+                            help="Export the store to a TSV collection")
+    args = arg_parser.parse_args()
+
+    store = ArticleStore(tsv_file=None)
+    try:
+        if args.migrate:
+            print(f"Imported {store.migrate_from_tsv(args.migrate)} articles from {args.migrate}")
+        if args.export:
+            store.export_to_tsv(args.export)
+            print(f"Exported articles to {args.export}")
+    finally:
+        store.close()
@@ -0,0 +1,177 @@
+# File: gateio_benchmark_fixtures.py
+
+import os
+import re
+import json
+import random
+import sqlite3
+import hashlib
+import argparse
+from urllib.parse import urlparse
+from datetime import datetime, timedelta, timezone
+from gateio_http_cache import HTTP_CACHE_FILE
+from gateio_llm_cache import LLM_CACHE_FILE
+from gateio_get_article_list import load_gateio_categories, build_page_url, ARTICLE_CATEGORIES_FILE
+
+FIXTURE_DIR = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Benchmark/fixtures')
+CORPUS_VERSION = 1
+
+# Text exercising the title and body normalizers: emojis, full-width punctuation, markdown and promo lines
+TITLE_FRAGMENTS = ['Gate.io Will List', '\U0001F680 New', '【Spot】', 'Trading：', 'Airdrop – Win',
+                   '“Launchpool”', 'Futures & Margin', 'Event！', '● Update', '..', 'Delisting']
+BODY_FRAGMENTS = [
+    'Dear Gate.io users,', 'Gate.io will list {token} ({token}/USDT) for spot trading.',
+    'Deposits open at {date}.', 'Trading starts at {date} and ends at {date}.',
+    'See the [trading rules](https://www.gate.io/help/{token}) for details.', '![banner](https://img.gateimg.com/{token}.png)',
+    'Reward pool: 50,000 {token} ✅', 'Eligible users： new users only、 KYC verified.',
+    '⚠️ Risk warning: cryptocurrency prices are volatile.', 'Gate.io is your gateway to crypto',
+    'Gate.io is a Cryptocurrency Trading Platform Since 2013', 'Thank you for your support!', '[//]:content-type-MARKDOWN-DONOT-DELETE',
+]
+TOKENS = ['BTC', 'ETH', 'SOL', 'DOGE', 'PEPE', 'ARB', 'TON', 'SUI', 'WIF', 'ENA']
+EVENT_TYPES = ['Listing', 'Delisting', 'Airdrop', 'Pre-market Listing']
+
+# Navigation, scripts and footer around the parsed part, so pages have the size of the real ones
+PAGE_FILLER = ''.join(f'<div class="nav-item"><a href="/page/{i}">Menu {i}</a><script>var x{i} = "{"a" * 200}";</script></div>'
+                      for i in range(150))
+
+
+def corpus_path(fixture_dir=FIXTURE_DIR):
+    return os.path.join(fixture_dir, 'corpus.json')
+
+
+def load_corpus(fixture_dir=FIXTURE_DIR):
+    """
+    :return: Corpus dict with 'categories', 'pages' and 'llm_responses'
+    """
+    with open(corpus_path(fixture_dir), 'r', encoding='utf-8') as file:
+        corpus = json.load(file)
+    if corpus.get('version') != CORPUS_VERSION:
+        raise ValueError(f"Unsupported fixture corpus version {corpus.get('version')} in {fixture_dir}")
+    return corpus
+
+
+def save_corpus(corpus, fixture_dir=FIXTURE_DIR):
+    os.makedirs(fixture_dir, exist_ok=True)
+    path = corpus_path(fixture_dir)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(corpus, file, sort_keys=True)
+    os.replace(temp_path, path)
+    return path
+
+
+def corpus_fingerprint(corpus):
+    # Results are only comparable between runs over the same corpus
+    return hashlib.sha256(json.dumps(corpus, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def page_path(url):
+    """
+    :return: Path and query of a URL, the key the stand-in server serves a page under
+    """
+    parts = urlparse(url)
+    return parts.path + (f"?{parts.query}" if parts.query else '')
+
+
+def capture_corpus(cache_file=HTTP_CACHE_FILE, llm_cache_file=LLM_CACHE_FILE, categories_file=ARTICLE_CATEGORIES_FILE):
+    """
+    Build a corpus from what earlier runs captured: the pages in the HTTP cache and the
+    assistant responses in the LLM cache.
+
+    :return: Corpus dict
+    """
+    corpus = {'version': CORPUS_VERSION, 'source': 'captured', 'categories': {}, 'pages': {}, 'llm_responses': {}}
+    categories = load_gateio_categories(categories_file)
+    with sqlite3.connect(cache_file) as conn:
+        for url, body in conn.execute("SELECT url, body FROM entries ORDER BY url"):
+            if 'article-list-box' in body or 'article-details-box' in body:
+                corpus['pages'][page_path(url)] = body
+    corpus['categories'] = {page_path(url): category for url, category in categories.items()
+                            if page_path(url) in corpus['pages']}
+
+    # Responses are recorded per article link and assistant; the link is taken from the events
+    if os.path.exists(llm_cache_file):
+        with sqlite3.connect(llm_cache_file) as conn:
+            for assistant_id, response in conn.execute("SELECT assistant_id, response FROM responses ORDER BY created_at"):
+                response = json.loads(response)
+                links = {event.get('article_link') for event in response.get('events', []) if isinstance(event, dict)}
+                for link in filter(None, links):
+                    corpus['llm_responses'].setdefault(page_path(link), {})[assistant_id] = response
+    return corpus
+
+
+def generate_corpus(categories=4, pages_per_category=2, articles_per_page=5, seed=0):
+    """
+    Generate a deterministic corpus with the page structure of gate.io, for machines without captured pages.
+
+    :return: Corpus dict
+    """
+    rng = random.Random(seed)
+    corpus = {'version': CORPUS_VERSION, 'source': f'synthetic-{seed}', 'categories': {}, 'pages': {}, 'llm_responses': {}}
+    published = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)  # The stand-in server moves article dates to the present
+    article_id = 0
+    for category_number in range(categories):
+        url = f"/announcements/category{category_number}"
+        corpus['categories'][url] = f"Category {category_number}"
+        for page in range(1, pages_per_category + 1):
+            items = []
+            for _ in range(articles_per_page):
+                article_id += 1
+                link = f"/announcements/article/{article_id}"
+                token = rng.choice(TOKENS)
+                title = ' '.join(rng.sample(TITLE_FRAGMENTS, 4)) + f" {token}"
+                items.append(f'<div class="article-list-item"><a class="article-list-item-title" href="{link}">'
+                             f'<h3>{title}</h3></a><span class="article-list-item-time">{published:%Y-%m-%d}</span></div>')
+
+                date = (published + timedelta(days=rng.randint(1, 20))).strftime('%Y-%m-%d %H:%M UTC')
+                body = '\n'.join(rng.choice(BODY_FRAGMENTS).format(token=token, date=date) for _ in range(rng.randint(20, 60)))
+                corpus['pages'][link] = (
+                    f'<html><body>{PAGE_FILLER}<div class="article-details-box"><h1>{title}</h1>'
+                    f'<div class="article-details-base-info"><span>{published:%Y-%m-%d %H:%M:%S} UTC</span><span>Gate.io</span></div>'
+                    f'<div class="article-details-main">{"".join(f"<p>{line}</p>" for line in body.splitlines())}</div>'
+                    f'</div>{PAGE_FILLER}</body></html>'
+                )
+                corpus['llm_responses'][link] = {'default': {'events': [{
+                    'exchange_name': 'Gate.io', 'event_type': [rng.choice(EVENT_TYPES)], 'tokens': [token],
+                    'trading_pairs': [f"{token}/USDT"], 'markets': ['Spot'],
+                    'start_datetime': 'NOW+1D', 'end_datetime': 'NOW+2D',  # Resolved by the stand-in server
+                    'event_summary': f"{token} event", 'article_link': f"https://www.gate.io{link}",
+                }]}}
+            corpus['pages'][page_path(build_page_url(url, page))] = (
+                f'<html><body>{PAGE_FILLER}<div class="article-list-box">{"".join(items)}</div>{PAGE_FILLER}</body></html>'
+            )
+    return corpus
+
+
+def corpus_items(corpus):
+    """
+    :return: Tuple of (list_pages, article_pages), each a list of (path, html)
+    """
+    list_pages = [(path, html) for path, html in corpus['pages'].items() if 'article-list-box' in html]
+    article_pages = [(path, html) for path, html in corpus['pages'].items() if 'article-details-box' in html]
+    return list_pages, article_pages
+
+
+def refresh_dates(html, now):
+    # Captured pages carry their real publish dates; moving them to the last full hour sends every
+    # article to the LLM while the page stays the same, and keeps its ETag, for the rest of the hour
+    published = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    return re.sub(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} UTC', published.strftime('%Y-%m-%d %H:%M:%S UTC'), html, count=1)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Create the fixture corpus of the offline benchmark suite.")
+    source = arg_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--capture', action='store_true', help="Capture the pages and responses of the HTTP and LLM caches")
+    source.add_argument('--generate', action='store_true', help="Generate a synthetic corpus")
+    arg_parser.add_argument('--output', default=FIXTURE_DIR, help="Fixture directory")
+    arg_parser.add_argument('--categories', type=int, default=4, help="Synthetic categories")
+    arg_parser.add_argument('--articles-per-page', type=int, default=5, help="Synthetic articles per listing page")
+    arg_parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic corpus")
+    args = arg_parser.parse_args()
+
+    corpus = capture_corpus() if args.capture else generate_corpus(args.categories, articles_per_page=args.articles_per_page, seed=args.seed)
+    list_pages, article_pages = corpus_items(corpus)
+    path = save_corpus(corpus, args.output)
+    print(f"Saved {len(list_pages)} listing pages, {len(article_pages)} article pages and "
+          f"{len(corpus['llm_responses'])} recorded responses to {path} (fingerprint {corpus_fingerprint(corpus)})")
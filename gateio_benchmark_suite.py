@@ -0,0 +1,308 @@
+# File: gateio_benchmark_suite.py
+
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import timeit
+import openai
+from datetime import datetime, timezone
+import gateio_get_json
+import gateio_get_calendar
+from gateio_html_parser import find_subtree
+from gateio_get_article_list import parse_html
+from gateio_get_articles import parse_article_html
+from gateio_text_normalizer import clean_title, clean_body
+from gateio_prompt_compactor import PromptCompactor, boilerplate_keys, PROMPT_TOKEN_BUDGET
+from gateio_calendar_benchmark import generate_events
+from gateio_benchmark_fixtures import (load_corpus, generate_corpus, corpus_items, corpus_fingerprint, corpus_path,
+                                       refresh_dates, FIXTURE_DIR)
+from gateio_standin_server import StandInServer, StandInConfig
+
+RESULTS_DIR = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Benchmark/results')
+SUITE_VERSION = 1
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_SCRIPT = os.path.join(REPO_DIR, 'gateio_main.py')
+END_TO_END_TIMEOUT = 900  # Seconds a single pipeline run may take
+MIN_REGRESSION_SECONDS = 0.005  # Smaller slowdowns are timer noise, whatever their factor
+
+
+def measure(function, items, repeat):
+    """
+    Time one pass of a function over all items.
+
+    :return: Result dict with the best and median pass time and the best time per item
+    """
+    times = timeit.repeat(lambda: [function(item) for item in items], number=1, repeat=repeat)
+    return {'items': len(items), 'seconds': min(times), 'median_seconds': statistics.median(times),
+            'per_item_ms': min(times) / len(items) * 1000 if items else 0.0}
+
+
+def raw_titles(list_pages):
+    # The listing titles as they are before clean_title
+    titles = []
+    for _, html in list_pages:
+        box = find_subtree(html, 'article-list-box')
+        if box:
+            titles.extend(tag.get_text(strip=True) for tag in box.select('a.article-list-item-title h3'))
+    return titles
+
+
+def raw_bodies(article_pages):
+    # The article text as it is before clean_body
+    bodies = []
+    for _, html in article_pages:
+        box = find_subtree(html, 'article-details-box')
+        main = box.find('div', class_='article-details-main') if box else None
+        if main:
+            bodies.append(main.get_text(strip=True, separator='\n'))
+    return bodies
+
+
+def article_rows(article_pages, base_url):
+    # Article rows as the LLM stage reads them from the article store
+    rows = []
+    now = datetime.now(timezone.utc)
+    for path, html in article_pages:
+        body, publish_datetime = parse_article_html(refresh_dates(html, now))
+        box = find_subtree(html, 'article-details-box')
+        title = box.find('h1').get_text(strip=True) if box and box.find('h1') else path
+        rows.append({'exchange': 'Gate.io', 'publish_datetime': publish_datetime, 'title': clean_title(title),
+                     'link': f"{base_url}{path}", 'body': body or ''})
+    return rows
+
+
+def bench_parsing(corpus, repeat):
+    list_pages, article_pages = corpus_items(corpus)
+    results = {}
+    if list_pages:
+        results['parse_html'] = measure(lambda page: parse_html(page[1], 'benchmark'), list_pages, repeat)
+        results['clean_title'] = measure(clean_title, raw_titles(list_pages), repeat)
+    if article_pages:
+        results['parse_article_html'] = measure(lambda page: parse_article_html(page[1]), article_pages, repeat)
+        results['clean_body'] = measure(clean_body, raw_bodies(article_pages), repeat)
+
+        # Compaction with the boilerplate of the corpus itself; the token counts go with the timing
+        bodies = [clean_body(body) for body in raw_bodies(article_pages)]
+        compactor = PromptCompactor(boilerplate_keys(bodies), PROMPT_TOKEN_BUDGET)
+        results['compact_prompt'] = measure(compactor.compact, bodies, repeat)
+        reports = [compactor.compact(body)[1] for body in bodies]
+        results['compact_prompt']['tokens_before'] = sum(report['tokens_before'] for report in reports)
+        results['compact_prompt']['tokens_after'] = sum(report['tokens_after'] for report in reports)
+    return results
+
+
+def bench_llm(corpus, server, calls, repeat):
+    """
+    Time get_llm_response against the stand-in, without the LLM cache. The overhead is the
+    time spent beyond the simulated run latency.
+    """
+    _, article_pages = corpus_items(corpus)
+    rows = article_rows(article_pages[:calls], server.base_url)
+    if not rows:
+        return {}
+    gateio_get_json.client = openai.OpenAI(base_url=f"{server.base_url}/v1", api_key='benchmark', max_retries=0)
+    prompts = [(gateio_get_json.prepare_content(row), gateio_get_json.determine_assistant(row['title'])) for row in rows]
+    result = measure(lambda prompt: gateio_get_json.get_llm_response(*prompt), prompts, repeat)
+    result['overhead_ms'] = result['per_item_ms'] - server.config.llm_latency * 1000
+    return {'get_llm_response': result}
+
+
+def bench_calendar(event_count, repeat):
+    """
+    Time the calendar stage on synthetic events: answering the calendar requests from the
+    event index (formerly filter_events) and writing the calendar files.
+    """
+    events = generate_events(event_count)
+    with open(os.path.join(REPO_DIR, 'gateio_calendar_requests.json'), 'r') as file:
+        requests = list(json.load(file).values())
+    requests += [{'event_type': [], 'tokens': [token], 'trading_pairs': [], 'markets': ['Spot']} for token in ('BTC', 'ETH', 'SOL')]
+
+    results = {'build_event_index': measure(gateio_get_calendar.EventIndex, [events], repeat)}
+    index = gateio_get_calendar.EventIndex(events)
+    results['filter_events'] = measure(index.match, requests, repeat)
+
+    matches = [(index.match(request), '_'.join(request['event_type']) or 'tokens') for request in requests]
+    output_dir = gateio_get_calendar.OUTPUT_DIR
+    with tempfile.TemporaryDirectory() as temp_dir:
+        gateio_get_calendar.OUTPUT_DIR = temp_dir
+        try:
+            # Empty fingerprints, so every calendar is written
+            results['save_calendar'] = measure(lambda match: gateio_get_calendar.save_calendar(match[0], match[1], {}), matches, repeat)
+        finally:
+            gateio_get_calendar.OUTPUT_DIR = output_dir
+    results['save_calendar']['events'] = sum(len(events) for events, _ in matches)
+    return results
+
+
+def run_pipeline_once(server, corpus, home, stream):
+    """
+    Run gateio_main in a subprocess whose home, gate.io and OpenAI API all point at the benchmark setup.
+
+    :return: Result dict with the wall time, stage times and counters of the run
+    """
+    parsley_dir = os.path.join(home, 'parsley')
+    env = dict(os.environ, HOME=home, GATEIO_BASE_URL=server.base_url, OPENAI_BASE_URL=f"{server.base_url}/v1",
+               OPENAI_API_KEY='benchmark')
+    server.reset()
+    start_time = time.perf_counter()
+    process = subprocess.run([sys.executable, MAIN_SCRIPT] + (['--stream'] if stream else []), cwd=parsley_dir, env=env,
+                             capture_output=True, text=True, timeout=END_TO_END_TIMEOUT)
+    elapsed = time.perf_counter() - start_time
+
+    result = {'seconds': elapsed, 'returncode': process.returncode, 'server': dict(server.counts)}
+    summaries = sorted(glob.glob(os.path.join(parsley_dir, 'Gateio_Files', 'Gateio_Metrics', 'runs', '*.json')))
+    if summaries:
+        with open(summaries[-1], 'r') as file:
+            summary = json.load(file)
+        result['stages'] = {stage['name']: stage['seconds'] for stage in summary.get('stages', [])}
+        result['counters'] = {counter['name'] + ''.join(f"[{value}]" for value in counter['labels'].values()): counter['value']
+                              for counter in summary.get('counters', [])}
+    if process.returncode != 0:
+        result['error'] = process.stderr[-2000:]
+    return result
+
+
+def bench_end_to_end(corpus, server, stream, repeat):
+    """
+    Time a cold pipeline run on an empty home and the warm run right after it, which finds nothing new.
+    """
+    runs = {'cold': [], 'warm': []}
+    for _ in range(repeat):
+        home = tempfile.mkdtemp(prefix='gateio_benchmark_')
+        try:
+            parsley_dir = os.path.join(home, 'parsley')
+            os.makedirs(parsley_dir)
+            with open(os.path.join(parsley_dir, 'gateio_categories.tsv'), 'w') as file:
+                for path, category in corpus['categories'].items():
+                    file.write(f"{server.base_url}{path}\t{category}\n")
+            shutil.copy(os.path.join(REPO_DIR, 'gateio_calendar_requests.json'), parsley_dir)
+            for label in ('cold', 'warm'):
+                runs[label].append(run_pipeline_once(server, corpus, home, stream))
+        finally:
+            shutil.rmtree(home, ignore_errors=True)
+
+    mode = 'stream' if stream else 'batch'
+    results = {}
+    for label, label_runs in runs.items():
+        best = min(label_runs, key=lambda run: run['seconds'])
+        best['median_seconds'] = statistics.median(run['seconds'] for run in label_runs)
+        results[f"end_to_end_{mode}_{label}"] = best
+    return results
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare_results(base, current, threshold):
+    """
+    Print the change of every benchmark against an earlier result file.
+
+    :return: List of the benchmarks that got slower by more than the threshold factor
+    """
+    if base.get('corpus', {}).get('fingerprint') != current['corpus']['fingerprint']:
+        print("Warning: the results were measured on different fixture corpora")
+    regressions = []
+    for name, result in current['benchmarks'].items():
+        before = base.get('benchmarks', {}).get(name)
+        if not before or not before.get('seconds'):
+            continue
+        ratio = result['seconds'] / before['seconds']
+        flag = ''
+        if ratio > threshold and result['seconds'] - before['seconds'] > MIN_REGRESSION_SECONDS:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:32} {before['seconds'] * 1000:10.1f} ms -> {result['seconds'] * 1000:10.1f} ms  {ratio:5.2f}x{flag}")
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Run the offline benchmark suite against the fixture corpus and a local stand-in server.")
+    arg_parser.add_argument('--fixtures', default=FIXTURE_DIR, help="Fixture directory, a synthetic corpus is used when it is empty")
+    arg_parser.add_argument('--repeat', type=int, default=3, help="Timing repetitions of the micro benchmarks")
+    arg_parser.add_argument('--llm-calls', type=int, default=20, help="get_llm_response calls per repetition")
+    arg_parser.add_argument('--events', type=int, default=3000, help="Synthetic events of the calendar benchmarks")
+    arg_parser.add_argument('--end-to-end', type=int, default=1, help="Cold and warm pipeline runs per mode, 0 to skip")
+    arg_parser.add_argument('--latency', type=float, default=0.02, help="Mean page latency of the stand-in in seconds")
+    arg_parser.add_argument('--error-rate', type=float, default=0.02, help="Share of pages failing once with 502")
+    arg_parser.add_argument('--rate-limit', type=float, default=0.0, help="Page requests per second before 429, 0 for no limit")
+    arg_parser.add_argument('--llm-latency', type=float, default=0.05, help="Assistant run latency of the stand-in in seconds")
+    arg_parser.add_argument('--llm-rate-limit', type=float, default=0.0, help="Assistant runs per second before 429, 0 for no limit")
+    arg_parser.add_argument('--output', help="Result file, by default a new file in the results directory")
+    arg_parser.add_argument('--compare', help="Earlier result file to compare against")
+    arg_parser.add_argument('--threshold', type=float, default=1.2, help="Slowdown factor counted as a regression")
+    args = arg_parser.parse_args()
+
+    if os.path.exists(corpus_path(args.fixtures)):
+        corpus = load_corpus(args.fixtures)
+    else:
+        print(f"No fixture corpus in {args.fixtures}, using the synthetic corpus")
+        corpus = generate_corpus()
+    list_pages, article_pages = corpus_items(corpus)
+
+    config = StandInConfig(args.latency, error_rate=args.error_rate, rate_limit=args.rate_limit,
+                           llm_latency=args.llm_latency, llm_rate_limit=args.llm_rate_limit)
+    server = StandInServer(corpus, config).start()
+    commit, dirty = git_revision()
+    results = {
+        'suite_version': SUITE_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'dirty': dirty,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {'source': corpus.get('source'), 'fingerprint': corpus_fingerprint(corpus),
+                   'list_pages': len(list_pages), 'article_pages': len(article_pages)},
+        'server': config.to_dict(),
+        'benchmarks': {},
+    }
+    try:
+        results['benchmarks'].update(bench_parsing(corpus, args.repeat))
+        results['benchmarks'].update(bench_llm(corpus, server, args.llm_calls, args.repeat))
+        results['benchmarks'].update(bench_calendar(args.events, args.repeat))
+        if args.end_to_end:
+            for stream in (False, True):
+                results['benchmarks'].update(bench_end_to_end(corpus, server, stream, args.end_to_end))
+    finally:
+        server.stop()
+
+    for name, result in results['benchmarks'].items():
+        detail = f"{result['per_item_ms']:.2f} ms/item over {result['items']}" if 'per_item_ms' in result \
+            else f"exit {result['returncode']}, stages " + ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in result.get('stages', {}).items())
+        second_pass = {decision: result.get('counters', {}).get(f"gateio_llm_second_pass_total[{decision}]", 0)
+                       for decision in ('run', 'skipped')}
+        if sum(second_pass.values()):
+            detail += f", second pass {second_pass['run']}/{sum(second_pass.values())}"
+        if 'tokens_before' in result:
+            detail += f", prompt tokens {result['tokens_before']} -> {result['tokens_after']}"
+        print(f"{name:32} {result['seconds']:8.3f}s  {detail}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"gateio_benchmark_{datetime.now():%y%m%d_%H%M%S}_{(commit or 'nocommit')[:8]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=4)
+    print(f"Saved results to {output}")
+
+    failed = [name for name, result in results['benchmarks'].items() if result.get('returncode')]
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            failed += compare_results(json.load(file), results, args.threshold)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# File: gateio_calendar_benchmark.py
+
+import os
+import re
+import sys
+import random
+import argparse
+import tempfile
+import timeit
+import warnings
+from datetime import datetime, timedelta, timezone
+from ics import Calendar, Event, DisplayAlarm
+from gateio_event_store import EventStore, EVENT_STORE_FILE
+from gateio_get_calendar import EventIndex, generate_event_name, generate_event_description, build_ics_events
+from gateio_ics_writer import write_calendar
+
+EDGE_CASE_TEXT = ['Listing; of, BTC', 'Line\nbreak', 'Back\\slash', 'Carriage\rreturn', '', 'Plain']
+EDGE_CASE_DATETIMES = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S+08:00', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%d %H:%M']
+
+# Reference implementation: the ics library calendar the streaming writer has to reproduce
+def reference_ics_events(event_data, start_datetime, end_datetime):
+    assets = event_data.get('tokens', []) + event_data.get('trading_pairs', [])
+
+    def create_event(location, begin, end, uid):
+        event = Event()
+        event.name = generate_event_name(event_data['exchange_name'], event_data['event_type'], assets)
+        event.description = generate_event_description(event_data, assets)
+        if location:
+            event.location = location
+        event.url = event_data.get('article_link', "")
+        event.begin = begin
+        event.end = end
+        event.uid = uid
+        event.transparent = True
+        event.alarms.append(DisplayAlarm(trigger=timedelta(days=-1)))
+        event.alarms.append(DisplayAlarm(trigger=timedelta(hours=-1)))
+        return event
+
+    if start_datetime.date() == end_datetime.date():
+        return [create_event(None, start_datetime.replace(minute=0, second=0, microsecond=0),
+                             end_datetime.replace(minute=30, second=0, microsecond=0), event_data['UID'])]
+    return [create_event("Period Starts", start_datetime, start_datetime + timedelta(minutes=30), f"{event_data['UID']}_start"),
+            create_event("Period Ends", end_datetime - timedelta(minutes=30), end_datetime, f"{event_data['UID']}_end")]
+
+def reference_calendar(events):
+    calendar = Calendar()
+    for event, start_datetime, end_datetime in events:
+        try:
+            for ics_event in reference_ics_events(event, start_datetime, end_datetime):
+                calendar.events.add(ics_event)
+        except (KeyError, ValueError):
+            continue
+    return calendar.serialize()
+
+def streamed_calendar(events, path):
+    write_calendar(path, build_ics_events(events))
+    with open(path, 'r', newline='') as file:
+        return file.read()
+
+def generate_events(count, seed=0):
+    """
+    Generate events covering single-day and multi-day periods, time zones and escaped characters.
+
+    :return: List of event dicts as stored by the event store
+    """
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc).replace(tzinfo=None)
+    events = []
+    for i in range(count):
+        begin = start + timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+        end = begin + timedelta(minutes=rng.choice([0, 20, 90, 60 * 24, 60 * 24 * 7]))
+        events.append({
+            'exchange_name': 'Gate.io',
+            'event_type': rng.sample(['Listing', 'Delisting', 'Airdrop'], rng.randint(1, 2)),
+            'tokens': rng.sample(['BTC', 'ETH', 'SOL', 'DOGE'], rng.randint(0, 3)),
+            'trading_pairs': rng.sample(['BTC/USDT', 'ETH/USDT'], rng.randint(0, 2)),
+            'markets': rng.sample(['Spot', 'Futures'], rng.randint(0, 2)),
+            'event_summary': rng.choice(EDGE_CASE_TEXT),
+            'numerical_data': rng.sample(EDGE_CASE_TEXT, rng.randint(0, 2)),
+            'user_action_required': rng.choice(EDGE_CASE_TEXT),
+            'start_datetime': begin.strftime(rng.choice(EDGE_CASE_DATETIMES)),
+            'end_datetime': end.strftime(rng.choice(EDGE_CASE_DATETIMES)),
+            'article_link': rng.choice(['https://www.gate.io/article/1', 'https://x/a,b;c', '']),
+            'UID': f"{i:032x}@1",
+        })
+    return events
+
+def split_calendar(content):
+    """
+    :return: Tuple of (content outside the events, sorted list of VEVENT blocks)
+    """
+    blocks = re.findall(r'BEGIN:VEVENT.*?END:VEVENT', content, re.S)
+    return re.sub(r'(\r\nBEGIN:VEVENT.*?END:VEVENT)+', '', content, flags=re.S), sorted(blocks)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Check and benchmark the streaming ICS writer against the ics library.")
+    arg_parser.add_argument('--store', default=EVENT_STORE_FILE, help="Event store with real events")
+    arg_parser.add_argument('--generate', type=int, default=2000, help="Number of synthetic events to add")
+    arg_parser.add_argument('--repeat', type=int, default=3, help="Number of timing repetitions")
+    args = arg_parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    events = generate_events(args.generate)
+    if args.store and os.path.exists(args.store):
+        store = EventStore(args.store, json_file=None)
+        events = store.query_events() + events
+        store.close()
+    indexed = EventIndex(events).events
+    print(f"{len(indexed)} events")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'benchmark.ics')
+        # The ics library writes the events in set order, so the events are compared as a multiset
+        reference = split_calendar(reference_calendar(indexed))
+        streamed = split_calendar(streamed_calendar(indexed, path))
+        identical = reference == streamed
+        print(f"Streaming writer output {'matches' if identical else 'DIFFERS FROM'} the ics library "
+              f"({len(streamed[1])}/{len(reference[1])} VEVENTs)")
+
+        reference_time = min(timeit.repeat(lambda: reference_calendar(indexed), number=1, repeat=args.repeat))
+        streamed_time = min(timeit.repeat(lambda: streamed_calendar(indexed, path), number=1, repeat=args.repeat))
+        print(f"ics library {reference_time * 1000:.1f} ms, streaming writer {streamed_time * 1000:.1f} ms, "
+              f"speedup {reference_time / streamed_time:.1f}x")
+
+    sys.exit(0 if identical else 1)
+
+if __name__ == '__main__':
+    main()
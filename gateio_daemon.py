@@ -0,0 +1,161 @@
+# File: gateio_daemon.py
+
+import os
+import time
+import signal
+import argparse
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+import gateio_logger_setup
+import gateio_get_json
+import gateio_get_calendar
+from gateio_folder_structure import create_directory_structure
+from gateio_get_article_list import load_gateio_categories
+from gateio_get_articles import recheck_articles
+from gateio_article_store import ArticleStore, ARTICLE_STORE_FILE
+from gateio_stream_pipeline import run_streaming
+from gateio_archive_handler import archive_all
+from gateio_metrics import metrics, publish_run
+
+# Bounds of the poll interval of a category, in seconds
+MIN_POLL_INTERVAL = 5 * 60
+MAX_POLL_INTERVAL = 24 * 3600
+# A category is polled about this many times per article it is expected to publish
+POLLS_PER_ARTICLE = 2
+# Publish history used to estimate the rate of every category
+RATE_LOOKBACK = timedelta(days=30)
+# Interval of the full calendar pass (drops aged-out events) and the archive snapshot
+HOUSEKEEPING_INTERVAL = 3600
+# Wait after a failed poll before the same categories are tried again
+FAILURE_BACKOFF = 60
+
+
+def poll_interval(articles_per_hour, min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL):
+    """
+    Seconds until the next poll of a category that publishes at the given rate.
+
+    :param articles_per_hour: Observed publish rate of the category
+    :return: Interval between min_interval and max_interval
+    """
+    if articles_per_hour <= 0:
+        return max_interval
+    return min(max_interval, max(min_interval, 3600 / (articles_per_hour * POLLS_PER_ARTICLE)))
+
+
+class CategoryScheduler:
+    """
+    Keeps the next poll time of every category, spaced by the category's observed publish rate.
+
+    :param categories: Dict mapping category URL to category name
+    :param store_file: Path of the article store the publish history is read from
+    :param min_interval: Shortest poll interval in seconds
+    :param max_interval: Longest poll interval in seconds
+    """
+    def __init__(self, categories, store_file=ARTICLE_STORE_FILE, min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL):
+        self.categories = categories
+        self.store_file = store_file
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.next_poll = {url: 0.0 for url in categories}  # Every category is due on start
+
+    def publish_rates(self):
+        """
+        :return: Dict mapping category name to articles per hour over the lookback period
+        """
+        since = (datetime.now(timezone.utc) - RATE_LOOKBACK).strftime('%Y-%m-%d %H:%M:%S') + ' UTC'
+        store = ArticleStore(self.store_file)
+        try:
+            counts = store.category_counts(since)
+        finally:
+            store.close()
+        hours = RATE_LOOKBACK.total_seconds() / 3600
+        return {category: count / hours for category, count in counts.items()}
+
+    def due(self, now):
+        """
+        :return: Dict of the categories whose poll time has come
+        """
+        return {url: category for url, category in self.categories.items() if self.next_poll[url] <= now}
+
+    def seconds_until_next(self, now):
+        return max(0.0, min(self.next_poll.values()) - now)
+
+    def reschedule(self, categories, now):
+        """
+        Schedule the next poll of the given categories from their current publish rates.
+        """
+        rates = self.publish_rates()
+        for url, category in categories.items():
+            interval = poll_interval(rates.get(category, 0.0), self.min_interval, self.max_interval)
+            self.next_poll[url] = now + interval
+            logging.info(f"Next poll of {category} in {interval / 60:.0f} min ({rates.get(category, 0.0) * 24:.2f} articles/day)")
+
+    def postpone(self, categories, now, delay):
+        for url in categories:
+            self.next_poll[url] = now + delay
+
+
+def run_daemon(min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL, stop_event=None):
+    """
+    Poll the categories as they fall due, streaming new articles through to the calendars,
+    and run the housekeeping periodically: edited articles are queued for the next poll, then the
+    calendars are rebuilt and archived. Runs until stop_event is set.
+    """
+    stop_event = stop_event or threading.Event()
+    scheduler = CategoryScheduler(load_gateio_categories(), min_interval=min_interval, max_interval=max_interval)
+    next_housekeeping = time.monotonic() + HOUSEKEEPING_INTERVAL
+
+    while not stop_event.is_set():
+        now = time.monotonic()
+        due = scheduler.due(now)
+        if due:
+            logging.info(f"Polling {len(due)} due categories: {', '.join(due.values())}")
+            baseline = metrics.snapshot()
+            start_time = time.perf_counter()
+            stats = None
+            try:
+                stats = run_streaming(categories=due)
+                scheduler.reschedule(due, time.monotonic())
+            except Exception:
+                logging.exception(f"Poll failed, retrying in {FAILURE_BACKOFF} seconds")
+                scheduler.postpone(due, time.monotonic(), FAILURE_BACKOFF)
+            elapsed = time.perf_counter() - start_time
+            metrics.set('gateio_stage_success', int(stats is not None), stage='stream')
+            metrics.set('gateio_stage_seconds', elapsed, stage='stream')
+            publish_run({
+                'succeeded': stats is not None,
+                'categories': sorted(due.values()),
+                'stages': [{'name': 'stream', 'status': 'ok' if stats else 'failed', 'seconds': round(elapsed, 3)}],
+                'stream': dict(stats.counts) if stats else {},
+            }, baseline)
+
+        if time.monotonic() >= next_housekeeping:
+            try:
+                recheck_articles()
+                gateio_get_calendar.main()
+                archive_all(datetime.now().strftime("%y%m%d_%H%M%S"))
+            except Exception:
+                logging.exception("Housekeeping failed")
+            next_housekeeping = time.monotonic() + HOUSEKEEPING_INTERVAL
+
+        wait = min(scheduler.seconds_until_next(time.monotonic()), max(0.0, next_housekeeping - time.monotonic()))
+        stop_event.wait(wait)
+    logging.info("Daemon stopped")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Poll the Gate.io categories continuously, each at its own adaptive interval.")
+    arg_parser.add_argument('--min-interval', type=float, default=MIN_POLL_INTERVAL, help="Shortest poll interval in seconds")
+    arg_parser.add_argument('--max-interval', type=float, default=MAX_POLL_INTERVAL, help="Longest poll interval in seconds")
+    args = arg_parser.parse_args()
+
+    gateio_logger_setup.setup_logging()
+    create_directory_structure(os.getcwd())
+    gateio_get_json.init_client()
+
+    # Finish the current poll and exit on SIGTERM or Ctrl-C
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    run_daemon(args.min_interval, args.max_interval, stop)
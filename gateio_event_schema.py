@@ -0,0 +1,138 @@
+# File: gateio_event_schema.py
+
+import re
+import argparse
+import logging
+from datetime import timedelta
+from urllib.parse import urlparse
+from dateutil import parser
+import gateio_logger_setup
+from gateio_event_store import EventStore
+
+# Event format the assistants answer with, as a JSON schema. The calendar needs every required field.
+EVENT_SCHEMA = {
+    'type': 'object',
+    'required': ['exchange_name', 'event_type', 'tokens', 'trading_pairs', 'markets',
+                 'start_datetime', 'end_datetime', 'article_link'],
+    'properties': {
+        'exchange_name': {'type': 'string', 'minLength': 1},
+        'event_type': {'type': 'array', 'minItems': 1, 'items': {'type': 'string', 'minLength': 1}},
+        'tokens': {'type': 'array', 'items': {'type': 'string', 'minLength': 1}},
+        'trading_pairs': {'type': 'array', 'items': {'type': 'string', 'pattern': r'^[A-Za-z0-9.$-]+[/_][A-Za-z0-9.$-]+$'}},
+        'markets': {'type': 'array', 'items': {'type': 'string', 'minLength': 1}},
+        'start_datetime': {'type': 'string', 'minLength': 1},
+        'end_datetime': {'type': 'string', 'minLength': 1},
+        'article_link': {'type': 'string', 'minLength': 1},
+        'event_summary': {'type': 'string'},
+    },
+}
+RESPONSE_SCHEMA = {
+    'type': 'object',
+    'required': ['events'],
+    'properties': {'events': {'type': 'array', 'items': EVENT_SCHEMA}},
+}
+
+# Events further from the publish date than this are taken as a misread date
+MAX_EVENT_DISTANCE = timedelta(days=366)
+
+_JSON_TYPES = {'object': dict, 'array': list, 'string': str}
+
+
+def validate(instance, schema, path='$'):
+    """
+    Validate a value against the subset of JSON schema used here: type, required,
+    properties, items, minItems, minLength and pattern.
+
+    :return: List of error messages, empty when the value is valid
+    """
+    expected = _JSON_TYPES[schema['type']]
+    if not isinstance(instance, expected):
+        return [f"{path}: expected {schema['type']}, got {type(instance).__name__}"]
+
+    errors = []
+    if expected is dict:
+        errors += [f"{path}: missing '{key}'" for key in schema.get('required', []) if key not in instance]
+        for key, subschema in schema.get('properties', {}).items():
+            if key in instance:
+                errors += validate(instance[key], subschema, f"{path}.{key}")
+    elif expected is list:
+        if len(instance) < schema.get('minItems', 0):
+            errors.append(f"{path}: fewer than {schema['minItems']} items")
+        if 'items' in schema:
+            for position, item in enumerate(instance):
+                errors += validate(item, schema['items'], f"{path}[{position}]")
+    else:
+        if len(instance) < schema.get('minLength', 0):
+            errors.append(f"{path}: empty")
+        if 'pattern' in schema and not re.search(schema['pattern'], instance):
+            errors.append(f"{path}: '{instance}' does not match {schema['pattern']}")
+    return errors
+
+
+def check_consistency(event, row, path):
+    """
+    Checks the schema cannot express: parseable datetimes in order and near the publish
+    date, and the link of the article the event was extracted from.
+
+    :return: List of error messages
+    """
+    errors = []
+    try:
+        start = parser.parse(event['start_datetime']).replace(tzinfo=None)
+        end = parser.parse(event['end_datetime']).replace(tzinfo=None)
+    except (ValueError, OverflowError, TypeError) as e:
+        return [f"{path}: unparseable datetime ({e})"]
+    if end < start:
+        errors.append(f"{path}: end_datetime {event['end_datetime']} before start_datetime {event['start_datetime']}")
+
+    try:
+        published = parser.parse(row['publish_datetime']).replace(tzinfo=None)
+    except (KeyError, ValueError, OverflowError, TypeError):
+        published = None
+    if published and (abs(start - published) > MAX_EVENT_DISTANCE or abs(end - published) > MAX_EVENT_DISTANCE):
+        errors.append(f"{path}: datetimes more than {MAX_EVENT_DISTANCE.days} days from the publish date {row['publish_datetime']}")
+
+    link = row.get('link')
+    if link and urlparse(event['article_link']).path.rstrip('/') != urlparse(link).path.rstrip('/'):
+        errors.append(f"{path}: article_link {event['article_link']} is not the article {link}")
+    return errors
+
+
+def validate_response(response, row):
+    """
+    Validate an assistant response against the event schema and check every event for consistency.
+
+    :param response: Parsed response
+    :param row: Article row the response was extracted from, with 'link' and 'publish_datetime'
+    :return: List of error messages, empty when the response can be used as it is
+    """
+    errors = validate(response, RESPONSE_SCHEMA)
+    if errors:
+        return errors
+    for position, event in enumerate(response['events']):
+        errors += check_consistency(event, row, f"$.events[{position}]")
+    return errors
+
+
+if __name__ == '__main__':
+    gateio_logger_setup.setup_logging()
+
+    arg_parser = argparse.ArgumentParser(description="Validate the stored events against the event schema.")
+    arg_parser.add_argument('--limit', type=int, default=20, help="Invalid events to print")
+    args = arg_parser.parse_args()
+
+    event_store = EventStore()
+    try:
+        events = event_store.query_events()
+    finally:
+        event_store.close()
+
+    invalid = 0
+    for event in events:
+        errors = validate(event, EVENT_SCHEMA) or check_consistency(event, {'link': event.get('article_link')}, '$')
+        if errors:
+            invalid += 1
+            if invalid <= args.limit:
+                print(f"{event.get('UID')}: {'; '.join(errors)}")
+    print(f"{invalid} of {len(events)} stored events fail validation")
+    logging.info(f"Validated {len(events)} stored events, {invalid} invalid")
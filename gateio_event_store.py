@@ -0,0 +1,252 @@
+# File: gateio_event_store.py
+
+import os
+import json
+import sqlite3
+import argparse
+import logging
+from datetime import timezone
+from dateutil import parser
+import gateio_logger_setup
+
+EVENT_STORE_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Process/gateio_events.db')
+STRUCTURED_JSON_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Process/gateio_structured.json')
+
+# Event fields holding lists that calendar requests filter on
+INDEXED_ATTRIBUTES = ('event_type', 'tokens', 'trading_pairs', 'markets')
+DATETIME_KEY_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+class EventStore:
+    """
+    SQLite-backed store of the structured events extracted by the LLM.
+
+    New responses are appended in one transaction instead of rewriting the whole
+    history, and events are indexed by start datetime and by every value of their
+    event_type, tokens, trading_pairs and markets lists, so the calendar reads only
+    the events a request matches. Events are replaced by UID, which makes saving the
+    same responses twice harmless. On first use an existing structured JSON is migrated.
+
+    :param path: Path of the SQLite database
+    :param json_file: Legacy structured JSON to migrate when the database is created
+    """
+    def __init__(self, path=EVENT_STORE_FILE, json_file=STRUCTURED_JSON_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        is_new = not os.path.exists(path)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                response_id INTEGER NOT NULL REFERENCES responses (id) ON DELETE CASCADE,
+                uid TEXT UNIQUE,
+                article_link TEXT,
+                start_key TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS event_attributes (
+                event_id INTEGER NOT NULL REFERENCES events (id) ON DELETE CASCADE,
+                attribute TEXT NOT NULL,
+                value TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_events_response_id ON events (response_id);
+            CREATE INDEX IF NOT EXISTS idx_events_article_link ON events (article_link);
+            CREATE INDEX IF NOT EXISTS idx_events_start_key ON events (start_key);
+            CREATE INDEX IF NOT EXISTS idx_event_attributes_value ON event_attributes (attribute, value, event_id);
+            CREATE INDEX IF NOT EXISTS idx_event_attributes_event_id ON event_attributes (event_id);
+        """)
+        if is_new and json_file and os.path.exists(json_file):
+            self.migrate_from_json(json_file)
+
+    def add_responses(self, responses, replaced_links=()):
+        """
+        Append parsed LLM responses in one transaction, replacing stored events with the same UID.
+
+        The events stored earlier for the articles of the new events (and for replaced_links)
+        are removed first, so a re-extracted article keeps exactly its new events.
+
+        :param responses: List of parsed responses, each holding a list of events
+        :param replaced_links: Links of the articles the responses were extracted from
+        :return: Number of stored events
+        """
+        links = set(replaced_links) | {event.get('article_link') for response in responses
+                                       for event in response.get('events', []) if event.get('article_link')}
+        stored = 0
+        with self.conn:
+            self._remove_article_events(links)
+            for response in responses:
+                header = {key: value for key, value in response.items() if key != 'events'}
+                response_id = self.conn.execute("INSERT INTO responses (data) VALUES (?)", (json.dumps(header),)).lastrowid
+                for event in response.get('events', []):
+                    self._add_event(response_id, event)
+                    stored += 1
+        return stored
+
+    def _remove_article_events(self, links):
+        response_ids = set()
+        for link in links:
+            response_ids.update(row[0] for row in self.conn.execute("SELECT response_id FROM events WHERE article_link = ?", (link,)))
+            self.conn.execute("DELETE FROM events WHERE article_link = ?", (link,))
+        # Responses left without events belonged to the replaced extractions
+        self.conn.executemany("DELETE FROM responses WHERE id = ? AND NOT EXISTS (SELECT 1 FROM events WHERE response_id = ?)",
+                              [(response_id, response_id) for response_id in response_ids])
+
+    def article_events(self, links):
+        """
+        :param links: Article links
+        :return: List of the stored events of these articles
+        """
+        events = []
+        for link in links:
+            events.extend(json.loads(row[0]) for row in self.conn.execute(
+                "SELECT data FROM events WHERE article_link = ? ORDER BY id", (link,)))
+        return events
+
+    def article_links(self):
+        """
+        :return: Set of the article links that have stored events
+        """
+        return {row[0] for row in self.conn.execute("SELECT DISTINCT article_link FROM events WHERE article_link IS NOT NULL")}
+
+    def _add_event(self, response_id, event):
+        uid = event.get('UID')
+        if uid:
+            self.conn.execute("DELETE FROM events WHERE uid = ?", (uid,))
+        event_id = self.conn.execute(
+            "INSERT INTO events (response_id, uid, article_link, start_key, data) VALUES (?, ?, ?, ?, ?)",
+            (response_id, uid, event.get('article_link'), parse_datetime_key(event.get('start_datetime')), json.dumps(event))
+        ).lastrowid
+        self.conn.executemany(
+            "INSERT INTO event_attributes (event_id, attribute, value) VALUES (?, ?, ?)",
+            [(event_id, attribute, value) for attribute in INDEXED_ATTRIBUTES for value in attribute_values(event, attribute)]
+        )
+
+    def query_events(self, since=None, event_types=(), tokens=(), trading_pairs=(), markets=()):
+        """
+        Select events the way a calendar request does, using the indexes.
+
+        An event matches when it starts at or after since (its start datetime read as UTC),
+        has any of the event types, and has all of the tokens, trading pairs and markets.
+        Empty criteria match everything.
+
+        :return: List of event dicts, in the order they were stored
+        """
+        conditions = []
+        params = []
+        if since is not None:
+            conditions.append("e.start_key >= ?")
+            params.append(datetime_key(since))
+        if event_types:
+            conditions.append("EXISTS (SELECT 1 FROM event_attributes a WHERE a.event_id = e.id "
+                              f"AND a.attribute = 'event_type' AND a.value IN ({', '.join('?' for _ in event_types)}))")
+            params.extend(event_types)
+        for attribute, values in (('tokens', tokens), ('trading_pairs', trading_pairs), ('markets', markets)):
+            for value in set(values):
+                conditions.append("EXISTS (SELECT 1 FROM event_attributes a WHERE a.event_id = e.id "
+                                  "AND a.attribute = ? AND a.value = ?)")
+                params.extend((attribute, value))
+
+        query = "SELECT e.data FROM events e"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY e.id"
+        return [json.loads(row[0]) for row in self.conn.execute(query, params)]
+
+    def load_responses(self):
+        """
+        :return: List of all stored responses in the legacy structured JSON format
+        """
+        responses = {}
+        for response_id, data in self.conn.execute("SELECT id, data FROM responses ORDER BY id"):
+            responses[response_id] = dict(json.loads(data), events=[])
+        for response_id, data in self.conn.execute("SELECT response_id, data FROM events ORDER BY id"):
+            responses[response_id]['events'].append(json.loads(data))
+        return list(responses.values())
+
+    def migrate_from_json(self, json_file=STRUCTURED_JSON_FILE):
+        """
+        Import a structured JSON file.
+
+        :param json_file: Path of the structured JSON
+        :return: Number of imported events
+        """
+        with open(json_file, 'r') as file:
+            data = json.load(file)
+        imported = self.add_responses(data if isinstance(data, list) else [data])
+        logging.info(f"Migrated {imported} events from {json_file} to {self.path}")
+        return imported
+
+    def export_to_json(self, json_file=STRUCTURED_JSON_FILE):
+        """
+        Write all responses in the legacy structured JSON format.
+
+        :param json_file: Path of the JSON file to write
+        """
+        with open(json_file, 'w') as file:
+            json.dump(self.load_responses(), file, indent=4)
+        logging.info(f"Exported {self.path} to {json_file}")
+
+    def close(self):
+        self.conn.close()
+
+
+def datetime_key(value):
+    """
+    Sortable text key of a datetime, with aware datetimes converted to UTC.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime(DATETIME_KEY_FORMAT)
+
+
+def parse_datetime_key(value):
+    """
+    Sortable text key of an event datetime string.
+
+    Like the calendar filter, the wall-clock time is read as UTC whatever offset it carries.
+
+    :return: The key, or None when the value cannot be parsed
+    """
+    if not value:
+        return None
+    try:
+        return parser.parse(value).replace(tzinfo=None).strftime(DATETIME_KEY_FORMAT)
+    except (ValueError, OverflowError, TypeError):
+        logging.warning(f"Unparseable event datetime: {value}")
+        return None
+
+
+def attribute_values(event, attribute):
+    """
+    :return: Set of the values of an indexed event field
+    """
+    values = event.get(attribute) or []
+    if isinstance(values, str):
+        values = [values]
+    return {str(value) for value in values if value is not None}
+
+
+if __name__ == '__main__':
+    gateio_logger_setup.setup_logging()
+
+    arg_parser = argparse.ArgumentParser(description="Migrate the structured events between JSON and SQLite.")
+    arg_parser.add_argument('--migrate', metavar='JSON', nargs='?', const=STRUCTURED_JSON_FILE,
+                            help="Import a structured JSON file into the store")
+    arg_parser.add_argument('--export', metavar='JSON', nargs='?', const=STRUCTURED_JSON_FILE,
+                            help="Export the store to a structured JSON file")
+    args = arg_parser.parse_args()
+
+    store = EventStore(json_file=None)
+    try:
+        if args.migrate:
+            print(f"Imported {store.migrate_from_json(args.migrate)} events from {args.migrate}")
+        if args.export:
+            store.export_to_json(args.export)
+            print(f"Exported events to {args.export}")
+    finally:
+        store.close()
@@ -0,0 +1,66 @@
+# File: gateio_extraction_journal.py
+
+import os
+import json
+import threading
+import logging
+
+EXTRACTION_JOURNAL_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Process/gateio_extraction_journal.jsonl')
+
+
+class ExtractionJournal:
+    """
+    Append-only journal of completed LLM extractions.
+
+    Every completed article is written and fsynced before its llm_processed flag is
+    committed, so the results of an interrupted run can be recovered by the next run
+    instead of being paid for again. The journal is cleared once the results have been
+    saved to the event store.
+
+    :param path: Path of the JSONL journal
+    """
+    def __init__(self, path=EXTRACTION_JOURNAL_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Read the entries left behind by an interrupted run.
+
+        :return: Dict mapping article link to its parsed response, in journal order
+        """
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, 'r') as file:
+            for line_number, line in enumerate(file, 1):
+                try:
+                    entry = json.loads(line)
+                    entries[entry['link']] = entry['response']
+                except (json.JSONDecodeError, KeyError):
+                    # A crash can leave a partially written last line behind
+                    logging.warning(f"Skipping unreadable journal line {line_number} in {self.path}")
+        return entries
+
+    def append(self, link, response):
+        """
+        Durably record the response of one article.
+
+        :param link: Article link
+        :param response: Parsed LLM response
+        """
+        line = json.dumps({'link': link, 'response': response}) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as file:
+                file.write(line)
+                file.flush()
+                os.fsync(file.fileno())
+
+    def clear(self):
+        """
+        Remove all entries once they have been saved elsewhere.
+        """
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -9,9 +9,11 @@ def create_directory_structure(base_path):
     directories = [
         "Gateio_Files/Gateio_Article_Archive",
         "Gateio_Files/Gateio_Article_Process",
+        "Gateio_Files/Gateio_HTTP_Cache",
         "Gateio_Files/Gateio_JSON_Archive",
         "Gateio_Files/Gateio_JSON_Process",
         "Gateio_Files/Gateio_Logs",
+        "Gateio_Files/Gateio_Metrics",
         "Gateio_Files/Gateio_Subscribe"
     ]
     
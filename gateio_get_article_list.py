@@ -1,19 +1,33 @@
 #File: gateio_get_article_list_new.py
 
 import os
-import pandas as pd
 import time
-import random
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
 from datetime import datetime, timezone
-import re
 import logging
 import gateio_logger_setup
+from gateio_text_normalizer import clean_title
+from gateio_html_parser import find_subtree
+from gateio_rate_limiter import HostRateLimiter
+from gateio_http_cache import HTTPCache
+from gateio_article_store import ArticleStore, ARTICLE_STORE_FILE
+from gateio_metrics import metrics
 
-ARTICLE_COLLECTION_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Process/gateio_article_collection.tsv')
 ARTICLE_CATEGORIES_FILE = os.path.expanduser('~/parsley/gateio_categories.tsv')
+# Site the relative article links are resolved against, overridden to point the crawl at a local stand-in server
+GATEIO_BASE_URL = os.getenv('GATEIO_BASE_URL', 'https://www.gate.io')
+
+# Headers to mimic a browser
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+
+# Crawl settings: number of categories crawled in parallel, the request budget per host
+# and how many listing pages of a single category may be followed in one run
+MAX_WORKERS = 4
+REQUESTS_PER_SECOND = 4.0
+REQUEST_BURST = 4
+MAX_PAGES = 10
 
 # Function to load URLs and categories from the txt file
 def load_gateio_categories(filename = ARTICLE_CATEGORIES_FILE):
@@ -24,52 +38,46 @@ def load_gateio_categories(filename = ARTICLE_CATEGORIES_FILE):
             gateio_categories[url] = category
     return gateio_categories
 
-# Function to clean title
-def clean_title(title):
-    title = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F700-\U0001F77F\u2700-\u27BF\u2600-\u26FF\uFE0F]', '', title)
-    title = re.sub(r'\u00A0', ' ', title)
-    title = re.sub(r'[\u25CB-\u25EF\u2B50-\u2B55\u1F9E]', '', title)
-
-    title = re.sub(r'\u3001', ', ', title)
-    title = re.sub(r'\uff1a', ': ', title)
-    title = re.sub(r'\uff01', '! ', title)
-    title = re.sub(r'\.\.', '.', title)
-    title = re.sub(r' ,', ',', title)
-    title = re.sub(r' :', ':', title)
-
-    title = re.sub(r'\u2013', '-', title)  # Replaces en dash with a hyphen
-    title = re.sub(r'\u2014', '-', title)  # Replaces em dash with a hyphen
-    title = re.sub(r'["\u201c\u201d\u2018\u2019]', '', title)
-    title = re.sub(r'\t+', ' ', title)
-    title = re.sub(r'&', 'and', title)
-
-    title = re.sub(r'\u3010.*?\u3011', '', title)  # Remove text within ［ and ］
-    title = re.sub(r'\uff06', 'and', title)
-    title = re.sub(r'\uff08', '(', title)
-    title = re.sub(r'\uff09', ')', title)
-    title = re.sub(r'\u25cf', '\u2022', title)
-
-    return title.strip()
-
 # Function to get HTML content with retry mechanism
-def get_html(url, max_retries=3, backoff_factor=2):
+def get_html(url, max_retries=3, backoff_factor=2, rate_limiter=None, cache=None):
     retries = 0
+    conditional = cache is not None
     while retries < max_retries:
         try:
-            response = requests.get(url, headers=headers)
+            if rate_limiter:
+                rate_limiter.wait(url)
+            request_headers = {**HEADERS, **cache.conditional_headers(url)} if conditional else HEADERS
+            start_time = time.perf_counter()
+            response = requests.get(url, headers=request_headers)
+            metrics.observe('gateio_http_request_seconds', time.perf_counter() - start_time,
+                            stage='article_list', status=response.status_code)
+            if conditional and response.status_code == 304:
+                cached_html = cache.hit(url)
+                if cached_html is not None:
+                    metrics.inc('gateio_http_bytes_total', len(cached_html.encode('utf-8')), stage='article_list', source='cache')
+                    return cached_html
+                # Entry evicted meanwhile: fetch in full, through the same rate limit and timing
+                conditional = False
+                continue
             response.raise_for_status()
+            if cache:
+                cache.store(url, response)
+            metrics.inc('gateio_http_bytes_total', len(response.content), stage='article_list', source='network')
             return response.text
         except requests.exceptions.RequestException as e:
             retries += 1
+            metrics.inc('gateio_http_retries_total', stage='article_list')
             wait_time = backoff_factor ** retries  # Exponential backoff
             print(f"Error fetching {url} (retries {retries}/{max_retries}): {e}. Retrying in {wait_time:.2f} seconds.")
             time.sleep(wait_time)
+    metrics.inc('gateio_http_failures_total', stage='article_list')
     return None
 
 # Function to parse HTML content and return articles with full URLs
-def parse_html(html, category):
-    soup = BeautifulSoup(html, 'html.parser')
-    article_list_box = soup.find('div', class_='article-list-box')
+def parse_html(html, category, targeted=True):
+    # Only the article list is parsed, the rest of the page is skipped
+    with metrics.timer('gateio_html_parse_seconds', page='article_list'):
+        article_list_box = find_subtree(html, 'article-list-box', targeted=targeted)
     if not article_list_box:
         return None
 
@@ -87,7 +95,7 @@ def parse_html(html, category):
 
             # Construct the full link for the article
             partial_link = title_tag['href']
-            full_link = urljoin('https://www.gate.io', partial_link)
+            full_link = urljoin(GATEIO_BASE_URL, partial_link)
 
             # Append the article data, ensuring correct types
             article_data.append({
@@ -109,59 +117,102 @@ def append_new_articles(existing_data, new_data):
     new_articles = [article for article in new_data if article['link'] not in existing_links]
     return new_articles
 
-# Function to save data to TSV
-def save_data(data, filename = ARTICLE_COLLECTION_FILE):
-    df = pd.DataFrame(data)
-    df.to_csv(filename, sep='\t', index=False)
-    print(f"Data saved to {filename}")
+# Function to save new articles to the article store
+def save_data(data, store):
+    inserted = store.insert_articles(data)
+    print(f"Saved {inserted} new articles to {store.path}")
+
+# Function to build the URL of a listing page (page 1 is the plain category URL)
+def build_page_url(url, page):
+    parts = urlparse(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != 'page']
+    if page > 1:
+        query.append(('page', str(page)))
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+# Function to crawl the pages of one category until the already known articles are reached
+def crawl_category(url, category, known_links, max_pages = MAX_PAGES, rate_limiter = None, http_cache = None):
+    pages = []
+    status = None
+    for page in range(1, max_pages + 1):
+        page_url = build_page_url(url, page)
+        html = get_html(page_url, rate_limiter=rate_limiter, cache=http_cache)
+        if not html:
+            status = 'failed'
+            break
+        # An unchanged page is parsed as well: the cache entry is written before its links are stored,
+        # so after an interrupted run it can hold links the store has never seen. The known links end the crawl.
+        if http_cache and http_cache.is_not_modified(page_url):
+            status = 'unchanged'
+        data = parse_html(html, category=category)
+        if not data:
+            status = 'empty'
+            break
+        pages.append(data)
+
+        # Go deeper only while every article on the page is new, otherwise the known ones have been reached
+        if any(article['link'] in known_links for article in data):
+            break
+    else:
+        logging.warning(f"Reached the page limit ({max_pages}) for {category} without finding known articles")
+    return pages, status, page
 
 # Main function to scrape multiple URLs
-def scrape_website(urls_dict, filename = ARTICLE_COLLECTION_FILE):
-    # Ensure the folder structure exists
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    
+def scrape_website(urls_dict, store, max_workers = MAX_WORKERS, rate_limiter = None, http_cache = None, max_pages = MAX_PAGES):
     all_articles = []
     
-    # Load existing links into memory if file exists
-    existing_links = set()
-    if os.path.exists(filename):
-        existing_data = pd.read_csv(filename, sep='\t')
-        existing_links = set(existing_data['link'])
-    
-    for url, category in urls_dict.items():
-        print(f"Scraping category: {category}")
-        html = get_html(url)
-        if html:
-            data = parse_html(html, category=category)
-            if data:
+    # Load existing links into memory
+    existing_links = store.links()
+    known_links = frozenset(existing_links)  # Snapshot used by the crawl threads to decide when to stop
+
+    # The token bucket replaces the fixed delay between requests to avoid overwhelming the server
+    if rate_limiter is None:
+        rate_limiter = HostRateLimiter(REQUESTS_PER_SECOND, REQUEST_BURST)
+
+    # Categories are crawled concurrently, but results come back in category order,
+    # so deduplication behaves exactly as in a sequential crawl
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            lambda item: crawl_category(item[0], item[1], known_links, max_pages, rate_limiter, http_cache),
+            urls_dict.items()
+        )
+
+        request_count = 0
+        for (url, category), (pages, status, page_count) in zip(urls_dict.items(), results):
+            print(f"Scraping category: {category} ({page_count} pages)")
+            request_count += page_count
+            if status == 'failed':
+                print(f"Failed to fetch {category}: {build_page_url(url, page_count)}")
+            elif status == 'empty' and not pages:
+                print(f"No articles found for {category}")
+
+            category_articles = []
+            for data in pages:
                 # Append only new articles based on links
                 new_articles = [article for article in data if article['link'] not in existing_links]
                 
                 if new_articles:
                     # Update the existing links set with new articles
                     existing_links.update(article['link'] for article in new_articles)
-                    all_articles.extend(new_articles)
-                else:
-                    print(f"No new articles found for {category}.")
-            else:
-                print(f"No articles found for {category}")
-        else:
-            print(f"Failed to fetch {category}: {url}")
-        time.sleep(random.uniform(1, 1.75))  # Delay to avoid overwhelming the server
+                    category_articles.extend(new_articles)
+
+            if category_articles:
+                all_articles.extend(category_articles)
+            elif status == 'unchanged':
+                print(f"No changes for {category}.")
+            elif pages:
+                print(f"No new articles found for {category}.")
+
+    logging.info(f"Crawled {len(urls_dict)} categories with {request_count} page requests, found {len(all_articles)} new articles")
 
     # Save all new articles once at the end
     if all_articles:
-        if os.path.exists(filename):
-            existing_data = pd.read_csv(filename, sep='\t')
-            updated_data = pd.concat([existing_data, pd.DataFrame(all_articles)], ignore_index=True)
-            save_data(updated_data, filename=filename)
-        else:
-            save_data(all_articles, filename=filename)
+        save_data(all_articles, store)
 
     return all_articles
 
 # Function to get the article list
-def get_article_list(filename):
+def get_article_list(store_file = ARTICLE_STORE_FILE):
     # Load the URLs from the file
     gateio_categories = load_gateio_categories()
 
@@ -170,7 +221,14 @@ def get_article_list(filename):
     for url, category in gateio_categories.items():
         print(f"{url}: {category}")
 
-    scrape_website(gateio_categories, filename)
+    store = ArticleStore(store_file)
+    http_cache = HTTPCache()
+    try:
+        return len(scrape_website(gateio_categories, store, http_cache=http_cache))
+    finally:
+        logging.info(http_cache.summary())
+        http_cache.close()
+        store.close()
 
 if __name__ == '__main__':
 
@@ -178,9 +236,4 @@ if __name__ == '__main__':
     gateio_logger_setup.setup_logging()
     logger = logging.getLogger()
 
-    # Set headers to mimic a browser
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
-    get_article_list(ARTICLE_COLLECTION_FILE)
+    get_article_list(ARTICLE_STORE_FILE)
@@ -1,36 +1,110 @@
 # File: gateio_get_articles.py
 
-import os
-import pandas as pd
+import argparse
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin
-import re
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 import logging
 import gateio_logger_setup
+from gateio_http_cache import HTTPCache
+from gateio_article_store import ArticleStore, ARTICLE_STORE_FILE, content_hash
+from gateio_text_normalizer import clean_body
+from gateio_html_parser import find_subtree
+from gateio_metrics import metrics
 
-ARTICLE_COLLECTION_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Process/gateio_article_collection.tsv')
 HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
 
-def get_html(url, max_retries=3, backoff_factor=2):
+# Number of articles fetched and parsed in parallel; the connection pool is sized to match
+MAX_WORKERS = 8
+# Articles published within this window are checked for edits. It matches the LLM threshold,
+# so every changed article goes through extraction again.
+RECHECK_WINDOW = timedelta(days=5)
+
+class FetchStats:
+    """
+    Thread-safe counters describing the HTTP work done during a run.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.fetch_time = 0.0
+        self._lock = threading.Lock()
+
+    def record_request(self, elapsed):
+        with self._lock:
+            self.requests += 1
+            self.fetch_time += elapsed
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    @property
+    def mean_latency(self):
+        return self.fetch_time / self.requests if self.requests else 0.0
+
+def create_session(pool_size=MAX_WORKERS):
+    """
+    Create a requests session with a keep-alive connection pool shared by all workers.
+
+    :param pool_size: Maximum number of pooled connections per host
+    :return: Configured requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+def get_html(url, max_retries=3, backoff_factor=2, session=None, stats=None, cache=None):
     """
     Fetch HTML content with retry mechanism.
 
     :param url: URL to fetch
     :param max_retries: Maximum number of retries
     :param backoff_factor: Backoff multiplier for retry delays
+    :param session: Optional requests.Session to reuse pooled connections
+    :param stats: Optional FetchStats collecting latency and retry counts
+    :param cache: Optional HTTPCache used to revalidate previously fetched pages
     :return: HTML content as a string, or None if failed
     """
-    for attempt in range(max_retries):
+    http = session or requests
+    attempt = 0
+    conditional = cache is not None
+    while attempt < max_retries:
         try:
-            response = requests.get(url, headers=HEADERS)
+            request_headers = {**HEADERS, **cache.conditional_headers(url)} if conditional else HEADERS
+            start_time = time.perf_counter()
+            response = http.get(url, headers=request_headers)
+            elapsed = time.perf_counter() - start_time
+            if stats:
+                stats.record_request(elapsed)
+            metrics.observe('gateio_http_request_seconds', elapsed, stage='articles', status=response.status_code)
+            if conditional and response.status_code == 304:
+                cached_html = cache.hit(url)
+                if cached_html is not None:
+                    metrics.inc('gateio_http_bytes_total', len(cached_html.encode('utf-8')), stage='articles', source='cache')
+                    return cached_html
+                # Entry evicted meanwhile: fetch in full, counted and timed like any other request
+                conditional = False
+                continue
             response.raise_for_status()
+            if cache:
+                cache.store(url, response)
+            metrics.inc('gateio_http_bytes_total', len(response.content), stage='articles', source='network')
             return response.text
         except requests.exceptions.HTTPError as e:
             if response.status_code == 502:
-                wait_time = backoff_factor ** (attempt + 1)
+                attempt += 1
+                wait_time = backoff_factor ** attempt
+                if stats:
+                    stats.record_retry()
+                metrics.inc('gateio_http_retries_total', stage='articles')
                 logging.error(f"502 Server Error for URL {url}. Retrying in {wait_time} seconds...")
                 time.sleep(wait_time)
             else:
@@ -40,59 +114,19 @@ def get_html(url, max_retries=3, backoff_factor=2):
             logging.error(f"Request error fetching {url}: {e}")
             break
     logging.error(f"Failed to fetch {url} after {max_retries} retries.")
+    metrics.inc('gateio_http_failures_total', stage='articles')
     return None
 
-def clean_body(main_content):
-    
-    main_content = re.sub(r'\[([^\]]+)\]\(\s*(?:[^\s\)]+)(?:\s+"[^"]*")?\s*\)', r'\1', main_content) # Remove markdown links
-    main_content = re.sub(r'!\[.*?\]\(.*?\)', '', main_content)  # Remove markdown images
-   
-    main_content = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F700-\U0001F77F\u2700-\u27BF\u2600-\u26FF\uFE0F]', '', main_content)
-    main_content = re.sub(r'\u00A0', ' ', main_content)
-    main_content = re.sub(r'[\u25CB-\u25EF\u2B50-\u2B55\u1F9E]', '', main_content)
-
-    main_content = re.sub(r'\u3001', ', ', main_content)
-    main_content = re.sub(r'\uff1a', ': ', main_content)
-    main_content = re.sub(r'\uff01', '! ', main_content)
-    main_content = re.sub(r'\.\.', '.', main_content)
-    main_content = re.sub(r' ,', ',', main_content)
-    main_content = re.sub(r' :', ':', main_content)
-
-    main_content = re.sub(r'\u2013', '-', main_content)  # Replaces en dash with a hyphen
-    main_content = re.sub(r'\u2014', '-', main_content)  # Replaces em dash with a hyphen
-    main_content = re.sub(r'["\u201c\u201d\u2018\u2019]', '', main_content)
-    main_content = re.sub(r'\t+', ' ', main_content)
-    main_content = re.sub(r'&', 'and', main_content)
-
-    main_content = re.sub(r'\u3010.*?\u3011', '', main_content)  # Remove text within 【 and 】
-    main_content = re.sub(r'\uff06', 'and', main_content)
-    main_content = re.sub(r'\uff08', '(', main_content)
-    main_content = re.sub(r'\uff09', ')', main_content)
-    main_content = re.sub(r'\u25cf', '\u2022', main_content)
-
-    main_content = re.sub(r'\n\s+', '\n', main_content)
-    main_content = re.sub(r'\n{2,}', '\n', main_content)
-
-    main_content = re.sub(r'\[//\]:content-type-MARKDOWN-DONOT-DELETE\s*\n?', '', main_content)
-
-    main_content = re.sub(r'\s*Gateway to Crypto.*', '', main_content, flags=re.DOTALL).rstrip()
-    main_content = re.sub(r'\s*Gate.io is your gateway to crypto.*', '', main_content, flags=re.DOTALL).rstrip()
-    main_content = re.sub(r'\s*Gate.io is a Cryptocurrency Trading Platform Since 2013.*', '', main_content, flags=re.DOTALL).rstrip()
-    main_content = re.sub(r'\s*The gateway to cryptocurrency.*', '', main_content, flags=re.DOTALL).rstrip()
-
-    main_content = re.sub(r'(?:\r\n|\r|\n|\u2028|\u2029)+', '///', main_content)
-
-    return main_content #body
-
-def parse_article_html(html):
+def parse_article_html(html, targeted=True):
     """
     Parse the article HTML content to extract the body and publish time.
 
     :param html: HTML content as a string
+    :param targeted: Parse only the article details subtree (set to False to parse the full page)
     :return: Tuple of (cleaned_body, publish_datetime)
     """
-    soup = BeautifulSoup(html, 'html.parser')
-    article_details_box = soup.find('div', class_='article-details-box')
+    with metrics.timer('gateio_html_parse_seconds', page='article'):
+        article_details_box = find_subtree(html, 'article-details-box', targeted=targeted)
 
     if not article_details_box:
         logging.error("Article details box not found in HTML.")
@@ -107,65 +141,171 @@ def parse_article_html(html):
 
     main_content_div = article_details_box.find('div', class_='article-details-main')
     main_content = main_content_div.get_text(strip=True, separator='\n') if main_content_div else ''
-    main_content = clean_body(main_content)
+    with metrics.timer('gateio_text_clean_seconds'):
+        main_content = clean_body(main_content)
 
     return main_content, publish_datetime
 
-def get_articles():
+def fetch_article(url, threshold_date, session=None, stats=None, cache=None):
+    """
+    Fetch and parse a single article.
+
+    :param url: Article URL
+    :param threshold_date: Articles published before this date are marked as LLM processed
+    :param session: Optional requests.Session shared between workers
+    :param stats: Optional FetchStats collecting latency and retry counts
+    :param cache: Optional HTTPCache shared between workers
+    :return: Dict of column updates for the article, or None if it could not be processed
+    """
+    html = get_html(url, session=session, stats=stats, cache=cache)
+    if not html:
+        return None
+
+    body, publish_datetime = parse_article_html(html)
+    if not (body and publish_datetime):
+        return None
+
+    update = {'body': body, 'publish_datetime': publish_datetime, 'body_hash': content_hash(body)}
+
+    # Check if 'publish_datetime' is older than the threshold
+    try:
+        # Parse `publish_datetime` and make it offset-aware
+        publish_date = datetime.strptime(publish_datetime, "%Y-%m-%d %H:%M:%S UTC").replace(tzinfo=timezone.utc)
+        print(f"Parsed publish_date: {publish_date}, Threshold: {threshold_date}")
+        
+        # Check if the date is older than the threshold
+        if publish_date < threshold_date:
+            update['llm_processed'] = 'Yes'
+    except ValueError as e:
+        print(f"Error parsing publish_datetime for {url}: {e}")
+
+    return update
+
+def get_articles(store_file=ARTICLE_STORE_FILE):
     """
     Process articles from the article list and update missing fields.
+
+    :param store_file: Path of the article store
+    :return: Number of articles whose content was fetched
     """
+    store = ArticleStore(store_file)
     try:
-        article_list_df = pd.read_csv(ARTICLE_COLLECTION_FILE, sep='\t')
-    except FileNotFoundError:
-        logging.error(f"Article collection file not found: {ARTICLE_COLLECTION_FILE}")
-        return
+        # Keep records where 'publish_datetime' or 'body' or both are missing
+        articles_to_process = store.articles_missing_content()
 
-    # Ensure the correct data types for the 'body' and 'publish_datetime' columns
-    if 'body' in article_list_df.columns:
-        article_list_df['body'] = article_list_df['body'].astype('object')
+        if articles_to_process.empty:
+            logging.info("No new articles to process.")
+            return 0
 
-    if 'publish_datetime' in article_list_df.columns:
-        article_list_df['publish_datetime'] = article_list_df['publish_datetime'].astype('object')
+        # Older publish_datetime does not go to LLM
+        current_date = datetime.now(timezone.utc)
+        threshold_date = current_date - timedelta(days=5)
 
-    # Keep records where 'publish_datetime' or 'body' or both are missing (NaN)
-    articles_to_process = article_list_df[pd.isna(article_list_df['publish_datetime']) | pd.isna(article_list_df['body'])]
+        session = create_session()
+        stats = FetchStats()
+        http_cache = HTTPCache()
+        start_time = time.perf_counter()
 
-    if articles_to_process.empty:
-        logging.info("No new articles to process.")
-        return
+        # Fetch and parse in a bounded worker pool, collecting the results per article
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = executor.map(lambda url: fetch_article(url, threshold_date, session, stats, http_cache),
+                                   articles_to_process['link'])
+            updates = {link: result for link, result in zip(articles_to_process['link'], results) if result}
 
-    # Older publish_datetime does not go to LLM
-    current_date = datetime.now(timezone.utc)
-    threshold_date = current_date - timedelta(days=5)
+        session.close()
+        logging.info(http_cache.summary())
+        http_cache.close()
+        elapsed = time.perf_counter() - start_time
 
-    for _, row in articles_to_process.iterrows():
-        
-        url = row['link']
-        html = get_html(url)
-
-        if html:
-            body, publish_datetime = parse_article_html(html)
-            if body and publish_datetime:
-                article_list_df.at[row.name, 'body'] = body
-                article_list_df.at[row.name, 'publish_datetime'] = publish_datetime
-
-                # Check if 'publish_datetime' is older than the threshold
-                try:
-                    # Parse `publish_datetime` and make it offset-aware
-                    publish_date = datetime.strptime(publish_datetime, "%Y-%m-%d %H:%M:%S UTC").replace(tzinfo=timezone.utc)
-                    print(f"Parsed publish_date: {publish_date}, Threshold: {threshold_date}")
-                    
-                    # Check if the date is older than the threshold
-                    if publish_date < threshold_date:
-                        article_list_df.at[row.name, 'llm_processed'] = 'Yes'
-                except ValueError as e:
-                    print(f"Error parsing publish_datetime for row {row.name}: {e}")
-
-
-    article_list_df.to_csv(ARTICLE_COLLECTION_FILE, sep='\t', index=False)
-    logging.info(f"Updated {ARTICLE_COLLECTION_FILE} with processed articles.")
+        summary = (f"Fetched {len(updates)}/{len(articles_to_process)} articles in {elapsed:.2f}s "
+                   f"({len(articles_to_process) / elapsed if elapsed else 0:.2f} articles/s), "
+                   f"mean fetch latency {stats.mean_latency:.3f}s over {stats.requests} requests, "
+                   f"{stats.retries} retries")
+        print(summary)
+        logging.info(summary)
+
+        # Write back only the fetched articles, in one transaction
+        store.update_articles(updates)
+        logging.info(f"Updated {len(updates)} articles in {store.path}.")
+        return len(updates)
+    finally:
+        store.close()
+
+def recheck_article(url, stored_hash, stored_body, session=None, stats=None, cache=None):
+    """
+    Fetch a stored article again with a conditional request and compare the hash of its body.
+
+    :param url: Article URL
+    :param stored_hash: Stored body hash, None for articles fetched before hashes were kept
+    :param stored_body: Stored body, hashed when there is no stored hash
+    :return: Dict of column updates, or None if nothing changed or the article could not be fetched.
+             A changed article is queued for the LLM again.
+    """
+    stored_hash = stored_hash if isinstance(stored_hash, str) else None
+    known_hash = stored_hash or content_hash(stored_body)
+    html = get_html(url, session=session, stats=stats, cache=cache)
+    if html:
+        # A page served from the cache after a 304 is compared too: an edit cached by a run that
+        # did not get to store it would otherwise never be seen again
+        body, publish_datetime = parse_article_html(html)
+        new_hash = content_hash(body) if body else None
+        if new_hash and new_hash != known_hash:
+            update = {'body': body, 'body_hash': new_hash, 'llm_processed': 'No'}
+            if publish_datetime:
+                update['publish_datetime'] = publish_datetime
+            return update
+    # Unchanged (or unavailable): only backfill a missing hash
+    return None if stored_hash else {'body_hash': known_hash}
+
+def recheck_articles(store_file=ARTICLE_STORE_FILE, window=RECHECK_WINDOW):
+    """
+    Check the recently published articles for edits and queue the changed ones for extraction again.
+
+    :param store_file: Path of the article store
+    :param window: Age up to which articles are checked
+    :return: Number of changed articles
+    """
+    store = ArticleStore(store_file)
+    try:
+        since = (datetime.now(timezone.utc) - window).strftime('%Y-%m-%d %H:%M:%S') + ' UTC'
+        articles = store.articles_for_recheck(since)
+        if articles.empty:
+            logging.info("No recent articles to recheck.")
+            return 0
+
+        session = create_session()
+        http_cache = HTTPCache()
+
+        def recheck(row):
+            # One failing article must not discard the updates of the others
+            try:
+                return recheck_article(row.link, row.body_hash, row.body, session, None, http_cache)
+            except Exception:
+                logging.exception(f"Failed to recheck {row.link}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = executor.map(recheck, articles.itertuples())
+            updates = {link: result for link, result in zip(articles['link'], results) if result}
+        session.close()
+        logging.info(http_cache.summary())
+        http_cache.close()
+
+        changed = [link for link, update in updates.items() if 'body' in update]
+        for link in changed:
+            logging.info(f"Article changed since it was extracted, queued for extraction again: {link}")
+        store.update_articles(updates)
+        logging.info(f"Rechecked {len(articles)} articles, {len(changed)} changed")
+        return len(changed)
+    finally:
+        store.close()
 
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Fetch the content of newly listed articles.")
+    arg_parser.add_argument('--recheck', action='store_true', help="Also check the recent articles for edits")
+    args = arg_parser.parse_args()
+
     gateio_logger_setup.setup_logging()
     get_articles()
+    if args.recheck:
+        recheck_articles()
@@ -2,22 +2,26 @@
 
 import json
 import os
+import hashlib
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from ics import Calendar, Event
-from ics import DisplayAlarm
 from dateutil import parser
 import gateio_logger_setup
+from gateio_event_store import EventStore, INDEXED_ATTRIBUTES, attribute_values
+from gateio_ics_writer import IcsEvent, write_calendar, to_utc
+from gateio_metrics import metrics
 
 # Initialize the logger
 gateio_logger_setup.setup_logging()
 logger = logging.getLogger()
 
 # Constants
-JSON_FILE_PATH = os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Process/gateio_structured.json')
 REQUESTS_FILE_PATH = os.path.expanduser('~/parsley/gateio_calendar_requests.json')
 OUTPUT_DIR = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Subscribe')
-THRESHOLD_DATE = datetime.now(timezone.utc) - timedelta(days=15)
+FINGERPRINT_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Process/gateio_calendar_fingerprints.json')
+FINGERPRINT_VERSION = '1'  # Bump when the calendar output changes for the same events
+CALENDAR_WINDOW = timedelta(days=15)  # Events that started longer ago are left out of the calendars
 
 # Load JSON data
 def load_json_data(file_path):
@@ -48,108 +52,154 @@ def generate_event_description(event_data, assets):
     return "\n".join(filter(None, description_parts))
 
 # Create a single-day event
-def create_single_day_event(event_data):
-    event = Event()
-
+def create_single_day_event(event_data, start_datetime, end_datetime):
     assets = event_data.get('tokens', []) + event_data.get('trading_pairs', [])
-    event.name = generate_event_name(event_data['exchange_name'], event_data['event_type'], assets)
-    event.description = generate_event_description(event_data, assets)
-    event.url = event_data.get('article_link', "")
-    start_datetime = parser.parse(event_data['start_datetime'])
-    end_datetime = parser.parse(event_data['end_datetime'])
-    event.begin = start_datetime.replace(minute=0, second=0, microsecond=0)
-    event.end = end_datetime.replace(minute=30, second=0, microsecond=0)
-    event.uid = event_data['UID']
-    event.transparent = True
-
-    # Add alarms with descriptions
-    alarm_1_day = DisplayAlarm(trigger=timedelta(days=-1)) #, display_text="Reminder: Event starts in 1 day.")
-    alarm_1_hour = DisplayAlarm(trigger=timedelta(hours=-1)) #, display_text="Reminder: Event starts in 1 hour.")
-    event.alarms.append(alarm_1_day)
-    event.alarms.append(alarm_1_hour)
-
+    event = IcsEvent(
+        uid=event_data['UID'],
+        name=generate_event_name(event_data['exchange_name'], event_data['event_type'], assets),
+        description=generate_event_description(event_data, assets),
+        location=None,
+        url=event_data.get('article_link', ""),
+        begin=start_datetime.replace(minute=0, second=0, microsecond=0),
+        end=end_datetime.replace(minute=30, second=0, microsecond=0)
+    )
+    if to_utc(event.end) < to_utc(event.begin):
+        raise ValueError('End must be after begin')
     return event
 
 # Create multi-day events
-def create_multi_day_events(event_data):
-    events = []
+def create_multi_day_events(event_data, start_datetime, end_datetime):
     assets = event_data.get('tokens', []) + event_data.get('trading_pairs', [])
 
     def create_event(location, begin, end, uid_suffix):
-        event = Event()
-        event.name = generate_event_name(event_data['exchange_name'], event_data['event_type'], assets)
-        event.description = generate_event_description(event_data, assets)
-        event.location = location
-        event.url = event_data.get('article_link', "")
-        event.begin = begin
-        event.end = end
-        event.uid = f"{event_data['UID']}_{uid_suffix}"
-        event.transparent = True
-        
-        # Add alarms with descriptions
-        alarm_1_day = DisplayAlarm(trigger=timedelta(days=-1)) #, display_text="Reminder: Event starts in 1 day.")
-        alarm_1_hour = DisplayAlarm(trigger=timedelta(hours=-1)) #, display_text="Reminder: Event starts in 1 hour.")
-        event.alarms.append(alarm_1_day)
-        event.alarms.append(alarm_1_hour)
-
-        return event
-
-    start_datetime = parser.parse(event_data['start_datetime'])
-    end_datetime = parser.parse(event_data['end_datetime'])
-    events.append(create_event("Period Starts", start_datetime, start_datetime + timedelta(minutes=30), "start"))
-    events.append(create_event("Period Ends", end_datetime - timedelta(minutes=30), end_datetime, "end"))
-    return events
+        return IcsEvent(
+            uid=f"{event_data['UID']}_{uid_suffix}",
+            name=generate_event_name(event_data['exchange_name'], event_data['event_type'], assets),
+            description=generate_event_description(event_data, assets),
+            location=location,
+            url=event_data.get('article_link', ""),
+            begin=begin,
+            end=end
+        )
+
+    return [
+        create_event("Period Starts", start_datetime, start_datetime + timedelta(minutes=30), "start"),
+        create_event("Period Ends", end_datetime - timedelta(minutes=30), end_datetime, "end"),
+    ]
 
 # Determine if an event is single or multi-day
-def create_ics_events(event_data):
-    start_datetime = parser.parse(event_data['start_datetime'])
-    end_datetime = parser.parse(event_data['end_datetime'])
+def create_ics_events(event_data, start_datetime, end_datetime):
     if start_datetime.date() == end_datetime.date():
-        return [create_single_day_event(event_data)]
-    return create_multi_day_events(event_data)
-
-# Filter events based on criteria
-def filter_events(events, request):
-    filtered_events = []
-    for event_group in events:
-        for event in event_group.get("events", []):
-            event_start_datetime = parser.parse(event["start_datetime"]).replace(tzinfo=timezone.utc)
-            if event_start_datetime < THRESHOLD_DATE:
+        return [create_single_day_event(event_data, start_datetime, end_datetime)]
+    return create_multi_day_events(event_data, start_datetime, end_datetime)
+
+# Calendar candidates with their datetimes parsed once and inverted indexes from every
+# event_type, token, trading pair and market value to the events carrying it
+class EventIndex:
+    def __init__(self, events):
+        self.events = []
+        self.index = {attribute: defaultdict(set) for attribute in INDEXED_ATTRIBUTES}
+        for event in events:
+            try:
+                start_datetime = parser.parse(event['start_datetime'])
+                end_datetime = parser.parse(event['end_datetime'])
+            except (KeyError, ValueError, OverflowError, TypeError) as e:
+                logger.warning(f"Skipping event {event.get('UID')} with unusable datetimes: {e}")
                 continue
-            matches = all([
-                not request["event_type"] or any(et in event["event_type"] for et in request["event_type"]),
-                not request["tokens"] or set(request["tokens"]).issubset(set(event.get("tokens", []))),
-                not request["trading_pairs"] or set(request["trading_pairs"]).issubset(set(event.get("trading_pairs", []))),
-                not request["markets"] or set(request["markets"]).issubset(set(event.get("markets", []))),
-            ])
-            if matches:
-                filtered_events.append(event)
-    return filtered_events
-
-# Save calendar to file
-def save_calendar(events, event_type):
-    calendar = Calendar()
-    for event in events:
-        for ics_event in create_ics_events(event):
-            calendar.events.add(ics_event)
+            position = len(self.events)
+            self.events.append((event, start_datetime, end_datetime))
+            for attribute in INDEXED_ATTRIBUTES:
+                for value in attribute_values(event, attribute):
+                    self.index[attribute][value].add(position)
+
+    # Answer a request by set operations: any of its event types, all of its tokens, pairs and markets
+    def match(self, request):
+        required = []
+        if request["event_type"]:
+            required.append(set().union(*(self.index["event_type"].get(event_type, ()) for event_type in request["event_type"])))
+        for attribute in ("tokens", "trading_pairs", "markets"):
+            required.extend(self.index[attribute].get(value, set()) for value in set(request[attribute]))
+
+        if not required:
+            return list(self.events)
+        required.sort(key=len)
+        positions = required[0].intersection(*required[1:])
+        return [self.events[position] for position in sorted(positions)]
+
+# Load the events that are recent enough for a calendar and index them for filtering.
+# The window is computed on every call so that a long-running process keeps it current.
+def build_event_index(store):
+    return EventIndex(store.query_events(since=datetime.now(timezone.utc) - CALENDAR_WINDOW))
+
+# Fingerprint of the events behind a calendar file: their UIDs and a hash of their content
+def fingerprint_events(events):
+    digest = hashlib.sha256(FINGERPRINT_VERSION.encode())
+    for event, _, _ in events:
+        digest.update(f"{event.get('UID')}\0{json.dumps(event, sort_keys=True)}\0".encode())
+    return digest.hexdigest()
+
+# Load the fingerprints of the calendar files written by the previous run
+def load_fingerprints():
+    try:
+        return load_json_data(FINGERPRINT_FILE)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+# Save the fingerprints of the calendar files, replacing the previous ones atomically
+def save_fingerprints(fingerprints):
+    temp_path = f"{FINGERPRINT_FILE}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(fingerprints, file, indent=4)
+    os.replace(temp_path, FINGERPRINT_FILE)
+
+# Build the calendar events of the matching events, skipping the ones that cannot be rendered
+def build_ics_events(events):
+    for event, start_datetime, end_datetime in events:
+        try:
+            yield from create_ics_events(event, start_datetime, end_datetime)
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Skipping event {event.get('UID')} that cannot be added to a calendar: {e!r}")
+
+# Save calendar to file, unless its events have not changed since the last run
+def save_calendar(events, event_type, fingerprints):
     filename = f"Gateio_{event_type.replace(' ', '_')}.ics"
     output_path = os.path.join(OUTPUT_DIR, filename)
-    with open(output_path, 'w') as f:
-        f.writelines(calendar)
-    logger.info(f"Saved calendar to {output_path}")
-
-# Main function
-def main():
-    data = load_json_data(JSON_FILE_PATH)
-    requests = load_json_data(REQUESTS_FILE_PATH)
-
+    fingerprint = fingerprint_events(events)
+    if fingerprints.get(filename) == fingerprint and os.path.exists(output_path):
+        logger.info(f"Calendar {output_path} is unchanged, skipping")
+        return
+    count = write_calendar(output_path, build_ics_events(events))
+    metrics.inc('gateio_ics_files_written_total')
+    metrics.inc('gateio_ics_events_written_total', count)
+    fingerprints[filename] = fingerprint
+    logger.info(f"Saved calendar with {count} events to {output_path}")
+
+# Function to write the calendars of the given requests from the events in the store
+def update_calendars(requests, store, fingerprints):
+    event_index = build_event_index(store)
     for req_name, req in requests.items():
-        filtered_events = filter_events(data, req)
+        filtered_events = event_index.match(req)
         if filtered_events:
-            save_calendar(filtered_events, "_".join(req["event_type"]))
+            save_calendar(filtered_events, "_".join(req["event_type"]), fingerprints)
         else:
             logger.info(f"No matching events found for {req_name}.")
 
+# Function to select the requests matched by any of the given events
+def affected_requests(requests, events):
+    event_index = EventIndex(events)
+    return {req_name: req for req_name, req in requests.items() if event_index.match(req)}
+
+# Main function
+def main():
+    requests = load_json_data(REQUESTS_FILE_PATH)
+    fingerprints = load_fingerprints()
+    store = EventStore()
+    try:
+        update_calendars(requests, store, fingerprints)
+    finally:
+        store.close()
+    save_fingerprints(fingerprints)
+
 if __name__ == "__main__":
     main()
 
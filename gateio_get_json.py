@@ -1,78 +1,163 @@
 # File: gateio_get_json2.py
 
 import os
+import argparse
 import datetime
 import json
 import hashlib
 from collections import defaultdict
 import time
-import signal
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
-import pandas as pd
 import openai
 from openai._exceptions import RateLimitError, APIConnectionError, OpenAIError
 import gateio_logger_setup
+from gateio_logger_setup import log_payload, preview
+from gateio_article_store import ArticleStore, ARTICLE_STORE_FILE
+from gateio_rate_limiter import LLMRateLimiter, estimate_tokens
+from gateio_llm_cache import LLMCache
+from gateio_extraction_journal import ExtractionJournal
+from gateio_event_store import EventStore
+from gateio_relevance_filter import RelevanceFilter
+from gateio_prompt_compactor import PromptCompactor
+from gateio_event_schema import validate_response
+from gateio_metrics import metrics
+from gateio_llm_batch import OpenAIBatchTransport, build_request, run_batch, BATCH_DIR, BATCH_POLL_INTERVAL
+
+# Number of articles extracted in parallel and the client-side limits towards the OpenAI API
+LLM_WORKERS = 4
+LLM_REQUESTS_PER_MINUTE = 60
+LLM_TOKENS_PER_MINUTE = 150000
+RUN_POLL_INTERVAL = 1.0  # Seconds between run status checks
+REFINEMENT_ASSISTANT_ID = 'asst_CfFXkDtL6wiBKpPpIREesccm'
+
+# Function to check the API key and set the client used by the assistant calls
+def init_client():
+    global client
+    openai_api_key = os.getenv('OPENAI_API_KEY')
+    if not openai_api_key:
+        logging.error("OpenAI API key not found in environment variables.")
+        raise EnvironmentError("OPENAI_API_KEY environment variable is not set. Please configure it before running the script.")
+    client = openai
 
-ARTICLE_COLLECTION_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Process/gateio_article_collection.tsv')
-
-# Timeout handler to catch unresponsive scripts
+# Raised when a single LLM call exceeds its time budget
 class TimeoutException(Exception):
     pass
 
-def timeout_handler(signum, frame):
-    raise TimeoutException()
+# Function to get the time left until a deadline, raising once it has passed
+def remaining_time(deadline):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutException()
+    return remaining
+
+# Function to run an assistant on a thread and poll it until it finishes or the deadline passes.
+# Unlike signal.alarm this works in any thread, so every worker gets its own timeout.
+def run_assistant(thread_id, assistant_id, deadline):
+    run = client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        timeout=remaining_time(deadline)
+    )
+    while run.status in ("queued", "in_progress", "cancelling"):
+        try:
+            time.sleep(min(RUN_POLL_INTERVAL, remaining_time(deadline)))
+            run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id, timeout=remaining_time(deadline))
+        except TimeoutException:
+            try:
+                client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+            except OpenAIError as cancel_err:
+                logging.warning(f"Failed to cancel timed out run {run.id}: {cancel_err}")
+            raise
+    return run
 
 # Function to interact with the LLM for a specific instruction using an existing assistant
-def get_llm_response(content, assistant_id, max_retries=3, backoff_factor=2, timeout=90):
+def get_llm_response(content, assistant_id, max_retries=3, backoff_factor=2, timeout=90, rate_limiter=None, cache=None):
+    # Identical prompts to the same assistant are answered from the cache
+    if cache:
+        cached_response = cache.get(assistant_id, content)
+        if cached_response is not None:
+            return cached_response
+
+    start_time = time.perf_counter()
+    response = request_llm_response(content, assistant_id, max_retries, backoff_factor, timeout, rate_limiter)
+    failed = isinstance(response, str)  # Failures are reported as error strings
+    metrics.observe('gateio_llm_call_seconds', time.perf_counter() - start_time,
+                    assistant=assistant_id, outcome='error' if failed else 'ok')
+    if failed:
+        metrics.inc('gateio_llm_errors_total', error=response)
+    elif cache:
+        cache.put(assistant_id, content, response)
+    return response
+
+# Function to run one assistant call with retries, returning the parsed response or an error string.
+# The timeout covers the whole call, retries and backoff included.
+def request_llm_response(content, assistant_id, max_retries, backoff_factor, timeout, rate_limiter):
     retries = 0
+    deadline = time.monotonic() + timeout
     thread = client.beta.threads.create()
     while retries < max_retries:
         try:
-            signal.alarm(timeout)
+            if rate_limiter:
+                rate_limiter.acquire(estimate_tokens(content))
             client.beta.threads.messages.create(
                 thread_id=thread.id,
                 role="user",
-                content=[{"type": "text", "text": content}]
+                content=[{"type": "text", "text": content}],
+                timeout=remaining_time(deadline)
             )
-            run = client.beta.threads.runs.create_and_poll(
-                thread_id=thread.id,
-                assistant_id=assistant_id
-            )
-            signal.alarm(0)
+            run = run_assistant(thread.id, assistant_id, deadline)
+            usage = getattr(run, 'usage', None)
+            if usage:
+                metrics.inc('gateio_llm_tokens_total', usage.prompt_tokens, kind='prompt')
+                metrics.inc('gateio_llm_tokens_total', usage.completion_tokens, kind='completion')
 
             if run.status == "completed":
-                messages = client.beta.threads.messages.list(thread_id=thread.id)
-                for message in messages:
-                    if message.role == "assistant" and hasattr(message, 'content'):
-                        response = message.content[0].text.value
-                        if response:
-                            return check_for_nested_events(json.loads(response))
-                    else:
-                        logging.error(f"Unexpected run status: {run.status}")
-                        return "LLM RESPONSE HAS NO CONTENT ERROR"
+                # Messages are listed newest first, so the first one is the answer to this run
+                messages = client.beta.threads.messages.list(thread_id=thread.id, timeout=remaining_time(deadline))
+                message = next(iter(messages), None)
+                if message is not None and message.role == "assistant" and message.content:
+                    response = message.content[0].text.value
+                    if response:
+                        return check_for_nested_events(json.loads(response))
+                logging.error(f"Run {run.id} completed without an assistant message")
+                return "LLM RESPONSE HAS NO CONTENT ERROR"
+
+            last_error = getattr(run, 'last_error', None)
+            if run.status == "failed" and last_error is not None and last_error.code == 'rate_limit_exceeded':
+                retries += 1
+                back_off(retries, backoff_factor, deadline, 'RunRateLimitExceeded', last_error.message)
+                continue
+            logging.error(f"Run {run.id} ended with status {run.status}: {last_error.message if last_error else 'no error given'}")
+            return f"LLM RUN {run.status.upper()} ERROR"
 
         except TimeoutException:
             logging.error(f"Timeout occurred after {timeout} seconds")
             return "LLM TIMEOUT ERROR"
         except json.JSONDecodeError as e:
-            logging.error(f"JSON Decode Error: {e} - Content: {content}")
+            logging.error(f"JSON Decode Error: {e} - Content: {preview(content)}")
             return "INVALID JSON ERROR"
         except (RateLimitError, APIConnectionError) as retry_err:
             retries += 1
-            sleep_time = backoff_factor ** retries
-            logging.warning(f"{type(retry_err).__name__}: {retry_err}. Retrying in {sleep_time} seconds...")
-            time.sleep(sleep_time)
+            back_off(retries, backoff_factor, deadline, type(retry_err).__name__, retry_err)
         except OpenAIError as openai_err:
-            logging.error(f"OpenAI API Error: {openai_err} - Content: {content}")
+            logging.error(f"OpenAI API Error: {openai_err} - Content: {preview(content)}")
             return "UNEXPECTED LLM ERROR"
         except Exception as e:
-            logging.error(f"Unexpected Error: {e} - Content: {content}")
+            logging.error(f"Unexpected Error: {e} - Content: {preview(content)}")
             return "UNEXPECTED OTHER ERROR"
     
     logging.error(f"Failed to process content after {max_retries} retries.")
     return "LLM_ERROR"
 
+# Function to wait before the next attempt of a rate limited or disconnected LLM call, never past the deadline
+def back_off(retries, backoff_factor, deadline, error_name, detail):
+    metrics.inc('gateio_llm_retries_total', error=error_name)
+    sleep_time = backoff_factor ** retries
+    logging.warning(f"{error_name}: {detail}. Retrying in {sleep_time} seconds...")
+    time.sleep(max(0.0, min(sleep_time, deadline - time.monotonic())))
+
 # Function to check for nested 'events' in the LLM response
 def check_for_nested_events(parsed_response):
     if isinstance(parsed_response.get('events'), dict):
@@ -80,39 +165,194 @@ def check_for_nested_events(parsed_response):
             parsed_response['events'] = parsed_response['events']['events']
     return parsed_response
 
-# Main function to process articles and save JSON
-def get_json():
-    df = pd.read_csv(ARTICLE_COLLECTION_FILE, sep='\t')
-    unprocessed_records = df[df['llm_processed'] == 'No'].dropna(subset=['body', 'publish_datetime', 'title', 'link'])
-    parsed_responses = []
-
-    for index, row in unprocessed_records.iterrows():
-        content = prepare_content(row)
-        logging.info(f"Content for LLM:\n{content}")
-
-        assistant_id = determine_assistant(row['title'])
-        response = get_llm_response(content, assistant_id)
-        logging.info(f"Response 1:\n{json.dumps(response, indent=4)}")
-
-        if " ERROR" not in response:
-            if "Bi-Weekly Report" not in row['title'] or "Gate Research" not in row['title']:
-                assistant_id = 'asst_CfFXkDtL6wiBKpPpIREesccm'
-                response = get_llm_response(f"JSON:\n{json.dumps(response, indent=4)}\n**Additional data:**\n{content}", assistant_id)
-                logging.info(f"Response 2:\n{json.dumps(response, indent=4)}")
-
-                if " ERROR" in response:
-                    logging.error(f"Error in second assistant response: {response}")
+# Function to run both assistant passes for one article
+def extract_events(row, rate_limiter=None, cache=None, compactor=None):
+    content = prepare_content(row, compactor)
+    log_payload(f"Content for LLM of {row['link']}", content)
+
+    assistant_id = determine_assistant(row['title'])
+    response = get_llm_response(content, assistant_id, rate_limiter=rate_limiter, cache=cache)
+    log_payload(f"Response 1 for {row['link']}", response)
+
+    if " ERROR" in response:
+        logging.error(f"Error in LLM response: {response}")
+        return None
+
+    if needs_refinement(response, row):
+        response = get_llm_response(prepare_refinement_content(response, content), REFINEMENT_ASSISTANT_ID,
+                                    rate_limiter=rate_limiter, cache=cache)
+        log_payload(f"Response 2 for {row['link']}", response)
+
+        if " ERROR" in response:
+            logging.error(f"Error in second assistant response: {response}")
+            return None
+        check_refined(response, row)
+
+    return response
+
+# Function to pick up the results journaled by an interrupted run and mark their articles as processed
+def resume_journal(journal, store):
+    journaled = journal.load()
+    if journaled:
+        logging.info(f"Resuming {len(journaled)} extractions journaled by an interrupted run")
+        store.update_articles({link: {'llm_processed': 'Yes'} for link in journaled})
+    return journaled
+
+# Function to flag the articles the relevance filter keeps from the LLM, returning the links of the skipped ones
+def skip_irrelevant(rows, store, relevance_filter):
+    skipped = [row['link'] for row in rows if relevance_filter.skip(row)]
+    if skipped:
+        store.update_articles({link: {'llm_processed': 'Skipped'} for link in skipped})
+        logging.info(f"Relevance filter skipped {len(skipped)} of {len(rows)} articles")
+    return skipped
+
+# Function to durably record one completed article before its flag is committed
+def record_result(journal, store, link, response):
+    journal.append(link, response)
+    store.update_articles({link: {'llm_processed': 'Yes'}})
+
+# Main function to process articles and save their events, returning the number of stored events
+def get_json(store_file=ARTICLE_STORE_FILE, max_workers=LLM_WORKERS, use_cache=True, use_filter=True):
+    store = ArticleStore(store_file)
+    cache = LLMCache(bypass=not use_cache)
+    journal = ExtractionJournal()
+    try:
+        journaled = resume_journal(journal, store)
+        unprocessed_records = store.articles_for_llm()
+        rows = [row for _, row in unprocessed_records.iterrows() if row['link'] not in journaled]
+        skipped = skip_irrelevant(rows, store, RelevanceFilter()) if use_filter else []
+        rows = [row for row in rows if row['link'] not in skipped]
+        baseline = metrics.snapshot()
+        rate_limiter = LLMRateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+        compactor = PromptCompactor()
+        responses = {}
+
+        # Every article is journaled and flagged as soon as it completes, so a crash only loses
+        # the articles still in flight. The responses are saved in article order, so assign_uids
+        # numbers the events exactly as in a sequential run.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(extract_events, row, rate_limiter, cache, compactor): position
+                       for position, row in enumerate(rows)}
+
+            for future in as_completed(futures):
+                position = futures[future]
+                response = future.result()
+                if response is not None:
+                    record_result(journal, store, rows[position]['link'], response)
+                    responses[position] = response
+
+        logging.info(cache.summary())
+        log_second_pass_rate(baseline)
+    finally:
+        cache.close()
+        store.close()
+
+    parsed_responses = list(journaled.values()) + [responses[position] for position in sorted(responses)]
+    # Skipped articles lose the events of an earlier extraction as well
+    links = list(journaled) + [rows[position]['link'] for position in sorted(responses)] + skipped
+    parsed_responses_uid = assign_uids(parsed_responses)
+    stored = save_events(parsed_responses_uid, links)
+    journal.clear()
+    return stored
+
+# Function to process articles through the Batch API instead of per-article assistant runs.
+# The Batch API does not serve the Assistants endpoints, so each assistant is replayed as a
+# chat completion with its own model, instructions and response format.
+def get_json_batch(transport, store_file=ARTICLE_STORE_FILE, poll_interval=BATCH_POLL_INTERVAL, use_cache=True,
+                   use_filter=True):
+    store = ArticleStore(store_file)
+    cache = LLMCache(bypass=not use_cache)
+    journal = ExtractionJournal()
+    try:
+        journaled = resume_journal(journal, store)
+        unprocessed_records = store.articles_for_llm()
+        rows = {row['link']: row for _, row in unprocessed_records.iterrows() if row['link'] not in journaled}
+        skipped = skip_irrelevant(list(rows.values()), store, RelevanceFilter()) if use_filter else []
+        for link in skipped:
+            del rows[link]
+        if not rows and not journaled:
+            if skipped:
+                return save_events([], skipped)
+            logging.info("No articles to process.")
+            return 0
+
+        assistants = {}
+
+        # Function to answer a pass from the cache and submit only the remaining prompts as a batch
+        def run_pass(prompts, path):
+            results = {}
+            requests = []
+            for link, (assistant_id, content) in prompts.items():
+                cached_response = cache.get(assistant_id, content)
+                if cached_response is not None:
+                    results[link] = cached_response
                     continue
-
-            df.at[index, 'llm_processed'] = 'Yes'
+                if assistant_id not in assistants:
+                    assistants[assistant_id] = transport.get_assistant(assistant_id)
+                requests.append(build_request(link, assistants[assistant_id], content))
+
+            if requests:
+                for link, response in parse_batch_responses(run_batch(transport, requests, path, poll_interval)).items():
+                    results[link] = response
+                    if response is not None:
+                        cache.put(*prompts[link], response)
+            return results
+
+        # First pass: one request per article
+        compactor = PromptCompactor()
+        contents = {link: prepare_content(row, compactor) for link, row in rows.items()}
+        first_results = run_pass(
+            {link: (determine_assistant(row['title']), contents[link]) for link, row in rows.items()},
+            os.path.join(BATCH_DIR, 'gateio_batch_pass1.jsonl')
+        )
+
+        # Second pass: refinement of the first responses that fail validation
+        baseline = metrics.snapshot()
+        second_prompts = {link: (REFINEMENT_ASSISTANT_ID, prepare_refinement_content(response, contents[link]))
+                          for link, response in first_results.items()
+                          if response is not None and needs_refinement(response, rows[link])}
+        second_results = run_pass(second_prompts, os.path.join(BATCH_DIR, 'gateio_batch_pass2.jsonl')) if second_prompts else {}
+
+        logging.info(cache.summary())
+        log_second_pass_rate(baseline)
+
+        # Journal the final responses in article order
+        parsed_responses = list(journaled.values())
+        links = list(journaled) + skipped
+        processed = 0
+        for link, row in rows.items():
+            response = first_results.get(link)
+            if link in second_prompts:
+                response = second_results.get(link)
+                if response is not None:
+                    check_refined(response, row)
+            if response is None:
+                logging.error(f"No usable batch response for {link}")
+                continue
+            record_result(journal, store, link, response)
             parsed_responses.append(response)
-        else:
-            logging.error(f"Error in LLM response: {response}")
+            links.append(link)
+            processed += 1
+    finally:
+        cache.close()
+        store.close()
 
     parsed_responses_uid = assign_uids(parsed_responses)
-
-    df.to_csv(ARTICLE_COLLECTION_FILE, sep='\t', index=False)
-    save_json(parsed_responses_uid)
+    stored = save_events(parsed_responses_uid, links)
+    journal.clear()
+    logging.info(f"Batch extraction processed {processed}/{len(rows)} articles")
+    return stored
+
+# Function to decode the JSON content of batch results
+def parse_batch_responses(results):
+    parsed = {}
+    for custom_id, content in results.items():
+        try:
+            parsed[custom_id] = check_for_nested_events(json.loads(content)) if content else None
+        except json.JSONDecodeError as e:
+            logging.error(f"JSON Decode Error for {custom_id}: {e}")
+            parsed[custom_id] = None
+    return parsed
 
 # Function to create a hexadecimal UID based on the article_link
 def create_hex_uid(link):
@@ -141,62 +381,77 @@ def assign_uids(parsed_responses):
 
     return data
 
-# Helper function to prepare content for LLM input
-def prepare_content(row):
-    body_cleaned = re.sub(r'///+', '\n', row['body'])
+# Helper function to prepare content for LLM input, with the body compacted to its token budget when a compactor is given
+def prepare_content(row, compactor=None):
+    body_cleaned = compactor.compact_article(row) if compactor else re.sub(r'///+', '\n', row['body'])
     return (f"exchange_name: {row['exchange']}\n"
             f"publish_datetime: {row['publish_datetime']}\n"
             f"article_title: {row['title']}\n"
             f"article_link: {row['link']}\n"
             f"article: {body_cleaned}")
 
+# Helper function to prepare the input of the refinement assistant
+def prepare_refinement_content(response, content):
+    return f"JSON:\n{json.dumps(response, indent=4)}\n**Additional data:**\n{content}"
+
+# Helper function to decide whether a first response goes through the refinement assistant:
+# only responses that fail the event schema or the consistency checks are refined
+def needs_refinement(response, row):
+    errors = validate_response(response, row)
+    metrics.inc('gateio_llm_second_pass_total', decision='run' if errors else 'skipped')
+    if errors:
+        logging.info(f"First response for {row['link']} needs refinement: {'; '.join(errors[:5])}")
+    return bool(errors)
+
+# Helper function to log a refined response that still fails validation; it is kept, as before
+def check_refined(response, row):
+    errors = validate_response(response, row)
+    if errors:
+        logging.warning(f"Refined response for {row['link']} still fails validation: {'; '.join(errors[:5])}")
+
+# Function to log the share of articles that needed the second pass since a metrics snapshot
+def log_second_pass_rate(baseline):
+    decisions = {counter['labels']['decision']: counter['value'] for counter in metrics.summary(baseline)['counters']
+                 if counter['name'] == 'gateio_llm_second_pass_total'}
+    total = sum(decisions.values())
+    if total:
+        logging.info(f"Second assistant pass ran for {decisions.get('run', 0)} of {total} articles "
+                     f"({decisions.get('run', 0) / total:.0%})")
+
 # Helper function to determine the assistant ID
 def determine_assistant(title):
     return ('asst_Xk1XKciwc63DdjIHIO3ljfmH' if "Bi-Weekly Report" in title or "Gate Research" in title
             else 'asst_33sFfSIFStFOd5TPJvOKfy2h')
 
 
-# Modified save_json function to append data if the file already exists
-def save_json(parsed_responses):
-    #current_datetime = datetime.datetime.now().strftime("%y%m%d_%H%M")
-    file_path = os.path.join('Gateio_Files', 'Gateio_JSON_Process', f'gateio_structured.json')
-
-    # Check if a JSON file already exists
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as f:
-            try:
-                # Load existing data from the JSON file
-                existing_data = json.load(f)
-                # If existing_data is a list, extend it with the new responses
-                if isinstance(existing_data, list):
-                    existing_data.extend(parsed_responses)
-                else:
-                    # If it's not a list, wrap both in a list (to handle cases where data might be malformed)
-                    existing_data = [existing_data] + parsed_responses
-            except json.JSONDecodeError:
-                # If the JSON file exists but is not a valid JSON, we create a new list with the new data.
-                existing_data = parsed_responses
-    else:
-        # If the file doesn't exist, use the parsed_responses as the initial data
-        existing_data = parsed_responses
-
-    # Write the updated data back to the file
-    with open(file_path, 'w') as f:
-        json.dump(existing_data, f, indent=4)
-
-    logging.info(f"The JSON file has been updated and saved as '{file_path}'.")
+# Function to append the new responses to the event store, replacing the earlier events of re-extracted articles
+def save_events(parsed_responses, links=()):
+    event_store = EventStore()
+    try:
+        stored = event_store.add_responses(parsed_responses, links)
+    finally:
+        event_store.close()
+    metrics.inc('gateio_events_produced_total', stored)
+    logging.info(f"Saved {stored} events from {len(parsed_responses)} responses to '{event_store.path}'.")
+    return stored
 
 # Run the main function only when the script is executed directly
 if __name__ == "__main__":
-    signal.signal(signal.SIGALRM, timeout_handler)
+    arg_parser = argparse.ArgumentParser(description="Extract structured events from articles with the OpenAI assistants.")
+    arg_parser.add_argument('--batch', action='store_true', help="Submit the backlog as Batch API jobs instead of per-article runs")
+    arg_parser.add_argument('--base-url', help="API base URL for batch mode, e.g. a local stand-in server")
+    arg_parser.add_argument('--force', action='store_true', help="Ignore cached LLM responses and extract again")
+    arg_parser.add_argument('--no-filter', action='store_true', help="Send every article to the LLM, without the relevance filter")
+    arg_parser.add_argument('--poll-interval', type=float, default=BATCH_POLL_INTERVAL, help="Seconds between batch status checks")
+    args = arg_parser.parse_args()
+
     gateio_logger_setup.setup_logging()
     logger = logging.getLogger()
 
-    openai_api_key = os.getenv('OPENAI_API_KEY')
-    if not openai_api_key:
-        logging.error("OpenAI API key not found in environment variables.")
-        raise EnvironmentError("OPENAI_API_KEY environment variable is not set. Please configure it before running the script.")
-
-    client = openai
+    init_client()
 
-    get_json()
+    if args.batch:
+        get_json_batch(OpenAIBatchTransport(base_url=args.base_url), poll_interval=args.poll_interval,
+                       use_cache=not args.force, use_filter=not args.no_filter)
+    else:
+        get_json(use_cache=not args.force, use_filter=not args.no_filter)
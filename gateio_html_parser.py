@@ -0,0 +1,40 @@
+# File: gateio_html_parser.py
+
+import logging
+from bs4 import BeautifulSoup, SoupStrainer
+
+# lxml is an optional fast path, the pure-Python html.parser is always available as fallback
+try:
+    import lxml  # noqa: F401
+    FAST_PARSER = 'lxml'
+except ImportError:
+    FAST_PARSER = None
+
+FALLBACK_PARSER = 'html.parser'
+
+
+def find_subtree(html, class_name, tag='div', targeted=True):
+    """
+    Find the first element with the given class, building only the subtree that is needed.
+
+    With targeted parsing a SoupStrainer keeps BeautifulSoup from building the rest of
+    the page, and lxml is used when installed. If the fast parser does not find the
+    element, the page is parsed again with html.parser.
+
+    :param html: HTML content as a string
+    :param class_name: CSS class of the element to extract
+    :param tag: Tag name of the element to extract
+    :param targeted: Set to False to parse the full page with html.parser
+    :return: The matching bs4 Tag, or None if the page does not contain it
+    """
+    if not targeted:
+        return BeautifulSoup(html, FALLBACK_PARSER).find(tag, class_=class_name)
+
+    strainer = SoupStrainer(tag, class_=class_name)
+    if FAST_PARSER:
+        element = BeautifulSoup(html, FAST_PARSER, parse_only=strainer).find(tag, class_=class_name)
+        if element is not None:
+            return element
+        logging.debug(f"{FAST_PARSER} did not find {tag}.{class_name}, falling back to {FALLBACK_PARSER}")
+
+    return BeautifulSoup(html, FALLBACK_PARSER, parse_only=strainer).find(tag, class_=class_name)
@@ -0,0 +1,138 @@
+# File: gateio_http_cache.py
+
+import os
+import time
+import sqlite3
+import threading
+import logging
+
+HTTP_CACHE_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_HTTP_Cache/gateio_http_cache.db')
+MAX_CACHE_BYTES = 200 * 1024 * 1024  # Evict least recently used pages above this size
+
+
+class HTTPCache:
+    """
+    Persistent HTTP cache for conditional requests.
+
+    Bodies are stored together with their ETag / Last-Modified validators, so a
+    repeated request can be revalidated with If-None-Match / If-Modified-Since and
+    answered from disk when the server replies 304 Not Modified. The cache is
+    bounded in size and evicts the least recently used entries first.
+
+    :param path: Path of the SQLite cache file
+    :param max_bytes: Maximum total size of the cached bodies
+    """
+    def __init__(self, path=HTTP_CACHE_FILE, max_bytes=MAX_CACHE_BYTES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._not_modified = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def conditional_headers(self, url):
+        """
+        Build the revalidation headers for a cached URL.
+
+        :param url: URL about to be requested
+        :return: Dict with If-None-Match / If-Modified-Since, empty if the URL is not cached
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT etag, last_modified FROM entries WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row:
+            etag, last_modified = row
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def hit(self, url):
+        """
+        Serve a URL from the cache after the server answered 304 Not Modified.
+
+        :param url: URL that was revalidated
+        :return: Cached body, or None if the entry has been evicted in the meantime
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM entries WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+            self.hits += 1
+            self.bytes_saved += len(row[0])
+            self._not_modified.add(url)
+        return row[0]
+
+    def store(self, url, response):
+        """
+        Record a full (200) response, keeping it only if it carries validators.
+
+        :param url: URL that was fetched
+        :param response: requests.Response of the fetch
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        body = response.text
+        with self._lock:
+            self.misses += 1
+            self._not_modified.discard(url)
+            if not (etag or last_modified):
+                return
+            row = self._conn.execute("SELECT size FROM entries WHERE url = ?", (url,)).fetchone()
+            if row:
+                self._total_bytes -= row[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (url, etag, last_modified, body, size, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body, len(body), time.time())
+            )
+            self._total_bytes += len(body)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop least recently used entries until the cache fits into max_bytes again
+        while self._total_bytes > self.max_bytes:
+            row = self._conn.execute("SELECT url, size FROM entries ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                self._total_bytes = 0
+                break
+            self._conn.execute("DELETE FROM entries WHERE url = ?", (row[0],))
+            self._total_bytes -= row[1]
+            logging.debug(f"Evicted {row[0]} from HTTP cache")
+
+    def is_not_modified(self, url):
+        """
+        Check whether the last fetch of a URL in this run was answered from the cache.
+
+        :param url: URL to check
+        :return: True if the server reported the page as unchanged
+        """
+        with self._lock:
+            return url in self._not_modified
+
+    def summary(self):
+        return (f"HTTP cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.bytes_saved / 1024:.1f} KiB not downloaded, {self._total_bytes / 1024:.1f} KiB cached")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
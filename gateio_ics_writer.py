@@ -0,0 +1,88 @@
+# File: gateio_ics_writer.py
+
+import os
+from collections import namedtuple
+from datetime import timezone
+
+# Calendar event as the calendar stage builds it; begin and end are datetimes, naive ones read as UTC
+IcsEvent = namedtuple('IcsEvent', ['uid', 'name', 'description', 'location', 'url', 'begin', 'end'])
+
+# The output reproduces what the ics 0.7.2 library wrote for these events: the same header,
+# properties in the same order, no line folding, CRLF separators and no trailing line break
+CALENDAR_HEADER = "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:ics.py - http://git.io/lLljaA"
+CALENDAR_FOOTER = "\r\nEND:VCALENDAR"
+ALARM_LINES = (
+    "BEGIN:VALARM", "ACTION:DISPLAY", "DESCRIPTION:", "TRIGGER:-P1D", "END:VALARM",
+    "BEGIN:VALARM", "ACTION:DISPLAY", "DESCRIPTION:", "TRIGGER:-PT1H", "END:VALARM",
+)
+_ESCAPE_TABLE = str.maketrans({"\\": "\\\\", ";": "\\;", ",": "\\,", "\n": "\\n", "\r": "\\r"})
+
+
+def escape_text(value):
+    """
+    Escape a TEXT property value (RFC 5545, section 3.3.11).
+    """
+    return value.translate(_ESCAPE_TABLE)
+
+
+def to_utc(value):
+    """
+    Convert a datetime to an aware UTC datetime, reading naive ones as UTC.
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def format_datetime(value):
+    """
+    Format a datetime as a UTC DATE-TIME value.
+    """
+    return to_utc(value).strftime('%Y%m%dT%H%M%SZ')
+
+
+def serialize_event(event):
+    """
+    Serialize one event with its one-day and one-hour display alarms.
+
+    :param event: IcsEvent
+    :return: VEVENT component without a trailing line break
+    """
+    lines = ["BEGIN:VEVENT", *ALARM_LINES]
+    if event.description:
+        lines.append(f"DESCRIPTION:{escape_text(event.description)}")
+    lines.append(f"DTEND:{format_datetime(event.end)}")
+    if event.location:
+        lines.append(f"LOCATION:{escape_text(event.location)}")
+    lines.append(f"DTSTART:{format_datetime(event.begin)}")
+    if event.name:
+        lines.append(f"SUMMARY:{escape_text(event.name)}")
+    lines.append("TRANSP:TRANSPARENT")
+    lines.append(f"UID:{event.uid}")
+    if event.url:
+        lines.append(f"URL:{escape_text(event.url)}")
+    lines.append("END:VEVENT")
+    return "\r\n".join(lines)
+
+
+def write_calendar(path, events):
+    """
+    Stream events into an .ics file, replacing the file atomically once it is complete.
+
+    :param path: Path of the .ics file
+    :param events: Iterable of IcsEvent
+    :return: Number of written events
+    """
+    temp_path = f"{path}.tmp"
+    count = 0
+    with open(temp_path, 'w', newline='') as file:
+        file.write(CALENDAR_HEADER)
+        for event in events:
+            file.write("\r\n")
+            file.write(serialize_event(event))
+            count += 1
+        file.write(CALENDAR_FOOTER)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+    return count
@@ -0,0 +1,194 @@
+# File: gateio_llm_batch.py
+
+import os
+import json
+import time
+import logging
+from abc import ABC, abstractmethod
+import openai
+from gateio_logger_setup import preview
+from gateio_metrics import metrics
+
+BATCH_DIR = os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Process')
+BATCH_ENDPOINT = '/v1/chat/completions'
+BATCH_COMPLETION_WINDOW = '24h'
+BATCH_POLL_INTERVAL = 60  # Seconds between batch status checks
+BATCH_TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchError(Exception):
+    pass
+
+
+class BatchTransport(ABC):
+    """
+    Interface between the batch runner and a batch service.
+
+    The OpenAI implementation is the default; other transports (for example one talking
+    to a local stand-in server) subclass it and implement every method, a transport
+    missing one cannot be constructed.
+    """
+    @abstractmethod
+    def get_assistant(self, assistant_id):
+        """
+        :return: Dict with the assistant's model, instructions and sampling settings
+        """
+
+    @abstractmethod
+    def upload(self, path):
+        """
+        :return: ID of the uploaded request file
+        """
+
+    @abstractmethod
+    def submit(self, file_id):
+        """
+        :return: ID of the created batch
+        """
+
+    @abstractmethod
+    def status(self, batch_id):
+        """
+        :return: Tuple of (status, output_file_id, error_file_id)
+        """
+
+    @abstractmethod
+    def download(self, file_id):
+        """
+        :return: Content of the file as text
+        """
+
+
+class OpenAIBatchTransport(BatchTransport):
+    """
+    Batch transport using the OpenAI Files and Batches API.
+
+    :param client: Optional OpenAI client
+    :param base_url: Optional API base URL, e.g. of a local stand-in server
+    """
+    def __init__(self, client=None, base_url=None):
+        self.client = client or openai.OpenAI(base_url=base_url)
+
+    def get_assistant(self, assistant_id):
+        assistant = self.client.beta.assistants.retrieve(assistant_id)
+        response_format = assistant.response_format
+        if hasattr(response_format, 'model_dump'):
+            response_format = response_format.model_dump(exclude_none=True)
+        return {
+            'model': assistant.model,
+            'instructions': assistant.instructions or '',
+            'response_format': response_format if isinstance(response_format, dict) else None,
+            'temperature': assistant.temperature,
+            'top_p': assistant.top_p,
+        }
+
+    def upload(self, path):
+        with open(path, 'rb') as file:
+            return self.client.files.create(file=file, purpose='batch').id
+
+    def submit(self, file_id):
+        return self.client.batches.create(
+            input_file_id=file_id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW
+        ).id
+
+    def status(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        return batch.status, batch.output_file_id, batch.error_file_id
+
+    def download(self, file_id):
+        return self.client.files.content(file_id).text
+
+
+def build_request(custom_id, assistant, content):
+    """
+    Build one batch request line replaying an assistant as a chat completion.
+
+    :param custom_id: ID used to match the result to its article
+    :param assistant: Assistant settings as returned by BatchTransport.get_assistant
+    :param content: User message
+    :return: Request dict
+    """
+    body = {
+        'model': assistant['model'],
+        'messages': [
+            {'role': 'system', 'content': assistant['instructions']},
+            {'role': 'user', 'content': content},
+        ],
+    }
+    for key in ('response_format', 'temperature', 'top_p'):
+        if assistant.get(key) is not None:
+            body[key] = assistant[key]
+    return {'custom_id': custom_id, 'method': 'POST', 'url': BATCH_ENDPOINT, 'body': body}
+
+
+def write_requests(path, requests):
+    """
+    Write batch requests as a JSONL file.
+
+    :param path: Path of the request file
+    :param requests: Iterable of request dicts
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        for request in requests:
+            file.write(json.dumps(request) + '\n')
+
+
+def parse_results(output):
+    """
+    Parse a batch output file.
+
+    :param output: JSONL content of the output file
+    :return: Dict mapping custom_id to the message content, or None for failed requests
+    """
+    results = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get('response') or {}
+        if record.get('error') or response.get('status_code') != 200:
+            logging.error(f"Batch request {record.get('custom_id')} failed: {preview(record.get('error') or response.get('body'))}")
+            results[record['custom_id']] = None
+            metrics.inc('gateio_llm_errors_total', error='BATCH REQUEST ERROR')
+            continue
+        usage = response['body'].get('usage')
+        if usage:
+            metrics.inc('gateio_llm_tokens_total', usage.get('prompt_tokens', 0), kind='prompt')
+            metrics.inc('gateio_llm_tokens_total', usage.get('completion_tokens', 0), kind='completion')
+        results[record['custom_id']] = response['body']['choices'][0]['message']['content']
+    return results
+
+
+def run_batch(transport, requests, path, poll_interval=BATCH_POLL_INTERVAL):
+    """
+    Submit requests as one batch job and wait for its results.
+
+    :param transport: BatchTransport to use
+    :param requests: List of request dicts
+    :param path: Path of the JSONL request file to write
+    :param poll_interval: Seconds between status checks
+    :return: Dict mapping custom_id to the message content, or None for failed requests
+    """
+    write_requests(path, requests)
+    file_id = transport.upload(path)
+    batch_id = transport.submit(file_id)
+    logging.info(f"Submitted batch {batch_id} with {len(requests)} requests from {path}")
+
+    while True:
+        status, output_file_id, error_file_id = transport.status(batch_id)
+        if status in BATCH_TERMINAL_STATUSES:
+            break
+        logging.info(f"Batch {batch_id} is {status}, checking again in {poll_interval} seconds")
+        time.sleep(poll_interval)
+
+    if error_file_id:
+        parse_results(transport.download(error_file_id))
+    if status != 'completed' or not output_file_id:
+        raise BatchError(f"Batch {batch_id} ended with status {status}")
+
+    results = parse_results(transport.download(output_file_id))
+    logging.info(f"Batch {batch_id} completed with {sum(r is not None for r in results.values())}/{len(requests)} results")
+    return results
@@ -0,0 +1,106 @@
+# File: gateio_llm_cache.py
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+
+LLM_CACHE_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_JSON_Process/gateio_llm_cache.db')
+LLM_CACHE_TTL = 30 * 24 * 3600  # Seconds a cached response stays valid
+LLM_CACHE_MAX_ENTRIES = 5000  # Least recently used responses are evicted above this count
+
+
+class LLMCache:
+    """
+    Persistent cache of parsed LLM responses, keyed by a hash of the assistant ID and the prompt.
+
+    :param path: Path of the SQLite cache file
+    :param ttl: Seconds after which a cached response expires
+    :param max_entries: Maximum number of cached responses
+    :param bypass: Ignore cached responses (new responses are still stored), for forced re-extraction
+    """
+    def __init__(self, path=LLM_CACHE_FILE, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES, bypass=False):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                assistant_id TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(assistant_id, content):
+        return hashlib.sha256(f"{assistant_id}\0{content}".encode()).hexdigest()
+
+    def get(self, assistant_id, content):
+        """
+        Look up the response of an assistant to a prompt.
+
+        :return: The cached parsed response, or None on a miss
+        """
+        if self.bypass:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        key = self.make_key(assistant_id, content)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, assistant_id, content, response):
+        """
+        Store the parsed response of an assistant to a prompt.
+        """
+        key = self.make_key(assistant_id, content)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, assistant_id, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, assistant_id, json.dumps(response), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        # Drop expired responses, then the least recently used ones above max_entries
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)", (excess,)
+            )
+            logging.debug(f"Evicted {excess} responses from the LLM cache")
+
+    def summary(self):
+        return f"LLM cache: {self.hits} hits, {self.misses} misses" + (" (bypassed)" if self.bypass else "")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,7 +1,19 @@
 #File: gateio_logger_setup.py
 
 import os
+import json
+import queue
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Size-based rotation of every log file
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# Payloads (prompts, LLM responses) are logged as a short preview; the full text goes to the debug log
+PAYLOAD_LOGGER = 'gateio.payload'
+PAYLOAD_PREVIEW_CHARS = 300
 
 
 class InfoFilter(logging.Filter):
@@ -10,20 +22,35 @@ class InfoFilter(logging.Filter):
         return record.levelno == logging.INFO
 
 
+def _rotating_handler(path, level, record_filter=None):
+    handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    handler.setLevel(level)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+    if record_filter:
+        handler.addFilter(record_filter)
+    return handler
+
+
 def setup_logging():
+    # Stages imported into one process all call this; configure the handlers only once
+    logger = logging.getLogger()
+    if getattr(logger, '_gateio_configured', False):
+        return
+    logger._gateio_configured = True
+
     # Define the directory structure and log file paths
     log_dir = os.path.join('Gateio_Files', 'Gateio_Logs')
     info_log_file = os.path.join(log_dir, 'gateio_info.log')
     error_log_file = os.path.join(log_dir, 'gateio_error.log')
+    debug_log_file = os.path.join(log_dir, 'gateio_debug.log')
 
     # Check if the directory exists, if not, create it
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
         print(f"Created directory: {log_dir}")
 
-    # Set up logging
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)  # Set logger to capture all levels
+    # No handler takes DEBUG records from the root logger, so they are dropped before formatting
+    logger.setLevel(logging.INFO)
 
     # Suppress unnecessary logs from third-party libraries
     logging.getLogger("openai").setLevel(logging.WARNING)  # Suppress OpenAI client logs
@@ -33,21 +60,47 @@ def setup_logging():
     logging.getLogger("http.client").setLevel(logging.WARNING)  # Suppress http.client logs
     logging.getLogger("http").setLevel(logging.WARNING)  # Suppress http logs
 
-    # Create an INFO level log handler (logs INFO only)
-    info_handler = logging.FileHandler(info_log_file)
-    info_handler.setLevel(logging.INFO)
-    info_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    info_handler.setFormatter(info_formatter)
+    # INFO only goes to gateio_info.log, ERROR and higher to gateio_error.log,
+    # and the full payloads to gateio_debug.log
+    info_handler = _rotating_handler(info_log_file, logging.INFO, InfoFilter())
+    error_handler = _rotating_handler(error_log_file, logging.ERROR)
+    debug_handler = _rotating_handler(debug_log_file, logging.DEBUG, logging.Filter(PAYLOAD_LOGGER))
+
+    # Callers only put the record on a queue; a listener thread does the formatting and file writes
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, info_handler, error_handler, debug_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Flushes the records still queued on exit
+
+    queue_handler = QueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+
+    payload_logger = logging.getLogger(PAYLOAD_LOGGER)
+    payload_logger.setLevel(logging.DEBUG)
+    payload_logger.propagate = False
+    payload_logger.addHandler(queue_handler)
+
+
+def preview(text, limit=PAYLOAD_PREVIEW_CHARS):
+    """
+    Shorten a payload for the regular logs, keeping its start and its full length.
+    """
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text)} chars]"
 
-    # Add filter to ensure only INFO messages are logged to gateio_info.log
-    info_handler.addFilter(InfoFilter())
 
-    # Create an ERROR level log handler (logs only ERROR and higher)
-    error_handler = logging.FileHandler(error_log_file)
-    error_handler.setLevel(logging.ERROR)
-    error_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    error_handler.setFormatter(error_formatter)
+def log_payload(message, payload, level=logging.INFO):
+    """
+    Log a large payload: a preview at the given level and the full text to the debug log.
 
-    # Add handlers to the logger
-    logger.addHandler(info_handler)
-    logger.addHandler(error_handler)
+    :param message: Description of the payload, e.g. "Response 1 for <link>"
+    :param payload: Text of the payload, or data that is logged as JSON
+    :param level: Level of the preview record
+    """
+    if logging.getLogger().isEnabledFor(level):
+        logging.log(level, f"{message}: {preview(payload if isinstance(payload, str) else json.dumps(payload))}")
+    payload_logger = logging.getLogger(PAYLOAD_LOGGER)
+    if payload_logger.isEnabledFor(logging.DEBUG):
+        payload_logger.debug(f"{message}:\n{payload if isinstance(payload, str) else json.dumps(payload, indent=4)}")
@@ -1,11 +1,154 @@
 # Filename: gateio_main.py
 
-import subprocess
+import os
+import sys
+import time
+import argparse
+import logging
+from datetime import datetime
+import gateio_logger_setup
+from gateio_folder_structure import create_directory_structure
+from gateio_get_article_list import get_article_list
+from gateio_get_articles import get_articles, recheck_articles
+import gateio_get_json
+import gateio_get_calendar
+from gateio_archive_handler import archive_all
+from gateio_article_store import ArticleStore, MISSING_CONTENT_CONDITION, PENDING_LLM_CONDITION
+from gateio_extraction_journal import ExtractionJournal
+from gateio_stream_pipeline import run_streaming
+from gateio_metrics import metrics, publish_run
 
-subprocess.run(["python", "gateio_folder_structure.py"])
-subprocess.run(["python", "gateio_get_article_list.py"])
-subprocess.run(["python", "gateio_get_articles.py"])
-subprocess.run(["python", "gateio_get_json.py"])
-subprocess.run(["python", "gateio_get_calendar.py"])
-subprocess.run(["python", "gateio_archive_handler.py"])
 
+class PipelineState:
+    """
+    Results shared between the stages of one run, with the outcome and wall time of every stage.
+    """
+    def __init__(self):
+        self.new_articles = 0
+        self.fetched_articles = 0
+        self.changed_articles = 0
+        self.stored_events = 0
+        self.stage_status = {}
+        self.stage_times = {}
+
+
+# Function to count the stored articles matching a stage's input condition
+def count_articles(condition):
+    store = ArticleStore()
+    try:
+        return store.count_articles(condition)
+    finally:
+        store.close()
+
+def run_folder_structure(state):
+    create_directory_structure(os.getcwd())
+
+def run_article_list(state):
+    state.new_articles = get_article_list()
+
+def run_articles(state):
+    state.fetched_articles = get_articles()
+
+def run_recheck(state):
+    state.changed_articles = recheck_articles()
+
+def has_articles_to_fetch(state):
+    return count_articles(MISSING_CONTENT_CONDITION) > 0
+
+def run_json(state):
+    gateio_get_json.init_client()
+    state.stored_events = gateio_get_json.get_json()
+
+def has_articles_to_extract(state):
+    # Extractions journaled by an interrupted run still have to be saved
+    return count_articles(PENDING_LLM_CONDITION) > 0 or bool(ExtractionJournal().load())
+
+def run_stream(state):
+    gateio_get_json.init_client()
+    stats = run_streaming()
+    state.new_articles = stats.counts['discovered']
+    state.fetched_articles = stats.counts['fetched']
+    state.stored_events = stats.counts['events stored']
+
+def run_calendar(state):
+    gateio_get_calendar.main()
+
+def run_archive(state):
+    archive_all(datetime.now().strftime("%y%m%d_%H%M%S"))
+
+# Stages in pipeline order: name, function and an optional check whether the stage has any input.
+# The calendar and archive stages always run; both skip unchanged outputs themselves.
+# The recheck stage queues recently published articles that were edited for extraction again.
+STAGES = [
+    ('folder_structure', run_folder_structure, None),
+    ('article_list', run_article_list, None),
+    ('articles', run_articles, has_articles_to_fetch),
+    ('recheck', run_recheck, None),
+    ('json', run_json, has_articles_to_extract),
+    ('calendar', run_calendar, None),
+    ('archive', run_archive, None),
+]
+
+# Streaming mode: every new article flows through all stages as soon as it is listed. The full
+# calendar pass afterwards drops events that have aged out of the calendar window.
+STREAM_STAGES = [
+    ('folder_structure', run_folder_structure, None),
+    ('recheck', run_recheck, None),
+    ('stream', run_stream, None),
+    ('calendar', run_calendar, None),
+    ('archive', run_archive, None),
+]
+
+# Function to run the stages in one process, stopping at the first failing stage.
+# The metrics of the run are exported afterwards as a Prometheus textfile and a JSON summary.
+def run_pipeline(stages=STAGES, state=None):
+    state = state or PipelineState()
+    baseline = metrics.snapshot()
+    failed = None
+    for name, run, has_input in stages:
+        if failed:
+            state.stage_status[name] = 'not run'
+            continue
+        start_time = time.perf_counter()
+        try:
+            if has_input and not has_input(state):
+                logging.info(f"Stage {name} has no input, skipping")
+                state.stage_status[name] = 'skipped'
+                continue
+            run(state)
+            state.stage_status[name] = 'ok'
+        except Exception:
+            logging.exception(f"Stage {name} failed, not running the remaining stages")
+            state.stage_status[name] = 'failed'
+            failed = name
+        finally:
+            state.stage_times[name] = time.perf_counter() - start_time
+
+    for name, _, _ in stages:
+        logging.info(f"Stage {name}: {state.stage_status[name]} in {state.stage_times.get(name, 0.0):.2f}s")
+    logging.info(f"Pipeline {'failed at ' + failed if failed else 'completed'} in {sum(state.stage_times.values()):.2f}s: "
+                 f"{state.new_articles} new articles, {state.fetched_articles} fetched, {state.stored_events} events stored")
+
+    for name, status in state.stage_status.items():
+        metrics.set('gateio_stage_success', int(status in ('ok', 'skipped')), stage=name)
+        if name in state.stage_times:
+            metrics.set('gateio_stage_seconds', state.stage_times[name], stage=name)
+    publish_run({
+        'succeeded': failed is None,
+        'stages': [{'name': name, 'status': state.stage_status[name], 'seconds': round(state.stage_times.get(name, 0.0), 3)}
+                   for name, _, _ in stages],
+        'new_articles': state.new_articles,
+        'fetched_articles': state.fetched_articles,
+        'changed_articles': state.changed_articles,
+        'stored_events': state.stored_events,
+    }, baseline)
+    return state, failed is None
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run the Gate.io announcement pipeline.")
+    arg_parser.add_argument('--stream', action='store_true', help="Stream every new article through all stages as it is listed")
+    args = arg_parser.parse_args()
+
+    gateio_logger_setup.setup_logging()
+    _, succeeded = run_pipeline(STREAM_STAGES if args.stream else STAGES)
+    sys.exit(0 if succeeded else 1)
@@ -0,0 +1,247 @@
+# File: gateio_metrics.py
+
+import os
+import json
+import time
+import copy
+import bisect
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+METRICS_DIR = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Metrics')
+PROMETHEUS_FILE = os.path.join(METRICS_DIR, 'gateio.prom')  # Picked up by the node_exporter textfile collector
+RUN_SUMMARY_DIR = os.path.join(METRICS_DIR, 'runs')
+RUN_SUMMARY_KEEP = 2000  # Newest run summaries kept, about a week of daemon polls at the shortest interval
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Type and help text of every metric the pipeline records
+METRIC_DEFINITIONS = {
+    'gateio_http_request_seconds': ('histogram', "Latency of HTTP requests to gate.io"),
+    'gateio_http_retries_total': ('counter', "HTTP requests retried after an error"),
+    'gateio_http_failures_total': ('counter', "Pages that could not be fetched"),
+    'gateio_http_bytes_total': ('counter', "Bytes of HTML received, including pages answered from the HTTP cache"),
+    'gateio_html_parse_seconds': ('histogram', "Time to parse the relevant subtree of a page"),
+    'gateio_text_clean_seconds': ('histogram', "Time to normalize and clean an article body"),
+    'gateio_llm_call_seconds': ('histogram', "Latency of an LLM call including its retries"),
+    'gateio_llm_retries_total': ('counter', "LLM requests retried, by error class"),
+    'gateio_llm_errors_total': ('counter', "LLM calls that failed, by error class"),
+    'gateio_llm_tokens_total': ('counter', "Tokens used by the LLM calls, by kind"),
+    'gateio_prompt_tokens_total': ('counter', "Tokens of the article bodies put into prompts, before and after compaction"),
+    'gateio_llm_second_pass_total': ('counter', "Articles whose first response was refined by the second assistant, by decision"),
+    'gateio_llm_skipped_total': ('counter', "Articles the relevance filter kept from the LLM, by rule"),
+    'gateio_events_produced_total': ('counter', "Events extracted and saved to the event store"),
+    'gateio_ics_files_written_total': ('counter', "Calendar files written"),
+    'gateio_ics_events_written_total': ('counter', "Events written to calendar files"),
+    'gateio_stage_seconds': ('gauge', "Wall time of a pipeline stage in the last run"),
+    'gateio_stage_success': ('gauge', "1 if the stage succeeded or was skipped in the last run, 0 otherwise"),
+    'gateio_last_run_timestamp_seconds': ('gauge', "Unix time the last run finished"),
+}
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and histograms of the pipeline, keyed by metric name and labels.
+
+    Values accumulate over the life of the process, as Prometheus expects. A run summary
+    reports the change since a snapshot taken at the start of the run.
+    """
+    def __init__(self, definitions=METRIC_DEFINITIONS, buckets=LATENCY_BUCKETS):
+        self.definitions = definitions
+        self.buckets = buckets
+        self._values = {}      # (name, labels) -> value of counters and gauges
+        self._histograms = {}  # (name, labels) -> {'buckets': [...], 'sum': float, 'count': int}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                histogram['buckets'][position] += 1  # Non-cumulative here, accumulated on export
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(self._values), copy.deepcopy(self._histograms)
+
+    def to_prometheus(self):
+        """
+        :return: All metrics in the Prometheus text exposition format
+        """
+        values, histograms = self.snapshot()
+        series = {}
+        for (name, labels), value in values.items():
+            series.setdefault(name, []).append((name, labels, value))
+        for (name, labels), histogram in histograms.items():
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram['buckets']):
+                cumulative += count
+                lines.append((f"{name}_bucket", labels + (('le', repr(bound)),), cumulative))
+            lines.append((f"{name}_bucket", labels + (('le', '+Inf'),), histogram['count']))
+            lines.append((f"{name}_sum", labels, histogram['sum']))
+            lines.append((f"{name}_count", labels, histogram['count']))
+
+        output = []
+        for name in sorted(series):
+            metric_type, help_text = self.definitions.get(name, ('untyped', name))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {metric_type}")
+            for series_name, labels, value in series[name]:
+                label_text = ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels)
+                output.append(f"{series_name}{{{label_text}}} {_format_value(value)}" if label_text
+                              else f"{series_name} {_format_value(value)}")
+        return '\n'.join(output) + '\n'
+
+    def summary(self, baseline=None):
+        """
+        Summarize the metrics as plain data, counting only what changed since the baseline.
+
+        :param baseline: Snapshot taken at the start of the run, or None for everything so far
+        :return: Dict with 'counters', 'gauges' and 'histograms', each a list of series
+        """
+        values, histograms = self.snapshot()
+        base_values, base_histograms = baseline or ({}, {})
+        summary = {'counters': [], 'gauges': [], 'histograms': []}
+        for (name, labels), value in sorted(values.items()):
+            metric_type = self.definitions.get(name, ('untyped', ''))[0]
+            if metric_type == 'counter':
+                value -= base_values.get((name, labels), 0)
+                if value:
+                    summary['counters'].append({'name': name, 'labels': dict(labels), 'value': value})
+            else:
+                summary['gauges'].append({'name': name, 'labels': dict(labels), 'value': value})
+        for (name, labels), histogram in sorted(histograms.items()):
+            base = base_histograms.get((name, labels), {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            count = histogram['count'] - base['count']
+            if not count:
+                continue
+            buckets = [now - before for now, before in zip(histogram['buckets'], base['buckets'])]
+            total = histogram['sum'] - base['sum']
+            summary['histograms'].append({
+                'name': name, 'labels': dict(labels), 'count': count, 'sum': round(total, 6),
+                'mean': round(total / count, 6),
+                'p50': self._quantile(buckets, count, 0.5), 'p95': self._quantile(buckets, count, 0.95),
+            })
+        return summary
+
+    def _quantile(self, buckets, count, quantile):
+        # Upper bound of the bucket holding the quantile, None when it lies above the last bucket
+        rank = quantile * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, buckets):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return None
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+
+# Process-wide registry the pipeline modules record into
+metrics = MetricsRegistry()
+
+
+def write_prometheus(path=PROMETHEUS_FILE, registry=metrics):
+    _write_atomic(path, registry.to_prometheus())
+    logging.info(f"Wrote metrics to {path}")
+
+
+def write_run_summary(run, baseline=None, directory=RUN_SUMMARY_DIR, registry=metrics, keep=RUN_SUMMARY_KEEP):
+    """
+    Write the JSON summary of one run and prune the oldest summaries.
+
+    :param run: Dict describing the run (mode, stage outcomes and times, totals)
+    :param baseline: Snapshot of the registry taken when the run started
+    :param directory: Folder of the run summaries
+    :param keep: Number of summaries kept in the folder, 0 to keep them all
+    :return: Path of the written file
+    """
+    finished = datetime.now(timezone.utc)
+    path = os.path.join(directory, f"gateio_run_{finished.strftime('%y%m%d_%H%M%S_%f')}.json")
+    _write_atomic(path, json.dumps({'finished': finished.isoformat(), **run, **registry.summary(baseline)}, indent=4))
+    logging.info(f"Wrote run summary to {path}")
+    prune_run_summaries(directory, keep)
+    return path
+
+
+def prune_run_summaries(directory=RUN_SUMMARY_DIR, keep=RUN_SUMMARY_KEEP):
+    """
+    Delete all but the newest run summaries. The timestamped names sort by age.
+
+    :return: Number of deleted summaries
+    """
+    summaries = sorted(name for name in os.listdir(directory) if name.startswith('gateio_run_') and name.endswith('.json'))
+    outdated = summaries[:-keep] if keep else []
+    for name in outdated:
+        os.remove(os.path.join(directory, name))
+    if outdated:
+        logging.info(f"Pruned {len(outdated)} run summaries from {directory}, kept the newest {keep}")
+    return len(outdated)
+
+
+def publish_run(run, baseline=None, registry=metrics):
+    """
+    Export the metrics after a run. Failing to write them never fails the run itself.
+    """
+    registry.set('gateio_last_run_timestamp_seconds', time.time())
+    try:
+        write_prometheus(registry=registry)
+        return write_run_summary(run, baseline, registry=registry)
+    except OSError:
+        logging.exception("Failed to write the run metrics")
+        return None
+
+
+if __name__ == '__main__':
+    # Print the summary of the most recent run
+    summaries = sorted(os.listdir(RUN_SUMMARY_DIR)) if os.path.isdir(RUN_SUMMARY_DIR) else []
+    if not summaries:
+        print(f"No run summaries in {RUN_SUMMARY_DIR}")
+    else:
+        with open(os.path.join(RUN_SUMMARY_DIR, summaries[-1])) as file:
+            print(file.read())
@@ -0,0 +1,184 @@
+# File: gateio_normalizer_benchmark.py
+
+import os
+import re
+import sys
+import random
+import argparse
+import timeit
+import pandas as pd
+from gateio_text_normalizer import clean_title, clean_body
+from gateio_article_store import ArticleStore, ARTICLE_STORE_FILE
+
+# Characters that exercise every substitution of the normalizer, including their interactions
+EDGE_CASE_ALPHABET = (
+    'ab Gx.,:!-&"\'\t\n\r[]()/ '
+    '\u00a0\u3001\uff1a\uff01\u2013\u2014\u201c\u201d\u2018\u2019\uff06\uff08\uff09\u25cf\u25cb\u2b50'
+    '\u3010\u3011\u2028\u2029\ufe0f\u2705\u2600\u1f9e\U0001F600\U0001F680'
+)
+EDGE_CASE_FRAGMENTS = [
+    '[link](https://www.gate.io/x)', '[link]( /a "title" )', '![image](https://img/x.png)', '!![a](b)',
+    '[//]:content-type-MARKDOWN-DONOT-DELETE\n', 'Gateway to Crypto', 'Gate.io is your gateway to crypto',
+    'Gate.io is a Cryptocurrency Trading Platform Since 2013', 'The gateway to cryptocurrency', '...', ' \uff1a',
+]
+
+# Reference implementations: the original regex chains the normalizer has to reproduce exactly
+def reference_clean_title(title):
+    title = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F700-\U0001F77F\u2700-\u27BF\u2600-\u26FF\uFE0F]', '', title)
+    title = re.sub(r'\u00A0', ' ', title)
+    title = re.sub(r'[\u25CB-\u25EF\u2B50-\u2B55\u1F9E]', '', title)
+
+    title = re.sub(r'\u3001', ', ', title)
+    title = re.sub(r'\uff1a', ': ', title)
+    title = re.sub(r'\uff01', '! ', title)
+    title = re.sub(r'\.\.', '.', title)
+    title = re.sub(r' ,', ',', title)
+    title = re.sub(r' :', ':', title)
+
+    title = re.sub(r'\u2013', '-', title)  # Replaces en dash with a hyphen
+    title = re.sub(r'\u2014', '-', title)  # Replaces em dash with a hyphen
+    title = re.sub(r'["\u201c\u201d\u2018\u2019]', '', title)
+    title = re.sub(r'\t+', ' ', title)
+    title = re.sub(r'&', 'and', title)
+
+    title = re.sub(r'\u3010.*?\u3011', '', title)  # Remove text within ［ and ］
+    title = re.sub(r'\uff06', 'and', title)
+    title = re.sub(r'\uff08', '(', title)
+    title = re.sub(r'\uff09', ')', title)
+    title = re.sub(r'\u25cf', '\u2022', title)
+
+    return title.strip()
+
+def reference_clean_body(main_content):
+
+    main_content = re.sub(r'\[([^\]]+)\]\(\s*(?:[^\s\)]+)(?:\s+"[^"]*")?\s*\)', r'\1', main_content) # Remove markdown links
+    main_content = re.sub(r'!\[.*?\]\(.*?\)', '', main_content)  # Remove markdown images
+
+    main_content = re.sub(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F700-\U0001F77F\u2700-\u27BF\u2600-\u26FF\uFE0F]', '', main_content)
+    main_content = re.sub(r'\u00A0', ' ', main_content)
+    main_content = re.sub(r'[\u25CB-\u25EF\u2B50-\u2B55\u1F9E]', '', main_content)
+
+    main_content = re.sub(r'\u3001', ', ', main_content)
+    main_content = re.sub(r'\uff1a', ': ', main_content)
+    main_content = re.sub(r'\uff01', '! ', main_content)
+    main_content = re.sub(r'\.\.', '.', main_content)
+    main_content = re.sub(r' ,', ',', main_content)
+    main_content = re.sub(r' :', ':', main_content)
+
+    main_content = re.sub(r'\u2013', '-', main_content)  # Replaces en dash with a hyphen
+    main_content = re.sub(r'\u2014', '-', main_content)  # Replaces em dash with a hyphen
+    main_content = re.sub(r'["\u201c\u201d\u2018\u2019]', '', main_content)
+    main_content = re.sub(r'\t+', ' ', main_content)
+    main_content = re.sub(r'&', 'and', main_content)
+
+    main_content = re.sub(r'\u3010.*?\u3011', '', main_content)  # Remove text within 【 and 】
+    main_content = re.sub(r'\uff06', 'and', main_content)
+    main_content = re.sub(r'\uff08', '(', main_content)
+    main_content = re.sub(r'\uff09', ')', main_content)
+    main_content = re.sub(r'\u25cf', '\u2022', main_content)
+
+    main_content = re.sub(r'\n\s+', '\n', main_content)
+    main_content = re.sub(r'\n{2,}', '\n', main_content)
+
+    main_content = re.sub(r'\[//\]:content-type-MARKDOWN-DONOT-DELETE\s*\n?', '', main_content)
+
+    main_content = re.sub(r'\s*Gateway to Crypto.*', '', main_content, flags=re.DOTALL).rstrip()
+    main_content = re.sub(r'\s*Gate.io is your gateway to crypto.*', '', main_content, flags=re.DOTALL).rstrip()
+    main_content = re.sub(r'\s*Gate.io is a Cryptocurrency Trading Platform Since 2013.*', '', main_content, flags=re.DOTALL).rstrip()
+    main_content = re.sub(r'\s*The gateway to cryptocurrency.*', '', main_content, flags=re.DOTALL).rstrip()
+
+    main_content = re.sub(r'(?:\r\n|\r|\n|\u2028|\u2029)+', '///', main_content)
+
+    return main_content #body
+
+def load_corpus(filename=ARTICLE_STORE_FILE):
+    """
+    Load real titles and bodies from the article store or a TSV export of it.
+
+    Stored bodies have their line breaks flattened to '///', which is undone so the
+    multi-line rules of clean_body are exercised as well.
+
+    :param filename: Path of the article store, or of a TSV collection
+    :return: Tuple of (titles, bodies)
+    """
+    if filename.endswith('.tsv'):
+        df = pd.read_csv(filename, sep='\t')
+    else:
+        store = ArticleStore(filename, tsv_file=None)
+        df = store.load_articles(columns=['title', 'body'])
+        store.close()
+    titles = df['title'].dropna().astype(str).tolist()
+    bodies = [body.replace('///', '\n') for body in df['body'].dropna().astype(str)]
+    return titles, bodies
+
+def generate_edge_cases(count=20000, max_length=40, seed=0):
+    """
+    Generate random strings built from the characters and phrases handled by the normalizer.
+
+    :param count: Number of strings
+    :param max_length: Maximum number of pieces per string
+    :param seed: Random seed, so runs are reproducible
+    :return: List of strings
+    """
+    rng = random.Random(seed)
+    pieces = list(EDGE_CASE_ALPHABET) + EDGE_CASE_FRAGMENTS
+    return [''.join(rng.choice(pieces) for _ in range(rng.randint(0, max_length))) for _ in range(count)]
+
+def check_equivalence(texts, function, reference):
+    """
+    Compare a cleaning function with its reference implementation.
+
+    :return: List of (text, expected, actual) tuples for every mismatch
+    """
+    mismatches = []
+    for text in texts:
+        expected, actual = reference(text), function(text)
+        if expected != actual:
+            mismatches.append((text, expected, actual))
+    return mismatches
+
+def benchmark(function, texts, repeat=5):
+    """
+    Time a cleaning function over a corpus.
+
+    :return: Best wall time in seconds of one pass over the corpus
+    """
+    return min(timeit.repeat(lambda: [function(text) for text in texts], number=1, repeat=repeat))
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Verify and benchmark the text normalizer against the original regex chains.")
+    arg_parser.add_argument('--corpus', default=ARTICLE_STORE_FILE, help="Article store (or TSV collection) with real titles and bodies")
+    arg_parser.add_argument('--repeat', type=int, default=5, help="Number of timing repetitions")
+    args = arg_parser.parse_args()
+
+    titles, bodies = load_corpus(args.corpus) if os.path.exists(args.corpus) else ([], [])
+    edge_cases = generate_edge_cases()
+
+    failed = False
+    for name, function, reference, texts in [
+        ('clean_title', clean_title, reference_clean_title, titles + edge_cases),
+        ('clean_body', clean_body, reference_clean_body, bodies + edge_cases),
+    ]:
+        mismatches = check_equivalence(texts, function, reference)
+        print(f"{name}: {len(texts) - len(mismatches)}/{len(texts)} outputs identical")
+        for text, expected, actual in mismatches[:5]:
+            print(f"  input={text!r}\n  expected={expected!r}\n  actual={actual!r}")
+        failed = failed or bool(mismatches)
+
+    for name, function, reference, texts in [
+        ('clean_title', clean_title, reference_clean_title, titles),
+        ('clean_body', clean_body, reference_clean_body, bodies),
+    ]:
+        if not texts:
+            print(f"{name}: no corpus found at {args.corpus}, skipping benchmark")
+            continue
+        size = sum(len(text) for text in texts) / 1e6
+        old_time = benchmark(reference, texts, args.repeat)
+        new_time = benchmark(function, texts, args.repeat)
+        print(f"{name}: {len(texts)} texts, {size:.2f}M chars | reference {size / old_time:.2f} Mchar/s, "
+              f"normalizer {size / new_time:.2f} Mchar/s, speedup {old_time / new_time:.1f}x")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# File: gateio_parser_benchmark.py
+
+import os
+import sys
+import glob
+import sqlite3
+import argparse
+import timeit
+from gateio_http_cache import HTTP_CACHE_FILE
+from gateio_html_parser import FAST_PARSER, FALLBACK_PARSER
+from gateio_get_article_list import parse_html
+from gateio_get_articles import parse_article_html
+
+
+def load_pages(cache_file=HTTP_CACHE_FILE, html_dir=None):
+    """
+    Load captured gate.io pages from the HTTP cache and/or a directory of .html files.
+
+    :param cache_file: Path of the HTTP cache database
+    :param html_dir: Optional directory with saved pages
+    :return: Tuple of (list_pages, article_pages), each a list of (name, html)
+    """
+    pages = []
+    if cache_file and os.path.exists(cache_file):
+        with sqlite3.connect(cache_file) as conn:
+            pages.extend(conn.execute("SELECT url, body FROM entries").fetchall())
+    if html_dir:
+        for path in sorted(glob.glob(os.path.join(html_dir, '*.html'))):
+            with open(path, 'r', encoding='utf-8') as file:
+                pages.append((path, file.read()))
+
+    list_pages = [(name, html) for name, html in pages if 'article-list-box' in html]
+    article_pages = [(name, html) for name, html in pages if 'article-details-box' in html]
+    return list_pages, article_pages
+
+def list_fields(html, targeted):
+    # parse_datetime is the time of parsing, so it is left out of the comparison
+    articles = parse_html(html, 'benchmark', targeted=targeted) or []
+    return [{key: value for key, value in article.items() if key != 'parse_datetime'} for article in articles]
+
+def article_fields(html, targeted):
+    return parse_article_html(html, targeted=targeted)
+
+def check_pages(pages, extract):
+    """
+    Compare the targeted parse of every page with a full html.parser parse.
+
+    :return: List of names of the pages whose extracted fields differ
+    """
+    return [name for name, html in pages if extract(html, True) != extract(html, False)]
+
+def benchmark(pages, extract, targeted, repeat=3):
+    """
+    :return: Best wall time in seconds of one pass over the pages
+    """
+    return min(timeit.repeat(lambda: [extract(html, targeted) for _, html in pages], number=1, repeat=repeat))
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Check and benchmark targeted HTML parsing against full-page parsing.")
+    arg_parser.add_argument('--cache', default=HTTP_CACHE_FILE, help="HTTP cache database with captured pages")
+    arg_parser.add_argument('--html-dir', help="Directory with saved category and article pages (*.html)")
+    arg_parser.add_argument('--repeat', type=int, default=3, help="Number of timing repetitions")
+    args = arg_parser.parse_args()
+
+    list_pages, article_pages = load_pages(args.cache, args.html_dir)
+    print(f"Targeted parser: {FAST_PARSER or FALLBACK_PARSER} (fallback {FALLBACK_PARSER})")
+
+    failed = False
+    for name, pages, extract in [('parse_html', list_pages, list_fields),
+                                 ('parse_article_html', article_pages, article_fields)]:
+        if not pages:
+            print(f"{name}: no pages found, skipping")
+            continue
+        mismatches = check_pages(pages, extract)
+        print(f"{name}: {len(pages) - len(mismatches)}/{len(pages)} pages extract identical fields")
+        for page in mismatches[:5]:
+            print(f"  mismatch: {page}")
+        failed = failed or bool(mismatches)
+
+        full_time = benchmark(pages, extract, False, args.repeat)
+        targeted_time = benchmark(pages, extract, True, args.repeat)
+        print(f"{name}: full {full_time / len(pages) * 1000:.1f} ms/page, "
+              f"targeted {targeted_time / len(pages) * 1000:.1f} ms/page, speedup {full_time / targeted_time:.1f}x")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+# File: gateio_prompt_compactor.py
+
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import logging
+from collections import Counter
+import gateio_logger_setup
+from gateio_article_store import ArticleStore, ARTICLE_STORE_FILE
+from gateio_rate_limiter import estimate_tokens
+from gateio_metrics import metrics
+
+# tiktoken is an optional exact token count, the character estimate of the rate limiter is the fallback
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('o200k_base')
+except Exception:  # Not installed, or its encoding file cannot be downloaded
+    _ENCODING = None
+
+BOILERPLATE_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Process/gateio_boilerplate.json')
+BOILERPLATE_MAX_AGE = 24 * 3600  # Seconds before the table is rebuilt from the store
+BOILERPLATE_SAMPLE = 2000  # Most recent articles the table is built from
+BOILERPLATE_MIN_ARTICLES = 5  # Paragraphs found in this many articles are boilerplate
+BOILERPLATE_MIN_CHARS = 20  # Shorter paragraphs are kept, they cost next to nothing
+
+# Token budget of an article body in the prompt
+PROMPT_TOKEN_BUDGET = 2000
+
+# Sentences with a date, a time, a trading pair or a ticker are kept whatever the budget
+_DATE_PATTERN = re.compile(
+    r'\b\d{4}[-/.]\d{1,2}[-/.]\d{1,2}\b|\b\d{1,2}:\d{2}\b|\bUTC\b|'
+    r'\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.? \d{1,2}\b', re.I)
+_PAIR_PATTERN = re.compile(r'\b[A-Z0-9]{2,}[/_-](?:USDT|USDC|USD|BTC|ETH|EUR|TRY)\b')
+_TICKER_IN_PARENTHESES_PATTERN = re.compile(r'\(([A-Z0-9]{2,10})\)')
+_TICKER_PATTERN = re.compile(r'\b[A-Z][A-Z0-9]{1,9}\b')
+_PARAGRAPH_SEPARATOR_PATTERN = re.compile(r'///+')
+_SENTENCE_END_PATTERN = re.compile(r'(?<=[.!?;])\s+')
+
+
+def count_tokens(text):
+    """
+    :return: Number of tokens of a text, exact when tiktoken is installed
+    """
+    return len(_ENCODING.encode(text)) if _ENCODING else estimate_tokens(text)
+
+
+def paragraph_key(paragraph):
+    return hashlib.sha1(' '.join(paragraph.lower().split()).encode('utf-8')).hexdigest()[:16]
+
+
+def split_paragraphs(body):
+    return [paragraph.strip() for paragraph in _PARAGRAPH_SEPARATOR_PATTERN.split(body) if paragraph.strip()]
+
+
+def boilerplate_keys(bodies, min_articles=BOILERPLATE_MIN_ARTICLES):
+    """
+    :param bodies: Iterable of cleaned article bodies
+    :return: Set of the keys of the paragraphs found in at least min_articles bodies
+    """
+    counts = Counter()
+    for body in bodies:
+        counts.update({paragraph_key(paragraph) for paragraph in split_paragraphs(body)
+                       if len(paragraph) >= BOILERPLATE_MIN_CHARS})
+    return {key for key, count in counts.items() if count >= min_articles}
+
+
+def build_boilerplate(store_file=ARTICLE_STORE_FILE, sample=BOILERPLATE_SAMPLE):
+    """
+    Find the paragraphs that recur across the most recent articles of the store.
+
+    :return: Set of paragraph keys
+    """
+    store = ArticleStore(store_file)
+    try:
+        rows = store.conn.execute("SELECT body FROM articles WHERE body IS NOT NULL ORDER BY rowid DESC LIMIT ?", (sample,))
+        return boilerplate_keys(body for (body,) in rows)
+    finally:
+        store.close()
+
+
+def load_boilerplate(boilerplate_file=BOILERPLATE_FILE, store_file=ARTICLE_STORE_FILE, max_age=BOILERPLATE_MAX_AGE):
+    """
+    Load the boilerplate table, rebuilding it from the store when it is missing or outdated.
+
+    :return: Set of paragraph keys
+    """
+    if os.path.exists(boilerplate_file) and time.time() - os.path.getmtime(boilerplate_file) < max_age:
+        with open(boilerplate_file, 'r', encoding='utf-8') as file:
+            return set(json.load(file))
+    boilerplate = build_boilerplate(store_file)
+    if not boilerplate:
+        return boilerplate  # A store without enough history yet is looked at again next time
+    os.makedirs(os.path.dirname(boilerplate_file), exist_ok=True)
+    temp_path = f"{boilerplate_file}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(sorted(boilerplate), file)
+    os.replace(temp_path, boilerplate_file)
+    logging.info(f"Rebuilt the boilerplate table with {len(boilerplate)} paragraphs to {boilerplate_file}")
+    return boilerplate
+
+
+class PromptCompactor:
+    """
+    Shrinks an article body before it goes into a prompt.
+
+    Paragraphs that recur across many articles (disclaimers, risk warnings, greetings)
+    are dropped first. A body still over the token budget is trimmed sentence by
+    sentence: sentences with dates, times, trading pairs or the article's tickers are
+    always kept, the others are kept in order while the budget lasts.
+
+    :param boilerplate: Set of paragraph keys to drop, by default loaded with load_boilerplate
+    :param token_budget: Tokens the body may take, None to only drop boilerplate
+    """
+    def __init__(self, boilerplate=None, token_budget=PROMPT_TOKEN_BUDGET):
+        self.boilerplate = load_boilerplate() if boilerplate is None else boilerplate
+        self.token_budget = token_budget
+
+    def compact(self, body, title=''):
+        """
+        :param body: Cleaned article body with '///' line breaks
+        :param title: Article title, its tickers count as key information
+        :return: Tuple of (compacted body with '\\n' line breaks, report dict)
+        """
+        paragraphs = split_paragraphs(body)
+        kept = [paragraph for paragraph in paragraphs
+                if paragraph_key(paragraph) not in self.boilerplate or self.is_key(paragraph, title)]
+        report = {'tokens_before': count_tokens('\n'.join(paragraphs)), 'boilerplate_removed': len(paragraphs) - len(kept)}
+
+        text = '\n'.join(kept)
+        tokens = count_tokens(text)
+        if self.token_budget is not None and tokens > self.token_budget:
+            text = self.trim(kept, title)
+            tokens = count_tokens(text)
+        report['tokens_after'] = tokens
+        return text, report
+
+    def trim(self, paragraphs, title):
+        sentences = [(index, sentence) for index, paragraph in enumerate(paragraphs)
+                     for sentence in _SENTENCE_END_PATTERN.split(paragraph) if sentence]
+        costs = [count_tokens(sentence) for _, sentence in sentences]
+        keep = [self.is_key(sentence, title) for _, sentence in sentences]
+        remaining = self.token_budget - sum(cost for cost, key in zip(costs, keep) if key)
+        for position, cost in enumerate(costs):
+            if not keep[position] and cost <= remaining:
+                keep[position] = True
+                remaining -= cost
+
+        trimmed = [[] for _ in paragraphs]
+        for (index, sentence), kept in zip(sentences, keep):
+            if kept:
+                trimmed[index].append(sentence)
+        return '\n'.join(' '.join(paragraph) for paragraph in trimmed if paragraph)
+
+    @staticmethod
+    def is_key(text, title=''):
+        """
+        :return: True if the text holds a date, a time, a trading pair or a ticker of the article
+        """
+        if _DATE_PATTERN.search(text) or _PAIR_PATTERN.search(text) or _TICKER_IN_PARENTHESES_PATTERN.search(text):
+            return True
+        tickers = set(_TICKER_PATTERN.findall(title or '')) - {'UTC', 'VIP', 'KYC', 'API', 'FAQ', 'GT'}
+        return any(ticker in tickers for ticker in _TICKER_PATTERN.findall(text))
+
+    def compact_article(self, row):
+        """
+        Compact the body of an article row and report the token counts.
+
+        :return: Compacted body
+        """
+        text, report = self.compact(row['body'], row.get('title') or '')
+        metrics.inc('gateio_prompt_tokens_total', report['tokens_before'], kind='original')
+        metrics.inc('gateio_prompt_tokens_total', report['tokens_after'], kind='compacted')
+        logging.info(f"Prompt body of {row['link']}: {report['tokens_before']} -> {report['tokens_after']} tokens "
+                     f"({report['boilerplate_removed']} boilerplate paragraphs removed)")
+        return text
+
+
+if __name__ == '__main__':
+    gateio_logger_setup.setup_logging()
+
+    arg_parser = argparse.ArgumentParser(description="Report how much the prompt compaction saves on the stored articles.")
+    arg_parser.add_argument('--rebuild', action='store_true', help="Rebuild the boilerplate table from the article store")
+    arg_parser.add_argument('--budget', type=int, default=PROMPT_TOKEN_BUDGET, help="Token budget of an article body")
+    arg_parser.add_argument('--limit', type=int, default=50, help="Most recent articles to report")
+    args = arg_parser.parse_args()
+
+    compactor = PromptCompactor(load_boilerplate(max_age=0) if args.rebuild else None, args.budget)
+    store = ArticleStore()
+    try:
+        articles = store.load_articles("body IS NOT NULL", columns=['link', 'title', 'body']).tail(args.limit)
+    finally:
+        store.close()
+
+    total_before = total_after = 0
+    for row in articles.itertuples():
+        _, report = compactor.compact(row.body, row.title)
+        total_before += report['tokens_before']
+        total_after += report['tokens_after']
+        print(f"{report['tokens_before']:>6} -> {report['tokens_after']:>6} tokens  "
+              f"{report['boilerplate_removed']:>3} boilerplate  {row.link}")
+    if total_before:
+        print(f"Total {total_before} -> {total_after} tokens ({1 - total_after / total_before:.0%} saved, "
+              f"{'tiktoken' if _ENCODING else 'estimated'} counts)")
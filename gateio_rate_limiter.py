@@ -0,0 +1,119 @@
+# File: gateio_rate_limiter.py
+
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    :param rate: Tokens refilled per second
+    :param capacity: Maximum number of tokens held (burst size)
+    """
+    def __init__(self, rate, capacity):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate and capacity must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, tokens=1):
+        """
+        Block until the requested number of tokens is available and take them.
+
+        :param tokens: Number of tokens to take (capped at the bucket capacity)
+        :return: Seconds spent waiting
+        """
+        tokens = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait_time = (tokens - self._tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
+
+    def try_acquire(self, tokens=1):
+        """
+        Take the requested number of tokens if they are available, without waiting.
+
+        :return: True if the tokens were taken
+        """
+        tokens = min(float(tokens), self.capacity)
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+
+class HostRateLimiter:
+    """
+    Keeps one token bucket per host so that every host gets its own request budget.
+
+    :param rate: Requests per second allowed towards each host
+    :param capacity: Burst size allowed towards each host
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """
+        Block until a request to the host of the given URL is allowed.
+
+        :param url: URL that is about to be requested
+        :return: Seconds spent waiting
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.capacity)
+        return bucket.acquire()
+
+
+class LLMRateLimiter:
+    """
+    Client-side limit on LLM requests per minute and prompt tokens per minute.
+
+    :param requests_per_minute: Maximum number of LLM runs started per minute
+    :param tokens_per_minute: Maximum number of (estimated) prompt tokens sent per minute
+    """
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self._requests = TokenBucket(requests_per_minute / 60.0, requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+
+    def acquire(self, tokens):
+        """
+        Block until one more request with the given number of tokens is allowed.
+
+        :param tokens: Estimated number of prompt tokens of the request
+        :return: Seconds spent waiting
+        """
+        return self._requests.acquire() + self._tokens.acquire(tokens)
+
+
+def estimate_tokens(text):
+    """
+    Rough prompt size estimate (about four characters per token for English text).
+
+    :param text: Prompt text
+    :return: Estimated number of tokens
+    """
+    return len(text) // 4 + 1
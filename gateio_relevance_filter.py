@@ -0,0 +1,199 @@
+# File: gateio_relevance_filter.py
+
+import os
+import re
+import json
+import math
+import argparse
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+import gateio_logger_setup
+from gateio_article_store import ArticleStore, ARTICLE_STORE_FILE, EXTRACTED_CONDITION
+from gateio_event_store import EventStore
+from gateio_metrics import metrics
+
+RELEVANCE_MODEL_FILE = os.path.expanduser('~/parsley/Gateio_Files/Gateio_Article_Process/gateio_relevance_model.json')
+MODEL_VERSION = 1
+
+# Categories (names from gateio_categories.tsv) whose articles rarely hold calendar events.
+# Their articles are skipped unless the title names an event.
+LOW_YIELD_CATEGORIES = {'Gate Learn', 'Gate Charity', 'Live'}
+# Title words that name an event; such articles go to the LLM whatever their category
+EVENT_TITLE_PATTERN = re.compile(
+    r'\b(list(?:s|ing|ed)?|delist\w*|airdrop\w*|launch\w*|maintenance|upgrade\w*|suspen\w*|competition|campaign|'
+    r'giveaway|snapshot|rename\w*|swap|migration|staking|subscription|deposits?|withdrawals?|deadline)\b', re.I)
+# Title words of articles that look back instead of announcing anything, checked first
+SKIP_TITLE_PATTERN = re.compile(r'\b(winners? (?:list|announced|announcement)|results? announced|recap)\b', re.I)
+
+# The model only skips articles it is confident about, and only once it has seen enough history
+MODEL_SKIP_PROBABILITY = 0.02
+MIN_TRAINING_SAMPLES = 200
+
+
+def title_tokens(title, category):
+    """
+    :return: Features of an article: the lower-cased title words and the category
+    """
+    return re.findall(r'[a-z0-9]+', (title or '').lower()) + [f"category:{category}"]
+
+
+class RelevanceFilter:
+    """
+    Local decision whether an article can hold calendar events, taken before any LLM call.
+
+    Title keyword and category rules decide first; the remaining articles are scored by an
+    optional naive Bayes model trained on earlier extractions (see train_model). Every skip
+    comes with the rule that caused it, so the decisions can be audited in the log.
+
+    :param model_file: Path of the trained model, the rules alone are used when it does not exist
+    """
+    def __init__(self, model_file=RELEVANCE_MODEL_FILE):
+        self.model = load_model(model_file)
+
+    def classify(self, row):
+        """
+        :param row: Article row with 'title' and 'category'
+        :return: Tuple of (extract, reason)
+        """
+        title, category = row.get('title') or '', row.get('category')
+        match = SKIP_TITLE_PATTERN.search(title)
+        if match:
+            return False, f"title looks back ({match.group(0).lower()})"
+        match = EVENT_TITLE_PATTERN.search(title)
+        if match:
+            return True, f"title names an event ({match.group(0).lower()})"
+        if category in LOW_YIELD_CATEGORIES:
+            return False, f"low-yield category ({category})"
+        if self.model:
+            probability = event_probability(self.model, title_tokens(title, category))
+            if probability < MODEL_SKIP_PROBABILITY:
+                return False, f"model (p={probability:.3f})"
+        return True, "no skip rule applies"
+
+    def skip(self, row):
+        """
+        Classify an article and log and count it when it is skipped.
+
+        :return: True if the article should not go to the LLM
+        """
+        extract, reason = self.classify(row)
+        if extract:
+            return False
+        logging.info(f"Skipping LLM extraction of {row['link']}: {reason}")
+        metrics.inc('gateio_llm_skipped_total', rule=reason.split(' (')[0])
+        return True
+
+
+def event_probability(model, tokens):
+    """
+    :return: Probability the model gives an article with these features of holding events
+    """
+    vocabulary = model['vocabulary_size'] + 1
+    scores = {}
+    for label in ('0', '1'):
+        counts = model['token_counts'][label]
+        total = model['token_totals'][label]
+        score = math.log(model['class_counts'][label] + 1)
+        for token in tokens:
+            score += math.log((counts.get(token, 0) + 1) / (total + vocabulary))
+        scores[label] = score
+    return 1.0 / (1.0 + math.exp(scores['0'] - scores['1']))
+
+
+def training_samples(store_file=ARTICLE_STORE_FILE):
+    """
+    :return: List of (title, category, has_events) of the articles that went through extraction
+    """
+    store = ArticleStore(store_file)
+    event_store = EventStore()
+    try:
+        articles = store.load_articles(EXTRACTED_CONDITION, columns=['link', 'category', 'title'])
+        event_links = event_store.article_links()
+    finally:
+        store.close()
+        event_store.close()
+    return [(row.title, row.category, row.link in event_links) for row in articles.itertuples()]
+
+
+def train_model(samples):
+    """
+    Count the features of articles with and without events.
+
+    :param samples: List of (title, category, has_events)
+    :return: Model dict
+    """
+    class_counts = Counter()
+    token_counts = defaultdict(Counter)
+    for title, category, has_events in samples:
+        label = str(int(has_events))
+        class_counts[label] += 1
+        token_counts[label].update(title_tokens(title, category))
+    return {
+        'version': MODEL_VERSION,
+        'trained_at': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S') + ' UTC',
+        'class_counts': {label: class_counts[label] for label in ('0', '1')},
+        'token_counts': {label: dict(token_counts[label]) for label in ('0', '1')},
+        'token_totals': {label: sum(token_counts[label].values()) for label in ('0', '1')},
+        'vocabulary_size': len(set(token_counts['0']) | set(token_counts['1'])),
+    }
+
+
+def load_model(model_file=RELEVANCE_MODEL_FILE):
+    """
+    :return: Model dict, or None without a usable model
+    """
+    if not os.path.exists(model_file):
+        return None
+    with open(model_file, 'r', encoding='utf-8') as file:
+        model = json.load(file)
+    if model.get('version') != MODEL_VERSION or sum(model['class_counts'].values()) < MIN_TRAINING_SAMPLES:
+        logging.info(f"Relevance model {model_file} not used: outdated or too few samples")
+        return None
+    return model
+
+
+def save_model(model, model_file=RELEVANCE_MODEL_FILE):
+    temp_path = f"{model_file}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(model, file)
+    os.replace(temp_path, model_file)
+
+
+def evaluate(relevance_filter, samples):
+    """
+    Replay the filter over earlier extractions.
+
+    :return: Dict of the articles skipped per reason and the skipped articles that did hold events
+    """
+    skipped = Counter()
+    missed = Counter()
+    for title, category, has_events in samples:
+        extract, reason = relevance_filter.classify({'title': title, 'category': category})
+        if not extract:
+            rule = reason.split(' (')[0]
+            skipped[rule] += 1
+            missed[rule] += int(has_events)
+    return {'articles': len(samples), 'skipped': dict(skipped), 'skipped_with_events': dict(missed)}
+
+
+if __name__ == '__main__':
+    gateio_logger_setup.setup_logging()
+
+    arg_parser = argparse.ArgumentParser(description="Train and evaluate the local relevance filter in front of the LLM.")
+    arg_parser.add_argument('--train', action='store_true', help="Train the model on the articles extracted so far")
+    arg_parser.add_argument('--evaluate', action='store_true', help="Report which extracted articles the filter would skip")
+    args = arg_parser.parse_args()
+
+    samples = training_samples()
+    if args.train:
+        model = train_model(samples)
+        save_model(model)
+        print(f"Trained the relevance model on {len(samples)} articles "
+              f"({model['class_counts']['1']} with events), saved to {RELEVANCE_MODEL_FILE}")
+    if args.evaluate:
+        report = evaluate(RelevanceFilter(), samples)
+        total_skipped = sum(report['skipped'].values())
+        print(f"{total_skipped} of {report['articles']} extracted articles would have been skipped")
+        for rule, count in report['skipped'].items():
+            print(f"  {rule}: {count} skipped, {report['skipped_with_events'][rule]} of them with events")
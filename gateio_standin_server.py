@@ -0,0 +1,295 @@
+# File: gateio_standin_server.py
+
+import re
+import json
+import time
+import uuid
+import socket
+import random
+import hashlib
+import argparse
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from gateio_rate_limiter import TokenBucket
+from gateio_benchmark_fixtures import load_corpus, refresh_dates, FIXTURE_DIR
+
+EMPTY_LIST_PAGE = '<html><body><div class="article-list-box"></div></body></html>'
+
+
+class StandInConfig:
+    """
+    Simulated network conditions of the stand-in server.
+
+    :param latency: Mean delay in seconds before a page is answered
+    :param jitter: Maximum random deviation from the mean delay
+    :param error_rate: Share of pages whose first request fails with 502 Bad Gateway
+    :param rate_limit: Page requests per second above which 429 is returned, 0 for no limit
+    :param llm_latency: Delay in seconds of an assistant run
+    :param llm_rate_limit: Assistant runs per second above which 429 is returned, 0 for no limit
+    :param seed: Seed of the latency jitter
+    """
+    def __init__(self, latency=0.02, jitter=0.01, error_rate=0.02, rate_limit=0.0, llm_latency=0.05, llm_rate_limit=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.llm_latency = llm_latency
+        self.llm_rate_limit = llm_rate_limit
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Local stand-in for gate.io and the part of the OpenAI Assistants API the pipeline uses.
+
+    Pages come from a fixture corpus and support ETag revalidation. Assistant runs answer with
+    the recorded response of the article, or a synthesized one when none was recorded.
+    """
+    daemon_threads = True
+
+    def __init__(self, corpus, config=None, address=('127.0.0.1', 0)):
+        super().__init__(address, StandInHandler)
+        self.corpus = corpus
+        self.config = config or StandInConfig()
+        self.page_bucket = TokenBucket(self.config.rate_limit, max(1, self.config.rate_limit)) if self.config.rate_limit else None
+        self.llm_bucket = TokenBucket(self.config.llm_rate_limit, max(1, self.config.llm_rate_limit)) if self.config.llm_rate_limit else None
+        self.counts = {}
+        self.threads = {}
+        self.failed_once = set()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def delay(self):
+        with self._lock:
+            return max(0.0, self.config.latency + self._rng.uniform(-self.config.jitter, self.config.jitter))
+
+    def fails_first_request(self, path):
+        # A fixed set of pages, picked by hash, fails once, so every run sees the same errors
+        selected = int(hashlib.sha256(path.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF < self.config.error_rate
+        with self._lock:
+            if not selected or path in self.failed_once:
+                return False
+            self.failed_once.add(path)
+            return True
+
+    def reset(self):
+        # Every run starts with the same failures and fresh counters
+        with self._lock:
+            self.counts = {}
+            self.failed_once = set()
+            self._rng = random.Random(self.config.seed)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='standin-server', daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; without this, delayed ACKs add ~40 ms to every response
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_json(self, status, data, headers=None):
+        self.send_body(status, json.dumps(data), 'application/json', headers)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    # gate.io pages
+
+    def do_GET(self):
+        if self.path.startswith('/v1/'):
+            return self.handle_api('GET')
+        server = self.server
+        server.count('page requests')
+        time.sleep(server.delay())
+        if server.page_bucket and not server.page_bucket.try_acquire():
+            server.count('page 429')
+            return self.send_body(429, 'Too Many Requests', headers={'Retry-After': '1'})
+        if server.fails_first_request(self.path):
+            server.count('page 502')
+            return self.send_body(502, 'Bad Gateway')
+
+        html = server.corpus['pages'].get(self.path)
+        if html is None:
+            # Listing pages past the last captured one are empty, which ends the crawl of the category
+            if urlparse(self.path).path in server.corpus['categories']:
+                html = EMPTY_LIST_PAGE
+            else:
+                server.count('page 404')
+                return self.send_body(404, 'Not Found')
+        if 'article-details-box' in html:
+            html = refresh_dates(html, datetime.now(timezone.utc))
+
+        etag = f'"{hashlib.sha256(html.encode()).hexdigest()[:16]}"'
+        if self.headers.get('If-None-Match') == etag:
+            server.count('page 304')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        server.count('page 200')
+        self.send_body(200, html, headers={'ETag': etag})
+
+    # OpenAI Assistants API
+
+    def do_POST(self):
+        self.handle_api('POST')
+
+    def handle_api(self, method):
+        server = self.server
+        parts = self.path.split('?')[0].strip('/').split('/')[1:]  # Without the leading 'v1'
+        body = self.read_json() if method == 'POST' else {}
+
+        if method == 'POST' and parts == ['threads']:
+            thread_id = f"thread_{uuid.uuid4().hex}"
+            with server._lock:
+                server.threads[thread_id] = {'messages': [], 'runs': {}}
+            return self.send_json(200, {'id': thread_id, 'object': 'thread', 'created_at': int(time.time()), 'metadata': {}})
+
+        thread = server.threads.get(parts[1]) if len(parts) > 1 and parts[0] == 'threads' else None
+        if thread is None:
+            return self.send_json(404, {'error': {'message': f"No such route {self.path}", 'type': 'invalid_request_error'}})
+
+        if parts[2:] == ['messages'] and method == 'POST':
+            text = ''.join(part['text'] for part in body['content'] if part.get('type') == 'text') \
+                if isinstance(body.get('content'), list) else body.get('content', '')
+            message = make_message(parts[1], 'user', text)
+            thread['messages'].append(message)
+            return self.send_json(200, message)
+
+        if parts[2:] == ['messages']:
+            # Newest first, as the API lists them by default
+            return self.send_json(200, {'object': 'list', 'data': thread['messages'][::-1], 'has_more': False})
+
+        if parts[2:] == ['runs'] and method == 'POST':
+            server.count('llm runs')
+            if server.llm_bucket and not server.llm_bucket.try_acquire():
+                server.count('llm 429')
+                return self.send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                                      headers={'Retry-After': '1'})
+            time.sleep(server.config.llm_latency)
+            prompt = thread['messages'][-1]['content'][0]['text']['value'] if thread['messages'] else ''
+            answer = json.dumps(answer_prompt(server.corpus, body.get('assistant_id', ''), prompt))
+            thread['messages'].append(make_message(parts[1], 'assistant', answer))
+            run = make_run(parts[1], body.get('assistant_id', ''), 'completed', prompt, answer)
+            thread['runs'][run['id']] = run
+            return self.send_json(200, run)
+
+        if len(parts) >= 4 and parts[2] == 'runs' and parts[3] in thread['runs']:
+            run = thread['runs'][parts[3]]
+            if parts[4:] == ['cancel']:
+                run['status'] = 'cancelled'
+            return self.send_json(200, run)
+
+        self.send_json(404, {'error': {'message': f"No such route {self.path}", 'type': 'invalid_request_error'}})
+
+
+def make_message(thread_id, role, text):
+    return {'id': f"msg_{uuid.uuid4().hex}", 'object': 'thread.message', 'created_at': int(time.time()), 'thread_id': thread_id,
+            'role': role, 'status': 'completed', 'attachments': [], 'metadata': {},
+            'content': [{'type': 'text', 'text': {'value': text, 'annotations': []}}]}
+
+
+def make_run(thread_id, assistant_id, status, prompt, answer):
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(answer) // 4
+    return {'id': f"run_{uuid.uuid4().hex}", 'object': 'thread.run', 'created_at': int(time.time()), 'thread_id': thread_id,
+            'assistant_id': assistant_id, 'status': status, 'model': 'stand-in', 'instructions': '', 'tools': [], 'metadata': {},
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens}}
+
+
+def answer_prompt(corpus, assistant_id, prompt):
+    """
+    :return: Recorded response of the assistant for the article in the prompt, or a synthesized one
+    """
+    link_match = re.search(r'^article_link: (\S+)', prompt, re.M)
+    link = link_match.group(1) if link_match else ''
+    recorded = corpus['llm_responses'].get(urlparse(link).path, {})
+    response = recorded.get(assistant_id)
+    if response is None and prompt.startswith('JSON:\n'):
+        # Refinement pass without a recording: return the first response unchanged
+        try:
+            response = json.loads(prompt[len('JSON:\n'):prompt.index('\n**Additional data:**')])
+        except ValueError:
+            response = None
+    if response is None:
+        response = recorded.get('default') or {'events': [{
+            'exchange_name': 'Gate.io', 'event_type': ['Listing'], 'tokens': [], 'trading_pairs': [], 'markets': [],
+            'start_datetime': 'NOW+1D', 'end_datetime': 'NOW+1D', 'event_summary': 'Synthesized event', 'article_link': link,
+        }]}
+    return resolve_response(response, link, datetime.now(timezone.utc))
+
+
+def resolve_response(response, link, now):
+    # Relative datetimes keep the recorded events inside the calendar window; the link is the one the pipeline sent
+    response = json.loads(json.dumps(response))
+    for event in response.get('events', []):
+        if not isinstance(event, dict):
+            continue
+        for key in ('start_datetime', 'end_datetime'):
+            value = event.get(key)
+            if isinstance(value, str) and value.startswith('NOW+') and value.endswith('D'):
+                event[key] = (now + timedelta(days=int(value[4:-1]))).strftime('%Y-%m-%d %H:%M UTC')
+        if link:
+            event['article_link'] = link
+    return response
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Serve the fixture corpus as a local stand-in for gate.io and the OpenAI Assistants API.")
+    arg_parser.add_argument('--fixtures', default=FIXTURE_DIR, help="Fixture directory")
+    arg_parser.add_argument('--port', type=int, default=8765, help="Port to listen on")
+    arg_parser.add_argument('--latency', type=float, default=0.02, help="Mean page latency in seconds")
+    arg_parser.add_argument('--error-rate', type=float, default=0.02, help="Share of pages failing once with 502")
+    arg_parser.add_argument('--rate-limit', type=float, default=0.0, help="Page requests per second before 429, 0 for no limit")
+    arg_parser.add_argument('--llm-latency', type=float, default=0.05, help="Assistant run latency in seconds")
+    arg_parser.add_argument('--llm-rate-limit', type=float, default=0.0, help="Assistant runs per second before 429, 0 for no limit")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = StandInConfig(args.latency, error_rate=args.error_rate, rate_limit=args.rate_limit,
+                           llm_latency=args.llm_latency, llm_rate_limit=args.llm_rate_limit)
+    server = StandInServer(load_corpus(args.fixtures), config, ('127.0.0.1', args.port))
+    logging.info(f"Serving {len(server.corpus['pages'])} pages on {server.base_url}; "
+                 f"set GATEIO_BASE_URL={server.base_url} and OPENAI_BASE_URL={server.base_url}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,284 @@
+# File: gateio_stream_pipeline.py
+
+import time
+import queue
+import threading
+import statistics
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import gateio_logger_setup
+from gateio_logger_setup import preview
+import gateio_get_json
+from gateio_article_store import ArticleStore, ARTICLE_STORE_FILE
+from gateio_event_store import EventStore
+from gateio_http_cache import HTTPCache
+from gateio_rate_limiter import HostRateLimiter, LLMRateLimiter
+from gateio_llm_cache import LLMCache
+from gateio_extraction_journal import ExtractionJournal
+from gateio_relevance_filter import RelevanceFilter
+from gateio_prompt_compactor import PromptCompactor
+from gateio_metrics import metrics
+from gateio_get_article_list import load_gateio_categories, crawl_category, REQUESTS_PER_SECOND, REQUEST_BURST, MAX_PAGES
+from gateio_get_articles import create_session, fetch_article, FetchStats
+from gateio_get_calendar import (load_json_data, load_fingerprints, save_fingerprints, update_calendars,
+                                 affected_requests, REQUESTS_FILE_PATH)
+
+# Worker threads of every stage and the size of the bounded queue feeding it. A full queue
+# blocks the stage in front of it, so a slow stage holds back the work instead of buffering it.
+STREAM_WORKERS = {'list': 4, 'fetch': 8, 'llm': 4}
+STREAM_QUEUE_SIZES = {'fetch': 32, 'llm': 8, 'events': 16}
+SINK_BATCH_SIZE = 16  # Extractions saved together before the affected calendars are rewritten
+
+STOP = object()  # Queue item telling a worker to exit
+
+
+class StreamStats:
+    """
+    Thread-safe counters of a streaming run and the time every article took from discovery to its calendar.
+    """
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counts[name] += amount
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def summary(self):
+        counts = ", ".join(f"{count} {name}" for name, count in self.counts.items())
+        if not self.latencies:
+            return f"Streaming run: {counts or 'nothing to do'}"
+        return (f"Streaming run: {counts}; discovery to calendar latency "
+                f"median {statistics.median(self.latencies):.1f}s, max {max(self.latencies):.1f}s")
+
+
+def start_workers(name, count, input_queue, handle, store_file):
+    """
+    Start the worker threads of a stage. Every worker has its own article store connection.
+
+    :param name: Stage name used for the threads and in log messages
+    :param count: Number of worker threads
+    :param input_queue: Queue the workers take their items from
+    :param handle: Function called with (item, store) for every item
+    :param store_file: Path of the article store
+    :return: List of started threads
+    """
+    def work():
+        store = ArticleStore(store_file)
+        try:
+            while True:
+                item = input_queue.get()
+                if item is STOP:
+                    break
+                try:
+                    handle(item, store)
+                except Exception:
+                    # Article items carry the body and the response, only their link goes to the error log
+                    subject = item['row']['link'] if isinstance(item, dict) else preview(item)
+                    logging.exception(f"Stream stage {name} failed on {subject}")
+        finally:
+            store.close()
+
+    threads = [threading.Thread(target=work, name=f"{name}-{i}", daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def stop_workers(threads, input_queue):
+    # Called once everything upstream has finished: each worker exits after the items queued before its STOP
+    for _ in threads:
+        input_queue.put(STOP)
+    for thread in threads:
+        thread.join()
+
+
+def run_streaming(store_file=ARTICLE_STORE_FILE, workers=STREAM_WORKERS, queue_sizes=STREAM_QUEUE_SIZES, use_cache=True,
+                  categories=None, use_filter=True):
+    """
+    Stream every newly listed article through fetch and clean, LLM extraction, the event store
+    and the calendars it affects, instead of finishing each stage for all articles first.
+
+    Articles left over from earlier runs (missing content, pending extraction or journaled)
+    are fed into the same stages. The LLM client must have been set up with
+    gateio_get_json.init_client().
+
+    :param store_file: Path of the article store
+    :param workers: Worker threads per stage
+    :param queue_sizes: Size of the queue in front of each stage
+    :param use_cache: Answer repeated prompts from the LLM cache
+    :param categories: Dict of category URL to name to list, by default all categories
+    :param use_filter: Keep the articles the relevance filter rules out from the LLM
+    :return: StreamStats of the run
+    """
+    stats = StreamStats()
+    baseline = metrics.snapshot()
+    fetch_queue = queue.Queue(maxsize=queue_sizes['fetch'])
+    llm_queue = queue.Queue(maxsize=queue_sizes['llm'])
+    event_queue = queue.Queue(maxsize=queue_sizes['events'])
+    category_queue = queue.Queue()
+
+    http_cache = HTTPCache()
+    host_rate_limiter = HostRateLimiter(REQUESTS_PER_SECOND, REQUEST_BURST)
+    session = create_session(workers['fetch'])
+    fetch_stats = FetchStats()
+    llm_rate_limiter = LLMRateLimiter(gateio_get_json.LLM_REQUESTS_PER_MINUTE, gateio_get_json.LLM_TOKENS_PER_MINUTE)
+    llm_cache = LLMCache(bypass=not use_cache)
+    journal = ExtractionJournal()
+    relevance_filter = RelevanceFilter() if use_filter else None
+    compactor = PromptCompactor()
+    threshold_date = datetime.now(timezone.utc) - timedelta(days=5)  # Older articles do not go to the LLM
+
+    # The backlog is read before the listing starts, so new articles are not queued twice
+    store = ArticleStore(store_file)
+    journaled = gateio_get_json.resume_journal(journal, store)
+    known_links = frozenset(store.links())
+    fetch_backlog = [row.to_dict() for _, row in store.articles_missing_content().iterrows()]
+    llm_backlog = [row.to_dict() for _, row in store.articles_for_llm().iterrows() if row['link'] not in journaled]
+    store.close()
+    seen_links = set(known_links)
+    seen_lock = threading.Lock()
+
+    def list_category(item, store):
+        url, category = item
+        pages, status, page_count = crawl_category(url, category, known_links, MAX_PAGES, host_rate_limiter, http_cache)
+        stats.count('listing pages', page_count)
+        with seen_lock:
+            new_articles = [article for data in pages for article in data if article['link'] not in seen_links]
+            seen_links.update(article['link'] for article in new_articles)
+        if new_articles:
+            store.insert_articles(new_articles)
+            stats.count('discovered', len(new_articles))
+            discovered = time.monotonic()
+            for article in new_articles:
+                fetch_queue.put({'row': article, 'discovered': discovered})
+
+    def fetch_and_clean(item, store):
+        link = item['row']['link']
+        update = fetch_article(link, threshold_date, session, fetch_stats, http_cache)
+        if update is None:
+            stats.count('fetch failures')
+            return
+        store.update_articles({link: update})
+        stats.count('fetched')
+        if update.get('llm_processed') == 'Yes':
+            return
+        item = dict(item, row={**item['row'], **update})
+        # Skipped articles bypass the LLM queue instead of waiting behind the extractions
+        if not skip_irrelevant(item, store):
+            llm_queue.put(item)
+
+    # Skipped articles go to the sink without a response, which removes the events of an earlier extraction
+    def skip_irrelevant(item, store):
+        if relevance_filter is None or not relevance_filter.skip(item['row']):
+            return False
+        store.update_articles({item['row']['link']: {'llm_processed': 'Skipped'}})
+        stats.count('skipped')
+        event_queue.put(dict(item, response=None))
+        return True
+
+    def extract(item, store):
+        link = item['row']['link']
+        if skip_irrelevant(item, store):
+            return
+        response = gateio_get_json.extract_events(item['row'], llm_rate_limiter, llm_cache, compactor)
+        if response is None:
+            stats.count('extraction failures')
+            return
+        gateio_get_json.record_result(journal, store, link, response)
+        stats.count('extracted')
+        event_queue.put(dict(item, response=response))
+
+    # The single sink saves the extractions that are waiting together and rewrites only the calendars they affect
+    sink_succeeded = threading.Event()
+
+    def sink():
+        event_store = None
+        finished = False
+        try:
+            event_store = EventStore()
+            requests = load_json_data(REQUESTS_FILE_PATH)
+            fingerprints = load_fingerprints()
+            while not finished:
+                items = [event_queue.get()]
+                while len(items) < SINK_BATCH_SIZE:
+                    try:
+                        items.append(event_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                finished = any(item is STOP for item in items)
+                items = [item for item in items if item is not STOP]
+                if not items:
+                    continue
+
+                responses = gateio_get_json.assign_uids([item['response'] for item in items if item['response'] is not None])
+                links = [item['row']['link'] for item in items]
+                # Calendars holding the replaced events of re-extracted articles are affected as well
+                replaced = event_store.article_events(links)
+                stored = event_store.add_responses(responses, links)
+                stats.count('events stored', stored)
+                metrics.inc('gateio_events_produced_total', stored)
+                affected = affected_requests(requests, replaced + [event for response in responses for event in response.get('events', [])])
+                if affected:
+                    update_calendars(affected, event_store, fingerprints)
+                    save_fingerprints(fingerprints)
+                done = time.monotonic()
+                for item in items:
+                    stats.record_latency(done - item['discovered'])
+            sink_succeeded.set()
+        except Exception:
+            logging.exception("Stream sink failed, journaled extractions are kept for the next run")
+            # Keep draining so that the extraction workers never block on a full queue
+            while not finished:
+                finished = event_queue.get() is STOP
+        finally:
+            if event_store:
+                event_store.close()
+
+    sink_thread = threading.Thread(target=sink, name='sink', daemon=True)
+    sink_thread.start()
+    llm_threads = start_workers('llm', workers['llm'], llm_queue, extract, store_file)
+    fetch_threads = start_workers('fetch', workers['fetch'], fetch_queue, fetch_and_clean, store_file)
+    list_threads = start_workers('list', workers['list'], category_queue, list_category, store_file)
+
+    try:
+        for item in (load_gateio_categories() if categories is None else categories).items():
+            category_queue.put(item)
+        started = time.monotonic()
+        for link, response in journaled.items():
+            event_queue.put({'row': {'link': link}, 'response': response, 'discovered': started})
+        for row in fetch_backlog:
+            fetch_queue.put({'row': row, 'discovered': started})
+        for row in llm_backlog:
+            llm_queue.put({'row': row, 'discovered': started})
+    finally:
+        # Shut the stages down front to back, each one after everything upstream is done
+        stop_workers(list_threads, category_queue)
+        stop_workers(fetch_threads, fetch_queue)
+        stop_workers(llm_threads, llm_queue)
+        event_queue.put(STOP)
+        sink_thread.join()
+
+        session.close()
+        logging.info(http_cache.summary())
+        http_cache.close()
+        logging.info(llm_cache.summary())
+        llm_cache.close()
+        gateio_get_json.log_second_pass_rate(baseline)
+
+    if sink_succeeded.is_set():
+        journal.clear()
+    logging.info(stats.summary())
+    return stats
+
+
+if __name__ == '__main__':
+    gateio_logger_setup.setup_logging()
+    gateio_get_json.init_client()
+    run_streaming()
@@ -0,0 +1,103 @@
+# File: gateio_text_normalizer.py
+
+import re
+
+# Single-character substitutions and removals, applied in one pass by looking each match up in a table.
+# Emoji, dingbats, geometric shapes and stars are dropped; full-width punctuation and dashes are normalized.
+# Note: str.translate is not used, it runs per character in Python's generic path for non-Latin-1 text and
+# is several times slower than a regex scan that only stops at the (few) characters that need replacing.
+_CHARACTER_PATTERN = re.compile(
+    r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F700-\U0001F77F'
+    r'\u2700-\u27BF\u2600-\u26FF\uFE0F\u25CB-\u25EF\u2B50-\u2B55\u1F9E'  # U+25CF (black circle) falls in U+25CB-U+25EF
+    r'\u00A0\u3001\uFF1A\uFF01\u2013\u2014]'
+)
+_CHARACTER_TABLE = {
+    '\u00A0': ' ',   # No-break space
+    '\u3001': ', ',  # Ideographic comma
+    '\uFF1A': ': ',  # Full-width colon
+    '\uFF01': '! ',  # Full-width exclamation mark
+    '\u2013': '-',   # En dash
+    '\u2014': '-',   # Em dash
+}
+
+# Punctuation spacing: '..' -> '.', ' ,' -> ',', ' :' -> ':' (keeps the second character of each match)
+_PUNCTUATION_PATTERN = re.compile(r'\.(\.)| ([,:])')
+
+# Substitutions that must run after the punctuation spacing fix, merged into one alternation:
+# tab runs become one space (quotes inside a run are removed anyway, so they do not split it),
+# text within 【 and 】 is removed, quotes are dropped and ampersands and full-width parentheses normalized
+_LATE_PATTERN = re.compile(r'\t[\t"\u201C\u201D\u2018\u2019]*|\u3010.*?\u3011|["\u201C\u201D\u2018\u2019&\uFF06\uFF08\uFF09]')
+_LATE_CHARACTER_TABLE = {
+    '&': 'and',
+    '\uFF06': 'and',  # Full-width ampersand
+    '\uFF08': '(',    # Full-width parentheses
+    '\uFF09': ')',
+}
+
+_MARKDOWN_LINK_PATTERN = re.compile(r'\[([^\]]+)\]\(\s*(?:[^\s\)]+)(?:\s+"[^"]*")?\s*\)')
+_MARKDOWN_IMAGE_PATTERN = re.compile(r'!\[.*?\]\(.*?\)')
+_INDENTED_NEWLINE_PATTERN = re.compile(r'\n\s+')
+_MARKDOWN_MARKER_PATTERN = re.compile(r'\[//\]:content-type-MARKDOWN-DONOT-DELETE\s*\n?')
+_FOOTER_PATTERN = re.compile(
+    r'Gateway to Crypto'
+    r'|Gate.io is your gateway to crypto'
+    r'|Gate.io is a Cryptocurrency Trading Platform Since 2013'
+    r'|The gateway to cryptocurrency'
+)
+_LINE_BREAK_PATTERN = re.compile(r'[\r\n\u2028\u2029]+')
+
+
+def _replace_character(match):
+    return _CHARACTER_TABLE.get(match.group(), '')
+
+
+def _replace_late(match):
+    text = match.group()
+    if text[0] == '\t':
+        return ' '
+    return _LATE_CHARACTER_TABLE.get(text, '')
+
+
+def normalize_text(text):
+    """
+    Apply the character and punctuation normalization shared by titles and bodies.
+
+    :param text: Raw text
+    :return: Normalized text
+    """
+    text = _PUNCTUATION_PATTERN.sub(r'\1\2', _CHARACTER_PATTERN.sub(_replace_character, text))
+    return _LATE_PATTERN.sub(_replace_late, text)
+
+
+def clean_title(title):
+    """
+    Clean an article title.
+
+    :param title: Title text as scraped
+    :return: Cleaned title
+    """
+    return normalize_text(title).strip()
+
+
+def clean_body(main_content):
+    """
+    Clean an article body and flatten its line breaks to '///'.
+
+    :param main_content: Body text as extracted from the article page
+    :return: Cleaned body
+    """
+    main_content = _MARKDOWN_LINK_PATTERN.sub(r'\1', main_content)  # Remove markdown links
+    main_content = _MARKDOWN_IMAGE_PATTERN.sub('', main_content)  # Remove markdown images
+    main_content = normalize_text(main_content)
+
+    # Collapsing indentation also collapses blank lines, since '\n' is whitespace itself
+    main_content = _INDENTED_NEWLINE_PATTERN.sub('\n', main_content)
+    main_content = _MARKDOWN_MARKER_PATTERN.sub('', main_content)
+
+    # Cut the promotional footer at the earliest of the known phrases
+    footer = _FOOTER_PATTERN.search(main_content)
+    if footer:
+        main_content = main_content[:footer.start()]
+    main_content = main_content.rstrip()
+
+    return _LINE_BREAK_PATTERN.sub('///', main_content)